@@ -0,0 +1,100 @@
+"""
+Асинхронный режим чтения: независимые запросы одного action выполняются параллельно через asyncpg
+
+Handler облачной функции синхронный, поэтому event loop и пул asyncpg живут в фоновом потоке
+контейнера, а handler ждёт результат через run_coroutine_threadsafe. Включается ASYNC_READS=1;
+читает с DATABASE_REPLICA_URL, если она задана (details не зависит от записей пользователя).
+"""
+import functools
+import json
+import os
+import re
+import threading
+
+ENABLED = os.environ.get('ASYNC_READS', '0') == '1'
+POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', 8))
+TIMEOUT = float(os.environ.get('ASYNC_TIMEOUT', 10))
+
+_placeholder = re.compile(r'%s')
+
+
+@functools.lru_cache(maxsize=256)
+def native_sql(query: str) -> str:
+    """Плейсхолдеры psycopg2 (%s) -> asyncpg ($1, $2, ...), чтобы SQL был описан один раз."""
+    counter = iter(range(1, query.count('%s') + 1))
+    return _placeholder.sub(lambda m: f'${next(counter)}', query)
+
+
+class AsyncReader:
+    def __init__(self, dsn: str, pool_size: int = 8, timeout: float = 10.0):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._loop = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'queries': 0}
+
+    def _start(self):
+        import asyncio
+
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='aio-reader', daemon=True).start()
+            self._pool = asyncio.run_coroutine_threadsafe(self._create_pool(), loop).result(self.timeout)
+            self._loop = loop
+
+    async def _create_pool(self):
+        import asyncpg
+
+        async def init(conn):
+            for pg_type in ('json', 'jsonb'):
+                await conn.set_type_codec(pg_type, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+        return await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size, init=init)
+
+    async def _fetchrows(self, queries):
+        import asyncio
+
+        async def one(query, args):
+            async with self._pool.acquire() as conn:
+                return await conn.fetchrow(native_sql(query), *args)
+
+        return await asyncio.gather(*(one(query, args) for query, args in queries))
+
+    def fetchrows(self, queries: list) -> list:
+        """[(sql, args), ...] -> [строка или None, ...]; запросы идут параллельно на разных соединениях."""
+        import asyncio
+
+        if self._loop is None:
+            self._start()
+        self.stats['batches'] += 1
+        self.stats['queries'] += len(queries)
+        return asyncio.run_coroutine_threadsafe(self._fetchrows(queries), self._loop).result(self.timeout)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, pool_size=self.pool_size)
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    """AsyncReader контейнера или None, если ASYNC_READS выключен или asyncpg не установлен."""
+    global _reader
+    if not ENABLED:
+        return None
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                try:
+                    import asyncpg  # noqa: F401
+                except ImportError:
+                    _reader = False
+                else:
+                    dsn = os.environ.get('DATABASE_REPLICA_URL') or os.environ['DATABASE_URL']
+                    _reader = AsyncReader(dsn, POOL_SIZE, TIMEOUT)
+    return _reader or None
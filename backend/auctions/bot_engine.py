@@ -0,0 +1,62 @@
+"""
+Бот-ставки: аукционы с ценой ниже bot_threshold получают ставку бота за BOT_BID_BEFORE секунд
+до дедлайна, пачками по одной транзакции на BOT_BATCH_SIZE аукционов
+
+Запуск воркера: python bot_engine.py
+"""
+import os
+import threading
+import time
+from db import get_db, release_db
+
+
+class BotEngine:
+    """Каждый тик вызывает place_bot_bids() пачками, пока пачка полная.
+
+    Аукцион, который сейчас держит ставка пользователя, пропускается (SKIP LOCKED) и
+    получит ставку бота на следующем тике, поэтому движок не ждёт пользователей, а
+    пользователь ждёт бота не дольше одной короткой пачки.
+    """
+
+    def __init__(self, batch_size: int = 50, bid_before: float = 3.0, tick_interval: float = 0.5):
+        self.batch_size = batch_size
+        self.bid_before = bid_before
+        self.tick_interval = tick_interval
+        self.stats = {'bids': 0, 'batches': 0, 'ticks': 0, 'batch_seconds': 0.0}
+
+    def tick(self, conn, cur) -> int:
+        placed = 0
+        while True:
+            started = time.perf_counter()
+            cur.execute("SELECT place_bot_bids(%s * INTERVAL '1 second', %s)", (self.bid_before, self.batch_size))
+            count = cur.fetchone()[0]
+            conn.commit()
+            self.stats['batch_seconds'] += time.perf_counter() - started
+            self.stats['batches'] += 1
+            placed += count
+            if count < self.batch_size:
+                break
+        self.stats['bids'] += placed
+        self.stats['ticks'] += 1
+        return placed
+
+    def run(self, stop: threading.Event = None):
+        stop = stop or threading.Event()
+        conn = get_db()
+        try:
+            cur = conn.cursor()
+            while not stop.is_set():
+                started = time.monotonic()
+                self.tick(conn, cur)
+                stop.wait(max(0.0, self.tick_interval - (time.monotonic() - started)))
+            cur.close()
+        finally:
+            release_db(conn)
+
+
+if __name__ == '__main__':
+    BotEngine(
+        batch_size=int(os.environ.get('BOT_BATCH_SIZE', 50)),
+        bid_before=float(os.environ.get('BOT_BID_BEFORE', 3.0)),
+        tick_interval=float(os.environ.get('BOT_TICK_INTERVAL', 0.5))
+    ).run()
@@ -0,0 +1,164 @@
+"""
+Кэш карточек аукционов: локальный TTL+LRU в контейнере и опциональный общий кэш (Redis)
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats['misses'] += 1
+                return MISSING
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedCache:
+    """Замена общего кэша для локальных прогонов: тот же интерфейс, что у RedisSharedCache."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= time.time():
+                self._data.pop(key, None)
+                return None
+            return json.loads(item[0])
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (json.dumps(value), time.time() + ttl)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisSharedCache:
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2)
+
+    def get(self, key: str):
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value, ttl: float):
+        self._client.set(key, json.dumps(value), px=int(ttl * 1000))
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+
+class DetailsCache:
+    """Статика карточки (название, описание, категория, поставщик, рейтинг) живёт долго
+    и может лежать в общем кэше; динамика (цена, ставки, участники) — коротко и
+    сбрасывается ставкой, прошедшей через этот контейнер.
+    """
+
+    def __init__(self, shared=None, static_ttl: float = 300.0, dynamic_ttl: float = 1.0, max_size: int = 1024):
+        self.static = TTLCache(max_size, static_ttl)
+        self.dynamic = TTLCache(max_size, dynamic_ttl)
+        self.shared = shared
+        self.stats = {'shared_hits': 0, 'shared_misses': 0, 'shared_errors': 0}
+
+    def get_static(self, auction_id: str):
+        value = self.static.get(auction_id)
+        if value is not MISSING or self.shared is None:
+            return value
+        try:
+            value = self.shared.get(f'auction:static:{auction_id}')
+        except Exception:
+            self.stats['shared_errors'] += 1
+            return MISSING
+        if value is None:
+            self.stats['shared_misses'] += 1
+            return MISSING
+        self.stats['shared_hits'] += 1
+        self.static.set(auction_id, value)
+        return value
+
+    def set_static(self, auction_id: str, value: dict):
+        self.static.set(auction_id, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(f'auction:static:{auction_id}', value, self.static.ttl)
+            except Exception:
+                self.stats['shared_errors'] += 1
+
+    def get_dynamic(self, auction_id: str):
+        return self.dynamic.get(auction_id)
+
+    def set_dynamic(self, auction_id: str, value: dict):
+        self.dynamic.set(auction_id, value)
+
+    def on_bid(self, auction_id: str):
+        self.dynamic.invalidate(auction_id)
+
+    def snapshot(self) -> dict:
+        return {'static': dict(self.static.stats), 'dynamic': dict(self.dynamic.stats), **self.stats}
+
+
+_details_cache = None
+_details_cache_lock = threading.Lock()
+
+
+def get_details_cache() -> DetailsCache:
+    global _details_cache
+    if _details_cache is None:
+        with _details_cache_lock:
+            if _details_cache is None:
+                url = os.environ.get('DETAILS_SHARED_CACHE_URL')
+                _details_cache = DetailsCache(
+                    shared=RedisSharedCache(url) if url else None,
+                    static_ttl=float(os.environ.get('DETAILS_STATIC_TTL', 300)),
+                    dynamic_ttl=float(os.environ.get('DETAILS_DYNAMIC_TTL', 1)),
+                    max_size=int(os.environ.get('DETAILS_CACHE_SIZE', 1024))
+                )
+    return _details_cache
+
+
+def set_details_cache(cache: DetailsCache):
+    global _details_cache
+    _details_cache = cache
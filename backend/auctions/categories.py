@@ -0,0 +1,91 @@
+"""
+Дерево категорий в памяти контейнера: разворачивает категорию в её активное поддерево для
+фильтра action=list
+
+Дерево читается из categories целиком один раз и перечитывается, когда меняются
+MAX(version) или число строк (версии категорий даёт миграция V0018). Проверка делается не
+чаще раза в CATEGORY_TREE_INTERVAL секунд. Выключенная категория скрывает всё своё поддерево;
+потомки обходятся в порядке sort_order, id.
+"""
+import os
+import threading
+import time
+
+
+class CategoryTree:
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.stats = {'checks': 0, 'loads': 0}
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self.marker = None
+        # id -> (is_active, дети в порядке sort_order, id)
+        self._nodes = {}
+
+    def subtree(self, request, category_id: int) -> list:
+        """
+        id категории и её активных потомков; выключенная категория — пустой список,
+        неизвестная (ещё не подгруженная) остаётся сама собой.
+        """
+        self.refresh(request.cur)
+        nodes = self._nodes
+        node = nodes.get(category_id)
+        if node is None:
+            return [category_id]
+        if not node[0]:
+            return []
+        ids = []
+        stack = [category_id]
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            ids.append(current)
+            stack.extend(child for child in reversed(nodes[current][1]) if nodes[child][0])
+        return ids
+
+    def refresh(self, cur):
+        if time.monotonic() < self._next_check:
+            return
+        if not self._lock.acquire(blocking=not self._nodes):
+            return
+        try:
+            if time.monotonic() < self._next_check:
+                return
+            cur.execute("SELECT COALESCE(MAX(version), 0) || ':' || COUNT(*) FROM categories")
+            marker = cur.fetchone()[0]
+            self.stats['checks'] += 1
+            if marker != self.marker:
+                self._load(cur)
+                self.marker = marker
+            self._next_check = time.monotonic() + self.refresh_interval
+        finally:
+            self._lock.release()
+
+    def _load(self, cur):
+        cur.execute("SELECT id, parent_id, is_active FROM categories ORDER BY sort_order, id")
+        rows = cur.fetchall()
+        nodes = {row[0]: (bool(row[2]), []) for row in rows}
+        for category_id, parent_id, _ in rows:
+            if parent_id in nodes:
+                nodes[parent_id][1].append(category_id)
+        self._nodes = nodes
+        self.stats['loads'] += 1
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, categories=len(self._nodes))
+
+
+_tree = None
+_tree_lock = threading.Lock()
+
+
+def get_category_tree() -> CategoryTree:
+    global _tree
+    if _tree is None:
+        with _tree_lock:
+            if _tree is None:
+                _tree = CategoryTree(refresh_interval=float(os.environ.get('CATEGORY_TREE_INTERVAL', 5)))
+    return _tree
@@ -0,0 +1,153 @@
+"""
+Пул соединений с PostgreSQL, переживающий тёплые вызовы функции
+
+psycopg2 импортируется при первом соединении, а не при загрузке модуля: OPTIONS и
+ответы без базы не платят за загрузку драйвера на холодном старте.
+"""
+import os
+import threading
+import time
+from instrument import span, cursor_factory
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, dsn: str, max_size: int = 4, timeout: float = 5.0, check_after: float = 30.0):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self.stats = {'checkouts': 0, 'waits': 0, 'creates': 0, 'reconnects': 0, 'discards': 0}
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        conn = None
+        with self._cond:
+            self.stats['checkouts'] += 1
+            waited = False
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                if not waited:
+                    self.stats['waits'] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted('Нет свободных соединений с БД')
+                self._cond.wait(remaining)
+
+        if conn is None:
+            return self._connect()
+
+        if not self._is_alive(conn, last_used):
+            self._close_quietly(conn)
+            with self._cond:
+                self.stats['reconnects'] += 1
+            return self._connect()
+
+        return conn
+
+    def putconn(self, conn):
+        import psycopg2
+        import psycopg2.extensions
+
+        if not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                self._close_quietly(conn)
+
+        with self._cond:
+            if conn.closed:
+                self._size -= 1
+                self.stats['discards'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return dict(self.stats, size=self._size, idle=len(self._idle), max_size=self.max_size)
+
+    def _connect(self):
+        import psycopg2
+
+        try:
+            conn = psycopg2.connect(self.dsn, cursor_factory=cursor_factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats['creates'] += 1
+        return conn
+
+    def _is_alive(self, conn, last_used: float) -> bool:
+        import psycopg2
+
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        import psycopg2
+
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(env_var: str = 'DATABASE_URL') -> ConnectionPool:
+    pool = _pools.get(env_var)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(env_var)
+            if pool is None:
+                pool = ConnectionPool(
+                    os.environ[env_var],
+                    max_size=int(os.environ.get('DB_POOL_SIZE', 4)),
+                    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+                    check_after=float(os.environ.get('DB_POOL_CHECK_AFTER', 30))
+                )
+                _pools[env_var] = pool
+    return pool
+
+
+def get_db(env_var: str = 'DATABASE_URL'):
+    with span('db.acquire'):
+        return get_pool(env_var).getconn()
+
+
+def release_db(conn, env_var: str = 'DATABASE_URL'):
+    get_pool(env_var).putconn(conn)
+
+
+def pool_stats() -> dict:
+    return {name: pool.snapshot() for name, pool in _pools.items()}
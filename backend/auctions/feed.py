@@ -0,0 +1,230 @@
+"""
+Документ главной страницы (action=feed): первая страница активных аукционов, категории и
+баннеры одним готовым JSON в памяти контейнера, с ETag для условного GET
+
+Раз в FEED_REFRESH_INTERVAL секунд один из запросов сверяет версии с базой и дописывает
+изменения: из аукционов читаются только строки с change_xid не ниже xmin снимка прошлой
+сверки (как since в action=list), которые входят в окно первой страницы или претендуют на него; категории и баннеры перечитываются целиком, если
+изменились их MAX(version) или число строк. Окна показа баннеров (start_date/end_date)
+пересчитываются по часам базы без запроса. Остальные запросы отдают готовое тело и его
+сжатые варианты, не занимая соединение.
+"""
+import os
+import threading
+import time
+
+from router import CORS_HEADERS, JSON_HEADERS
+from serialize import compress, encode, row_mapper
+
+MAX_ENCODINGS = 16
+
+AUCTIONS_SQL = """
+    SELECT a.id, a.title, a.image_url, a.current_price, a.total_bids, a.ends_at, a.timer_seconds,
+           a.retail_price, a.min_price_limit, a.status, a.winner_id, a.buy_it_now_deadline,
+           a.bot_bids_count, a.started_at, c.name, s.name
+    FROM auctions a
+    LEFT JOIN categories c ON a.category_id = c.id
+    LEFT JOIN suppliers s ON a.supplier_id = s.id
+"""
+
+feed_auction_row = row_mapper((
+    'id', 'title', 'image', 'currentPrice', 'totalBids', 'endsAt', 'timerSeconds', 'retail', 'minPrice',
+    'status', 'winnerId', 'buyItNowDeadline', 'botBidsCount', 'startedAt', 'category', 'supplier'
+))
+category_row = row_mapper(('id', 'name', 'slug', 'parentId', 'sortOrder'))
+banner_row = row_mapper(('id', 'title', 'image', 'link', 'position'))
+
+
+def _window_key(row):
+    return row[13], row[0]
+
+
+class FeedDocument:
+    """Готовое тело документа; ответы по Accept-Encoding сжимаются один раз на документ."""
+
+    def __init__(self, version: int, body: str):
+        import hashlib
+
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+        self.headers = dict(JSON_HEADERS, **{'ETag': self.etag, 'Access-Control-Expose-Headers': 'ETag'})
+        self._responses = {}
+
+    def response(self, accept_encoding: str = None) -> dict:
+        key = accept_encoding or ''
+        cached = self._responses.get(key)
+        if cached is None:
+            cached = compress({'statusCode': 200, 'headers': self.headers, 'body': self.body}, accept_encoding)
+            if len(self._responses) < MAX_ENCODINGS:
+                self._responses[key] = cached
+        return dict(cached, headers=dict(cached['headers']))
+
+    def not_modified(self) -> dict:
+        return {
+            'statusCode': 304,
+            'headers': dict(CORS_HEADERS, **{'ETag': self.etag, 'Access-Control-Expose-Headers': 'ETag'}),
+            'body': ''
+        }
+
+
+class Feed:
+    def __init__(self, size: int = 50, refresh_interval: float = 1.0, catalog_ttl: float = 60.0):
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.catalog_ttl = catalog_ttl
+        self.document = None
+        self.stats = {'refreshes': 0, 'rebuilds': 0, 'window_reloads': 0, 'catalog_reloads': 0, 'changed_rows': 0}
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._catalog_checked = 0.0
+        self._catalog_marker = None
+        self._auction_version = 0
+        self._xmin = None
+        self._window = []
+        self._categories = []
+        self._banners = []
+        self._visible = None
+
+    def current(self, request) -> FeedDocument:
+        """Документ из памяти; проверку версий делает один запрос в FEED_REFRESH_INTERVAL, остальные её не ждут."""
+        if self.document is not None and time.monotonic() < self._next_check:
+            return self.document
+        if not self._lock.acquire(blocking=self.document is None):
+            return self.document
+        try:
+            if self.document is None or time.monotonic() >= self._next_check:
+                self.refresh(request.cur)
+                self._next_check = time.monotonic() + self.refresh_interval
+        finally:
+            self._lock.release()
+        return self.document
+
+    def refresh(self, cur):
+        cur.execute("""
+            SELECT LOCALTIMESTAMP, EXTRACT(EPOCH FROM LOCALTIMESTAMP)::float8,
+                   pg_snapshot_xmin(pg_current_snapshot())::text,
+                   (SELECT COALESCE(MAX(version), 0) FROM auctions),
+                   (SELECT COALESCE(MAX(version), 0) || ':' || COUNT(*) FROM categories),
+                   (SELECT COALESCE(MAX(version), 0) || ':' || COUNT(*) FROM banners)
+        """)
+        server_time, db_now, xmin, auction_version, categories_marker, banners_marker = cur.fetchone()
+        self.stats['refreshes'] += 1
+        changed = self.document is None
+
+        expired = time.monotonic() - self._catalog_checked >= self.catalog_ttl
+        if expired or (categories_marker, banners_marker) != self._catalog_marker:
+            changed |= self._load_catalog(cur)
+            self._catalog_marker = (categories_marker, banners_marker)
+            self._catalog_checked = time.monotonic()
+
+        # Поздний коммит с меньшей версией не двигает MAX(version), но его завершение двигает xmin
+        if self.document is None or expired:
+            changed |= self._reload_window(cur)
+        elif auction_version != self._auction_version or xmin != self._xmin:
+            changed |= self._apply_changes(cur)
+        self._auction_version = auction_version
+        self._xmin = xmin
+
+        visible = tuple(
+            banner for start, end, banner in self._banners
+            if (start is None or start <= db_now) and (end is None or end > db_now)
+        )
+        if visible != self._visible:
+            self._visible = visible
+            changed = True
+
+        if changed:
+            self._build(auction_version, server_time)
+
+    def _load_catalog(self, cur) -> bool:
+        cur.execute("""
+            SELECT id, name, slug, parent_id, sort_order FROM categories
+            WHERE is_active = true
+            ORDER BY sort_order, id
+        """)
+        categories = [category_row(row) for row in cur.fetchall()]
+        cur.execute("""
+            SELECT id, title, image_url, link, position,
+                   EXTRACT(EPOCH FROM start_date)::float8, EXTRACT(EPOCH FROM end_date)::float8
+            FROM banners
+            WHERE is_active = true
+            ORDER BY position, id
+        """)
+        banners = [(row[5], row[6], banner_row(row)) for row in cur.fetchall()]
+        self.stats['catalog_reloads'] += 1
+        changed = categories != self._categories or banners != self._banners
+        self._categories = categories
+        self._banners = banners
+        return changed
+
+    def _reload_window(self, cur) -> bool:
+        cur.execute(AUCTIONS_SQL + """
+            WHERE a.status = 'active'
+            ORDER BY a.started_at DESC, a.id DESC
+            LIMIT %s
+        """, (self.size,))
+        window = cur.fetchall()
+        self.stats['window_reloads'] += 1
+        changed = window != self._window
+        self._window = window
+        return changed
+
+    def _apply_changes(self, cur) -> bool:
+        """Изменившиеся аукционы окна и активные аукционы новее последнего в окне."""
+        window = self._window
+        query = AUCTIONS_SQL + " WHERE a.change_xid >= %s::text::xid8 AND (a.id = ANY(%s) OR (a.status = 'active'"
+        params = [self._xmin, [row[0] for row in window]]
+        if len(window) >= self.size:
+            query += " AND (a.started_at, a.id) > (%s, %s)"
+            params.extend(_window_key(window[-1]))
+        cur.execute(query + "))", params)
+        rows = cur.fetchall()
+        if not rows:
+            return False
+        self.stats['changed_rows'] += len(rows)
+
+        by_id = {row[0]: row for row in window}
+        for row in rows:
+            if row[9] == 'active':
+                by_id[row[0]] = row
+            else:
+                by_id.pop(row[0], None)
+        merged = sorted(by_id.values(), key=_window_key, reverse=True)
+        if len(merged) < self.size <= len(window):
+            return self._reload_window(cur)
+        merged = merged[:self.size]
+        changed = merged != window
+        self._window = merged
+        return changed
+
+    def _build(self, version: int, server_time):
+        body = encode({
+            'version': version,
+            'serverTime': server_time,
+            'auctions': [feed_auction_row(row) for row in self._window],
+            'categories': self._categories,
+            'banners': list(self._visible)
+        })
+        self.document = FeedDocument(version, body)
+        self.stats['rebuilds'] += 1
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, auctions=len(self._window), version=self._auction_version)
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed() -> Feed:
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = Feed(
+                    size=int(os.environ.get('FEED_SIZE', 50)),
+                    refresh_interval=float(os.environ.get('FEED_REFRESH_INTERVAL', 1.0)),
+                    catalog_ttl=float(os.environ.get('FEED_CATALOG_TTL', 60))
+                )
+    return _feed
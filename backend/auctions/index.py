@@ -1,303 +1,308 @@
 """
 API для управления аукционами и ставками
 """
-import json
-import os
-import psycopg2
-import jwt
-from datetime import datetime, timedelta
+from instrument import instrumented
+from router import Router, response, error, CORS_HEADERS
+from sequencer import get_sequencer
+from pagination import page_size, decode_cursor, decode_keys, encode_keys, split_page
+from cache import get_details_cache, MISSING
+from feed import get_feed
+from categories import get_category_tree
+from serialize import row_mapper
+from aio import get_reader
+from replica import ENABLED as REPLICA_ENABLED, note_write
 
-def get_db():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+BID_ERRORS = {
+    'insufficient_funds': (400, 'Недостаточно средств на балансе'),
+    'not_found': (404, 'Аукцион не найден'),
+    'ended': (400, 'Аукцион завершен'),
+    'no_jumper': (403, 'No Jumper: лимит достигнут')
+}
 
-def verify_token(token: str):
-    try:
-        return jwt.decode(token, os.environ['JWT_SECRET'], algorithms=['HS256'])
-    except:
-        return None
+# Дедлайн вместо оставшихся секунд: тело не меняется со временем, поэтому 304 по ETag
+# не замораживает отсчёт; остаток клиент считает по endsAt и serverTime ответа
+auction_row = row_mapper((
+    'id', 'title', 'image', 'currentPrice', 'totalBids', 'endsAt', 'timerSeconds', 'retail', 'minPrice',
+    'status', 'winnerId', 'buyItNowDeadline', 'botBidsCount', 'startedAt', 'category', 'supplier'
+))
 
-def handler(event, context):
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
+router = Router(default_action='list', allow_headers='Content-Type, X-Auth-Token, X-Min-LSN, If-None-Match')
+
+
+@router.route('list', 'GET', read_only=True)
+def list_auctions(request):
+    cur = request.cur
+    params = request.params
+    category_id = params.get('category_id')
+    status = params.get('status', 'active')
+    limit = page_size(params.get('limit'))
+    since = params.get('since') or None
+    cursor = params.get('cursor')
+
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return error(400, 'Некорректное значение since')
+        if since < 0:
+            return error(400, 'Некорректное значение since')
+
+    if cursor:
+        try:
+            if since is not None:
+                next_since, cursor_xid, cursor_id = decode_keys(cursor, 3)
+            else:
+                cursor_started_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            return error(400, 'Некорректный курсор')
+
+    if category_id:
+        tree = get_category_tree()
+        try:
+            category_ids = tree.subtree(request, int(category_id))
+        except ValueError:
+            return error(400, 'Некорректная категория')
+
+    cur.execute("""
+        SELECT COALESCE(MAX(version), 0), pg_snapshot_xmin(pg_current_snapshot())::text, LOCALTIMESTAMP
+        FROM auctions
+    """)
+    version, xmin, server_time = cur.fetchone()
+    # Поздний коммит с меньшей версией не меняет MAX(version), но его завершение двигает xmin,
+    # поэтому xmin входит в ETag. Поддерево зависит и от categories: включение категории
+    # меняет выдачу без новых версий аукционов
+    etag = f'"{version}:{xmin}:{tree.marker}"' if category_id else f'"{version}:{xmin}"'
+
+    # Дельта не проверяет ETag: она всегда читает от своего since
+    if since is None and request.header('If-None-Match') == etag:
         return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token'
-            },
+            'statusCode': 304,
+            'headers': dict(CORS_HEADERS, **{'ETag': etag, 'Access-Control-Expose-Headers': 'ETag'}),
             'body': ''
         }
-    
-    query_params = event.get('queryStringParameters', {}) or {}
-    path = query_params.get('action', 'list')
-    
+
+    if category_id and not category_ids:
+        # Выключенная категория: пустая страница с тем же ETag, включение сменит tree.marker
+        return response(200, {'version': version, 'serverTime': server_time, 'nextCursor': None,
+                              'since': int(xmin), 'auctions': []},
+                        {'ETag': etag, 'Access-Control-Expose-Headers': 'ETag'})
+
+    query = """
+        SELECT a.id, a.title, a.image_url, a.current_price, a.total_bids, a.ends_at, a.timer_seconds,
+               a.retail_price, a.min_price_limit, a.status,
+               a.winner_id, a.buy_it_now_deadline, a.bot_bids_count, a.started_at,
+               c.name as category_name, s.name as supplier_name, a.change_xid::text
+        FROM auctions a
+        LEFT JOIN categories c ON a.category_id = c.id
+        LEFT JOIN suppliers s ON a.supplier_id = s.id
+    """
+
+    if since is not None:
+        # since — водяной знак: все транзакции с меньшим id завершились к прошлому чтению
+        query += " WHERE a.change_xid >= %s::text::xid8"
+        query_params = [since]
+    else:
+        query += " WHERE a.status = %s"
+        query_params = [status]
+
+    if category_id:
+        # Лист фильтруется равенством: так остаётся упорядоченный проход по idx_auctions_status_category_started
+        if len(category_ids) == 1:
+            query += " AND a.category_id = %s"
+            query_params.append(category_ids[0])
+        else:
+            query += " AND a.category_id = ANY(%s)"
+            query_params.append(category_ids)
+
+    if since is not None:
+        if cursor:
+            query += " AND (a.change_xid, a.id) > (%s::text::xid8, %s)"
+            query_params.extend([cursor_xid, cursor_id])
+        else:
+            next_since = int(xmin)
+        query += " ORDER BY a.change_xid, a.id LIMIT %s"
+        query_params.append(limit + 1)
+    else:
+        if cursor:
+            query += " AND (a.started_at, a.id) < (%s, %s)"
+            query_params.extend([cursor_started_at, cursor_id])
+        query += " ORDER BY a.started_at DESC, a.id DESC LIMIT %s"
+        query_params.append(limit + 1)
+
+    cur.execute(query, query_params)
+    rows = cur.fetchall()
+    body = {'version': version, 'serverTime': server_time}
+
+    if since is not None:
+        # Страницы одной дельты идут по (change_xid, id) от того же since; следующий since —
+        # xmin первой страницы, чтобы не пропустить транзакции, закоммиченные во время обхода
+        if len(rows) > limit:
+            rows = rows[:limit]
+            body['nextCursor'] = encode_keys(next_since, int(rows[-1][16]), rows[-1][0])
+            body['since'] = since
+        else:
+            body['nextCursor'] = None
+            body['since'] = next_since
+    else:
+        rows, body['nextCursor'] = split_page(rows, limit, lambda row: (row[13], row[0]))
+        body['since'] = int(xmin)
+
+    body['auctions'] = [auction_row(row) for row in rows]
+    return response(200, body, {'ETag': etag, 'Access-Control-Expose-Headers': 'ETag'})
+
+
+@router.route('feed', 'GET', read_only=True)
+def feed(request):
+    document = get_feed().current(request)
+
+    if request.header('If-None-Match') == document.etag:
+        return document.not_modified()
+
+    return document.response(request.header('Accept-Encoding'))
+
+
+DETAILS_STATIC_SQL = """
+    SELECT a.id, a.title, a.description, a.image_url, a.retail_price, a.min_price_limit,
+           a.ships_by, a.started_at,
+           c.name as category_name, s.name as supplier_name,
+           s.rating as supplier_rating
+    FROM auctions a
+    LEFT JOIN categories c ON a.category_id = c.id
+    LEFT JOIN suppliers s ON a.supplier_id = s.id
+    WHERE a.id = %s
+"""
+
+DETAILS_DYNAMIC_SQL = """
+    SELECT a.current_price, a.total_bids,
+           CASE WHEN a.ends_at IS NULL THEN a.timer_seconds
+                ELSE GREATEST(0, CEIL(EXTRACT(EPOCH FROM a.ends_at - LOCALTIMESTAMP)))::int END,
+           a.status, a.winner_id, a.buy_it_now_deadline, a.bot_bids_count, a.ended_at,
+           a.unique_bidders, a.ends_at, a.timer_seconds,
+           (SELECT COALESCE(json_agg(json_build_object('userId', ep.user_id, 'joinedAt', ep.joined_at)
+                                     ORDER BY ep.joined_at), '[]'::json)
+            FROM (SELECT user_id, joined_at FROM early_participants
+                  WHERE auction_id = a.id ORDER BY joined_at LIMIT 10) ep)
+    FROM auctions a
+    WHERE a.id = %s
+"""
+
+
+def details_static(row) -> dict:
+    return {
+        'id': row[0],
+        'title': row[1],
+        'description': row[2],
+        'image': row[3],
+        'retail': float(row[4]),
+        'minPrice': float(row[5]),
+        'shipsBy': row[6].isoformat() if row[6] else None,
+        'startedAt': row[7].isoformat() if row[7] else None,
+        'category': row[8],
+        'supplier': row[9],
+        'supplierRating': float(row[10]) if row[10] else 0
+    }
+
+
+def details_dynamic(row) -> dict:
+    return {
+        'currentPrice': float(row[0]),
+        'totalBids': row[1],
+        'timeLeft': row[2],
+        'status': row[3],
+        'winnerId': row[4],
+        'buyItNowDeadline': row[5].isoformat() if row[5] else None,
+        'botBidsCount': row[6],
+        'endedAt': row[7].isoformat() if row[7] else None,
+        'uniqueBidders': row[8],
+        'endsAt': row[9].isoformat() if row[9] else None,
+        'timerSeconds': row[10],
+        'earlyParticipants': row[11]
+    }
+
+
+@router.route('details', 'GET', read_only=True)
+def auction_details(request):
+    auction_id = request.params.get('id')
+
+    if not auction_id:
+        return error(400, 'ID аукциона обязателен')
+
+    details_cache = get_details_cache()
+    static = details_cache.get_static(auction_id)
+    dynamic = details_cache.get_dynamic(auction_id)
+    reader = get_reader()
+
+    if static is MISSING and dynamic is MISSING and reader:
+        static_row, dynamic_row = reader.fetchrows([
+            (DETAILS_STATIC_SQL, (int(auction_id),)),
+            (DETAILS_DYNAMIC_SQL, (int(auction_id),))
+        ])
+    else:
+        static_row = dynamic_row = None
+        if static is MISSING:
+            request.cur.execute(DETAILS_STATIC_SQL, (auction_id,))
+            static_row = request.cur.fetchone()
+        if dynamic is MISSING and (static is not MISSING or static_row):
+            request.cur.execute(DETAILS_DYNAMIC_SQL, (auction_id,))
+            dynamic_row = request.cur.fetchone()
+
+    if static is MISSING:
+        if not static_row:
+            return error(404, 'Аукцион не найден')
+        static = details_static(static_row)
+        details_cache.set_static(auction_id, static)
+
+    if dynamic is MISSING:
+        if not dynamic_row:
+            return error(404, 'Аукцион не найден')
+        dynamic = details_dynamic(dynamic_row)
+        details_cache.set_dynamic(auction_id, dynamic)
+
+    return response(200, {**static, **dynamic})
+
+
+@router.route('bid', 'POST', auth=True)
+def place_bid(request):
+    user_id = request.user_id
+    auction_id = request.body.get('auction_id')
+
+    if not auction_id:
+        return error(400, 'ID аукциона обязателен')
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        if path == 'list' and method == 'GET':
-            params = event.get('queryStringParameters', {}) or {}
-            category_id = params.get('category_id')
-            status = params.get('status', 'active')
-            limit = int(params.get('limit', 50))
-            
-            query = """
-                SELECT a.id, a.title, a.image_url, a.current_price, a.total_bids, 
-                       a.timer_seconds, a.retail_price, a.min_price_limit, a.status,
-                       a.winner_id, a.buy_it_now_deadline, a.bot_bids_count, a.started_at,
-                       c.name as category_name, s.name as supplier_name
-                FROM auctions a
-                LEFT JOIN categories c ON a.category_id = c.id
-                LEFT JOIN suppliers s ON a.supplier_id = s.id
-                WHERE a.status = %s
-            """
-            
-            query_params = [status]
-            
-            if category_id:
-                query += " AND a.category_id = %s"
-                query_params.append(category_id)
-            
-            query += " ORDER BY a.started_at DESC LIMIT %s"
-            query_params.append(limit)
-            
-            cur.execute(query, query_params)
-            
-            auctions = []
-            for row in cur.fetchall():
-                auctions.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'image': row[2],
-                    'currentPrice': float(row[3]),
-                    'totalBids': row[4],
-                    'timeLeft': row[5],
-                    'retail': float(row[6]),
-                    'minPrice': float(row[7]),
-                    'status': row[8],
-                    'winnerId': row[9],
-                    'buyItNowDeadline': row[10].isoformat() if row[10] else None,
-                    'botBidsCount': row[11],
-                    'startedAt': row[12].isoformat() if row[12] else None,
-                    'category': row[13],
-                    'supplier': row[14]
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'auctions': auctions})
-            }
-        
-        elif path == 'details' and method == 'GET':
-            auction_id = event.get('queryStringParameters', {}).get('id')
-            
-            if not auction_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'ID аукциона обязателен'})
-                }
-            
-            cur.execute("""
-                SELECT a.id, a.title, a.description, a.image_url, a.current_price, 
-                       a.total_bids, a.timer_seconds, a.retail_price, a.min_price_limit, 
-                       a.status, a.winner_id, a.buy_it_now_deadline, a.bot_bids_count,
-                       a.ships_by, a.started_at, a.ended_at,
-                       c.name as category_name, s.name as supplier_name,
-                       s.rating as supplier_rating
-                FROM auctions a
-                LEFT JOIN categories c ON a.category_id = c.id
-                LEFT JOIN suppliers s ON a.supplier_id = s.id
-                WHERE a.id = %s
-            """, (auction_id,))
-            
-            row = cur.fetchone()
-            
-            if not row:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Аукцион не найден'})
-                }
-            
-            cur.execute("""
-                SELECT COUNT(DISTINCT user_id) FROM bids 
-                WHERE auction_id = %s AND is_bot = false
-            """, (auction_id,))
-            unique_bidders = cur.fetchone()[0]
-            
-            cur.execute("""
-                SELECT u.id, ep.joined_at
-                FROM early_participants ep
-                JOIN users u ON ep.user_id = u.id
-                WHERE ep.auction_id = %s
-                ORDER BY ep.joined_at
-                LIMIT 10
-            """, (auction_id,))
-            
-            early_participants = [{'userId': r[0], 'joinedAt': r[1].isoformat()} for r in cur.fetchall()]
-            
-            auction = {
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'image': row[3],
-                'currentPrice': float(row[4]),
-                'totalBids': row[5],
-                'timeLeft': row[6],
-                'retail': float(row[7]),
-                'minPrice': float(row[8]),
-                'status': row[9],
-                'winnerId': row[10],
-                'buyItNowDeadline': row[11].isoformat() if row[11] else None,
-                'botBidsCount': row[12],
-                'shipsBy': row[13].isoformat() if row[13] else None,
-                'startedAt': row[14].isoformat() if row[14] else None,
-                'endedAt': row[15].isoformat() if row[15] else None,
-                'category': row[16],
-                'supplier': row[17],
-                'supplierRating': float(row[18]) if row[18] else 0,
-                'uniqueBidders': unique_bidders,
-                'earlyParticipants': early_participants
-            }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(auction)
-            }
-        
-        elif path == 'bid' and method == 'POST':
-            auth_token = event.get('headers', {}).get('X-Auth-Token', '')
-            payload = verify_token(auth_token)
-            
-            if not payload:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Требуется авторизация'})
-                }
-            
-            user_id = payload['user_id']
-            data = json.loads(event.get('body', '{}'))
-            auction_id = data.get('auction_id')
-            
-            if not auction_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'ID аукциона обязателен'})
-                }
-            
-            cur.execute("SELECT balance FROM users WHERE id = %s", (user_id,))
-            user = cur.fetchone()
-            
-            if not user or user[0] < 50:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Недостаточно средств на балансе'})
-                }
-            
-            cur.execute("""
-                SELECT id, current_price, status, min_price_limit, winner_id
-                FROM auctions WHERE id = %s FOR UPDATE
-            """, (auction_id,))
-            
-            auction = cur.fetchone()
-            
-            if not auction:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Аукцион не найден'})
-                }
-            
-            if auction[2] != 'active' or auction[4]:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Аукцион завершен'})
-                }
-            
-            current_price = float(auction[1])
-            min_price = float(auction[3])
-            
-            if current_price >= min_price:
-                cur.execute("""
-                    SELECT 1 FROM early_participants 
-                    WHERE auction_id = %s AND user_id = %s
-                """, (auction_id, user_id))
-                
-                if not cur.fetchone():
-                    return {
-                        'statusCode': 403,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'No Jumper: лимит достигнут'})
-                    }
-            
-            new_price = current_price + 50
-            new_balance = user[0] - 50
-            
-            cur.execute("""
-                UPDATE users SET balance = %s WHERE id = %s
-            """, (new_balance, user_id))
-            
-            cur.execute("""
-                UPDATE auctions 
-                SET current_price = %s, total_bids = total_bids + 1, timer_seconds = 10
-                WHERE id = %s
-            """, (new_price, auction_id))
-            
-            cur.execute("""
-                INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
-                VALUES (%s, %s, 50, %s, false)
-            """, (auction_id, user_id, new_price))
-            
-            if current_price < min_price:
-                cur.execute("""
-                    INSERT INTO early_participants (auction_id, user_id)
-                    VALUES (%s, %s)
-                    ON CONFLICT (auction_id, user_id) DO NOTHING
-                """, (auction_id, user_id))
-            
+        auction_id = int(auction_id)
+    except (TypeError, ValueError):
+        return error(400, 'Некорректный ID аукциона')
+
+    sequencer = get_sequencer()
+
+    if sequencer:
+        # Соединение из пула берёт только лидер пачки
+        result, new_price, new_balance = sequencer.submit(lambda: request.conn, auction_id, user_id)
+    else:
+        conn, cur = request.conn, request.cur
+        conn.autocommit = True
+        try:
             cur.execute("""
-                INSERT INTO transactions (user_id, type, amount, balance_after, reference)
-                VALUES (%s, 'bid', -50, %s, 'Auction #' || %s)
-            """, (user_id, new_balance, auction_id))
-            
-            conn.commit()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'newPrice': float(new_price),
-                    'newBalance': float(new_balance)
-                })
-            }
-        
-        else:
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Endpoint не найден'})
-            }
-    
-    except Exception as e:
-        if 'conn' in locals():
-            conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+                SELECT result, new_price, new_balance FROM place_bid(%s, %s)
+            """, (auction_id, user_id))
+            result, new_price, new_balance = cur.fetchone()
+        finally:
+            conn.autocommit = False
+
+    if result != 'ok':
+        status_code, message = BID_ERRORS[result]
+        return error(status_code, message)
+
+    get_details_cache().on_bid(str(auction_id))
+    lsn = note_write(request.conn, user_id) if REPLICA_ENABLED else None
+
+    return response(200, {
+        'success': True,
+        'newPrice': float(new_price),
+        'newBalance': float(new_balance)
+    }, {'X-Min-LSN': lsn, 'Access-Control-Expose-Headers': 'X-Min-LSN'} if lsn else None)
+
+
+@instrumented(default_action='list', actions=router.names)
+def handler(event, context):
+    return router.dispatch(event, context)
@@ -0,0 +1,241 @@
+"""
+Живой поток цен (SSE): одно соединение LISTEN auction_updates раздаёт дельты всем подписчикам
+
+Запуск сервера: python live.py  (порт из LIVE_PORT, по умолчанию 8081)
+Подписка: GET /stream или /stream?ids=1,2,3
+"""
+import asyncio
+import json
+import os
+from urllib.parse import urlsplit, parse_qs
+
+CHANNEL = 'auction_updates'
+HEARTBEAT_SECONDS = 15
+RECONNECT_MIN = float(os.environ.get('LIVE_RECONNECT_MIN', 0.5))
+RECONNECT_MAX = float(os.environ.get('LIVE_RECONNECT_MAX', 30))
+RESYNC_FRAME = b'event: resync\ndata: {}\n\n'
+
+
+class Subscriber:
+    __slots__ = ('queue', 'ids', 'dropped')
+
+    def __init__(self, ids: frozenset = None, max_queue: int = 256):
+        self.queue = asyncio.Queue(max_queue)
+        self.ids = ids
+        self.dropped = 0
+
+
+class Broadcaster:
+    """Кодирует сообщение один раз и раскладывает по очередям подписчиков.
+
+    Медленный подписчик с заполненной очередью теряет сообщения, а не тормозит остальных.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.stats = {'published': 0, 'delivered': 0, 'dropped': 0, 'resyncs': 0}
+
+    def subscribe(self, ids: frozenset = None, max_queue: int = 256) -> Subscriber:
+        subscriber = Subscriber(ids, max_queue)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, auction_id: int, payload: str):
+        frame = f'data: {payload}\n\n'.encode()
+        self.stats['published'] += 1
+        for subscriber in self.subscribers:
+            if subscriber.ids is not None and auction_id not in subscriber.ids:
+                continue
+            try:
+                subscriber.queue.put_nowait(frame)
+                self.stats['delivered'] += 1
+            except asyncio.QueueFull:
+                subscriber.dropped += 1
+                self.stats['dropped'] += 1
+
+    def resync(self):
+        """Сообщает всем подписчикам, что часть обновлений потеряна и состояние нужно перечитать."""
+        self.stats['resyncs'] += 1
+        for subscriber in self.subscribers:
+            try:
+                subscriber.queue.put_nowait(RESYNC_FRAME)
+            except asyncio.QueueFull:
+                subscriber.dropped += 1
+                self.stats['dropped'] += 1
+
+
+class Listener:
+    """LISTEN-соединение, которое переживает обрыв (рестарт Postgres, таймаут простоя).
+
+    Ошибка чтения снимает сокет с цикла событий и переподключается с паузой от
+    RECONNECT_MIN до RECONNECT_MAX секунд, после чего снова выполняет LISTEN. Уведомления
+    за время разрыва потеряны, поэтому после переподключения подписчики получают событие
+    resync и перечитывают аукционы. TCP keepalive находит соединение, умершее без FIN.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, broadcaster: Broadcaster, dsn: str):
+        self.loop = loop
+        self.broadcaster = broadcaster
+        self.dsn = dsn
+        self.conn = None
+        self.stats = {'connects': 0, 'disconnects': 0, 'failed_connects': 0}
+        self._fd = None
+        self._delay = RECONNECT_MIN
+        self._closed = False
+
+    def connect(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        if self._closed:
+            return
+        try:
+            conn = psycopg2.connect(self.dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10,
+                                    keepalives_count=3)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f'LISTEN {CHANNEL}')
+        except psycopg2.OperationalError:
+            self.stats['failed_connects'] += 1
+            self._reconnect_later()
+            return
+        reconnected = self.stats['connects'] > 0
+        self.conn = conn
+        self._fd = conn.fileno()
+        self._delay = RECONNECT_MIN
+        self.stats['connects'] += 1
+        self.loop.add_reader(self._fd, self._on_readable)
+        if reconnected:
+            self.broadcaster.resync()
+
+    def _on_readable(self):
+        import psycopg2
+
+        try:
+            self.conn.poll()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.stats['disconnects'] += 1
+            self._drop()
+            self._reconnect_later()
+            return
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            self.broadcaster.publish(json.loads(notify.payload)['id'], notify.payload)
+
+    def _drop(self):
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+            self._fd = None
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def _reconnect_later(self):
+        if self._closed:
+            return
+        self.loop.call_later(self._delay, self.connect)
+        self._delay = min(self._delay * 2, RECONNECT_MAX)
+
+    def close(self):
+        self._closed = True
+        self._drop()
+
+
+def listen(loop: asyncio.AbstractEventLoop, broadcaster: Broadcaster, dsn: str) -> Listener:
+    listener = Listener(loop, broadcaster, dsn)
+    listener.connect()
+    return listener
+
+
+async def wait_disconnect(reader: asyncio.StreamReader, subscriber: Subscriber):
+    try:
+        while await reader.read(1024):
+            pass
+    except ConnectionError:
+        pass
+    while True:
+        try:
+            subscriber.queue.put_nowait(None)
+            return
+        except asyncio.QueueFull:
+            subscriber.queue.get_nowait()
+
+
+async def handle_client(broadcaster: Broadcaster, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = (await reader.readline()).decode('latin-1')
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.split()
+        if len(parts) < 2:
+            return
+        method, target = parts[0], parts[1]
+        url = urlsplit(target)
+
+        if method == 'OPTIONS':
+            writer.write(b'HTTP/1.1 204 No Content\r\n'
+                         b'Access-Control-Allow-Origin: *\r\n'
+                         b'Access-Control-Allow-Methods: GET, OPTIONS\r\n\r\n')
+            await writer.drain()
+            return
+
+        if method != 'GET' or url.path != '/stream':
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+            await writer.drain()
+            return
+
+        ids = None
+        raw_ids = parse_qs(url.query).get('ids')
+        if raw_ids:
+            ids = frozenset(int(i) for i in raw_ids[0].split(',') if i.strip().isdigit())
+
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\n'
+                     b'Connection: keep-alive\r\n'
+                     b'Access-Control-Allow-Origin: *\r\n\r\n')
+        await writer.drain()
+
+        subscriber = broadcaster.subscribe(ids)
+        watcher = asyncio.ensure_future(wait_disconnect(reader, subscriber))
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    frame = b': ping\n\n'
+                if frame is None:
+                    break
+                writer.write(frame)
+                await writer.drain()
+        finally:
+            watcher.cancel()
+            broadcaster.unsubscribe(subscriber)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(broadcaster: Broadcaster, host: str, port: int):
+    return await asyncio.start_server(
+        lambda r, w: handle_client(broadcaster, r, w), host, port
+    )
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    broadcaster = Broadcaster()
+    listen(loop, broadcaster, os.environ['DATABASE_URL'])
+    server = await serve(broadcaster, os.environ.get('LIVE_HOST', '0.0.0.0'), int(os.environ.get('LIVE_PORT', 8081)))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
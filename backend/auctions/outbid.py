@@ -0,0 +1,53 @@
+"""
+Уведомления «вашу ставку перебили»: ставка только кладёт событие в outbid_events, воркер
+разбирает очередь пачками и пишет уведомления одним INSERT на пачку
+
+    python outbid.py
+
+В пачке повторные события по одному аукциону схлопываются: каждый получатель (прошлый
+лидер или ранний участник) получает одно уведомление на аукцион, и новое не пишется,
+пока предыдущее о том же аукционе не прочитано.
+"""
+import os
+import threading
+from db import get_db, release_db
+
+BATCH_SIZE = int(os.environ.get('OUTBID_BATCH_SIZE', 1000))
+POLL_INTERVAL = float(os.environ.get('OUTBID_POLL_INTERVAL', 0.2))
+
+stats = {'events': 0, 'notified': 0, 'coalesced': 0, 'batches': 0}
+
+
+def drain(conn, batch_size: int = BATCH_SIZE) -> dict:
+    """Разбирает очередь пачками, пока она не опустеет."""
+    cur = conn.cursor()
+    total = {'events': 0, 'notified': 0, 'coalesced': 0, 'batches': 0}
+    while True:
+        cur.execute("SELECT * FROM fanout_outbid_events(%s)", (batch_size,))
+        events, notified, coalesced = cur.fetchone()
+        conn.commit()
+        if not events:
+            break
+        total['events'] += events
+        total['notified'] += notified
+        total['coalesced'] += coalesced
+        total['batches'] += 1
+    for key, value in total.items():
+        stats[key] += value
+    cur.close()
+    return total
+
+
+def run(stop: threading.Event = None):
+    stop = stop or threading.Event()
+    conn = get_db()
+    try:
+        while not stop.is_set():
+            if not drain(conn)['batches']:
+                stop.wait(POLL_INTERVAL)
+    finally:
+        release_db(conn)
+
+
+if __name__ == '__main__':
+    run()
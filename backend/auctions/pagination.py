@@ -0,0 +1,61 @@
+"""
+Курсорная (keyset) пагинация: курсор — непрозрачный base64 от (время, id) последней строки
+
+Время в ключе сортировки должно быть NOT NULL (auctions.started_at — V0021,
+transactions.created_at — V0012): NULL под DESC идёт первым и не кодируется в курсор.
+"""
+import base64
+import json
+
+MAX_PAGE_SIZE = 100
+
+
+def page_size(raw, default: int = 50) -> int:
+    try:
+        size = int(raw) if raw is not None else default
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(ts, row_id: int) -> str:
+    raw = json.dumps([ts.isoformat(), row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Возвращает (datetime, id); ValueError, если курсор повреждён."""
+    from datetime import datetime
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(row_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('invalid cursor') from e
+
+
+def encode_keys(*keys: int) -> str:
+    """Курсор из целых ключей (например, водяной знак и (change_xid, id) для since)."""
+    raw = json.dumps(keys, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_keys(cursor: str, count: int) -> tuple:
+    """Обратное к encode_keys; ValueError, если курсор повреждён."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        keys = tuple(int(key) for key in json.loads(raw))
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('invalid cursor') from e
+    if len(keys) != count or min(keys) < 0:
+        raise ValueError('invalid cursor')
+    return keys
+
+
+def split_page(rows: list, size: int, key):
+    """Отрезает лишнюю строку (запрашивается size + 1) и строит nextCursor из последней."""
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -0,0 +1,83 @@
+"""
+Обслуживание партиций bids и transactions: создание месяцев вперёд и архивация старых ставок
+
+    python partitions.py                       # создать партиции на PARTITION_MONTHS_AHEAD месяцев
+    python partitions.py --archive             # и свернуть в bid_archive месячные партиции ставок
+                                               # старше PARTITION_RETENTION_MONTHS, где все аукционы завершены
+    python partitions.py --archive --dry-run   # только показать кандидатов
+
+Запускается раз в сутки (cron / триггер-таймер). Партиция архивируется целиком: строки
+сворачиваются в bid_archive по (auction_id, user_id, is_bot), затем DETACH и DROP.
+Журнал transactions только нарезается по месяцам и не удаляется.
+"""
+import argparse
+import json
+import os
+from db import get_db, release_db
+
+TABLES = ('bids', 'transactions')
+MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 2))
+RETENTION_MONTHS = int(os.environ.get('PARTITION_RETENTION_MONTHS', 3))
+LOCK_TIMEOUT = os.environ.get('PARTITION_LOCK_TIMEOUT', '2s')
+
+
+def ensure(conn, months_ahead: int = MONTHS_AHEAD) -> list:
+    cur = conn.cursor()
+    created = []
+    for table in TABLES:
+        cur.execute("SELECT * FROM ensure_partitions(%s, %s)", (table, months_ahead))
+        created.extend(r[0] for r in cur.fetchall())
+    conn.commit()
+    cur.close()
+    return created
+
+
+def archive_candidates(cur, retention_months: int = RETENTION_MONTHS) -> list:
+    """Диапазонные партиции bids, которые целиком старше окна хранения, от старых к новым."""
+    cur.execute("""
+        SELECT partition, range_to
+        FROM time_partitions
+        WHERE parent = 'bids'
+          AND range_to IS NOT NULL
+          AND range_to <= date_trunc('month', LOCALTIMESTAMP) - make_interval(months => %s)
+        ORDER BY range_to
+    """, (retention_months,))
+    return cur.fetchall()
+
+
+def archive(conn, retention_months: int = RETENTION_MONTHS, dry_run: bool = False) -> dict:
+    cur = conn.cursor()
+    report = {}
+    for partition, range_to in archive_candidates(cur, retention_months):
+        if dry_run:
+            report[partition] = 'candidate'
+            continue
+        try:
+            cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+            cur.execute("SELECT archive_bid_partition(%s)", (partition,))
+            rows = cur.fetchone()[0]
+            conn.commit()
+            report[partition] = 'open auctions' if rows is None else {'summary_rows': rows}
+        except Exception as e:
+            conn.rollback()
+            report[partition] = f'error: {e}'.strip()
+    cur.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD)
+    parser.add_argument('--archive', action='store_true')
+    parser.add_argument('--retention-months', type=int, default=RETENTION_MONTHS)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    conn = get_db()
+    try:
+        report = {'created': [] if args.dry_run else ensure(conn, args.months_ahead)}
+        if args.archive:
+            report['archived'] = archive(conn, args.retention_months, args.dry_run)
+    finally:
+        release_db(conn)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
@@ -0,0 +1,110 @@
+"""
+Сверка счётчиков unique_bidders, total_bids, total_wins с исходными таблицами
+
+Ставки из заархивированных партиций (partitions.py) учитываются по сводкам bid_archive,
+total_bids — вместе с ещё не свёрнутыми счётчиками wallet_slots.
+
+    python reconcile_counters.py          # только отчёт о расхождениях
+    python reconcile_counters.py --fix    # пересобрать auction_bidders и исправить счётчики
+
+--fix записывает посчитанные значения поверх текущих, поэтому его запускают без живых ставок.
+"""
+import argparse
+import json
+from db import get_db, release_db
+
+CHECKS = {
+    'auctions.unique_bidders': """
+        SELECT a.id, a.unique_bidders, COALESCE(b.cnt, 0)
+        FROM auctions a
+        LEFT JOIN (
+            SELECT auction_id, COUNT(DISTINCT user_id) AS cnt
+            FROM (
+                SELECT auction_id, user_id FROM bids WHERE is_bot = false
+                UNION ALL
+                SELECT auction_id, user_id FROM bid_archive WHERE is_bot = false
+            ) all_bids
+            GROUP BY auction_id
+        ) b ON b.auction_id = a.id
+        WHERE a.unique_bidders <> COALESCE(b.cnt, 0)
+    """,
+    'users.total_bids': """
+        SELECT u.user_id, u.total_bids, COALESCE(b.cnt, 0)
+        FROM wallet_balances u
+        LEFT JOIN (
+            SELECT user_id, SUM(cnt)::BIGINT AS cnt
+            FROM (
+                SELECT user_id, COUNT(*) AS cnt FROM bids WHERE is_bot = false GROUP BY user_id
+                UNION ALL
+                SELECT user_id, SUM(bid_count) FROM bid_archive WHERE is_bot = false GROUP BY user_id
+            ) all_bids
+            GROUP BY user_id
+        ) b ON b.user_id = u.user_id
+        WHERE u.total_bids <> COALESCE(b.cnt, 0)
+    """,
+    'users.total_wins': """
+        SELECT u.id, u.total_wins, COALESCE(w.cnt, 0)
+        FROM users u
+        LEFT JOIN (
+            SELECT winner_id, COUNT(*) AS cnt
+            FROM auctions WHERE winner_id IS NOT NULL GROUP BY winner_id
+        ) w ON w.winner_id = u.id
+        WHERE u.total_wins <> COALESCE(w.cnt, 0)
+    """
+}
+
+FIXES = {
+    'auctions.unique_bidders': "UPDATE auctions SET unique_bidders = %s WHERE id = %s",
+    'users.total_bids': """
+        UPDATE users u
+        SET total_bids = %s - (SELECT COALESCE(SUM(s.bids), 0) FROM wallet_slots s WHERE s.user_id = u.id)
+        WHERE u.id = %s
+    """,
+    'users.total_wins': "UPDATE users SET total_wins = %s WHERE id = %s"
+}
+
+
+def reconcile(conn, fix: bool = False) -> dict:
+    cur = conn.cursor()
+    report = {}
+
+    if fix:
+        cur.execute("""
+            INSERT INTO auction_bidders (auction_id, user_id)
+            SELECT auction_id, user_id FROM bids
+            WHERE is_bot = false AND auction_id IS NOT NULL AND user_id IS NOT NULL
+            UNION
+            SELECT auction_id, user_id FROM bid_archive
+            WHERE is_bot = false AND auction_id IS NOT NULL AND user_id IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """)
+        report['auction_bidders_restored'] = cur.rowcount
+
+    for counter, query in CHECKS.items():
+        cur.execute(query)
+        mismatches = cur.fetchall()
+        report[counter] = {
+            'mismatches': len(mismatches),
+            'sample': [{'id': r[0], 'stored': r[1], 'actual': r[2]} for r in mismatches[:10]]
+        }
+        if fix and mismatches:
+            cur.executemany(FIXES[counter], [(r[2], r[0]) for r in mismatches])
+
+    conn.commit()
+    cur.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fix', action='store_true')
+    args = parser.parse_args()
+
+    conn = get_db()
+    try:
+        report = reconcile(conn, fix=args.fix)
+    finally:
+        release_db(conn)
+    print(json.dumps(report, indent=2))
+    if not args.fix and any(v['mismatches'] for k, v in report.items() if isinstance(v, dict)):
+        raise SystemExit(1)
@@ -0,0 +1,109 @@
+"""
+Секвенсор ставок: копит ставки на один аукцион в коротком окне и применяет их одной транзакцией
+"""
+import os
+import threading
+
+
+class _PendingBid:
+    __slots__ = ('user_id', 'done', 'result', 'error')
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Batch:
+    __slots__ = ('bids', 'full')
+
+    def __init__(self):
+        self.bids = []
+        self.full = threading.Event()
+
+
+class BidSequencer:
+    def __init__(self, window: float, max_batch: int = 200):
+        self.window = window
+        self.max_batch = max_batch
+        self._batches = {}
+        self._lock = threading.Lock()
+        self.stats = {'bids': 0, 'batches': 0}
+
+    def submit(self, acquire, auction_id: int, user_id: int):
+        """Возвращает (result, new_price, new_balance) для ставки user_id.
+
+        Первый запрос в окне становится лидером: ждёт окончания окна и применяет
+        всю пачку через place_bids() на соединении acquire(), остальные ждут результат.
+        Соединение берёт только лидер, поэтому ожидающие ставки не занимают пул.
+        """
+        pending = _PendingBid(user_id)
+        with self._lock:
+            batch = self._batches.get(auction_id)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._batches[auction_id] = batch
+            batch.bids.append(pending)
+            if len(batch.bids) >= self.max_batch:
+                self._batches.pop(auction_id, None)
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._batches.get(auction_id) is batch:
+                    del self._batches[auction_id]
+            self._apply(acquire, auction_id, batch.bids)
+        else:
+            pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _apply(self, acquire, auction_id: int, bids: list):
+        try:
+            conn = acquire()
+            conn.autocommit = True
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT bid_index, result, new_price, new_balance
+                    FROM place_bids(%s, %s)
+                """, (auction_id, [b.user_id for b in bids]))
+                for index, result, new_price, new_balance in cur.fetchall():
+                    bids[index].result = (result, new_price, new_balance)
+                cur.close()
+            finally:
+                conn.autocommit = False
+        except Exception as e:
+            for b in bids:
+                b.error = e
+        finally:
+            with self._lock:
+                self.stats['bids'] += len(bids)
+                self.stats['batches'] += 1
+            for b in bids:
+                b.done.set()
+
+
+_sequencer = None
+_sequencer_lock = threading.Lock()
+
+
+def get_sequencer():
+    """Секвенсор из BID_SEQUENCER_WINDOW_MS; None, если режим выключен."""
+    global _sequencer
+    window_ms = float(os.environ.get('BID_SEQUENCER_WINDOW_MS', 0))
+    if window_ms <= 0:
+        return None
+    if _sequencer is None:
+        with _sequencer_lock:
+            if _sequencer is None:
+                _sequencer = BidSequencer(
+                    window_ms / 1000.0,
+                    max_batch=int(os.environ.get('BID_SEQUENCER_MAX_BATCH', 200))
+                )
+    return _sequencer
@@ -0,0 +1,63 @@
+"""
+Расчёт завершённых аукционов: заказ победителю, значки участникам и уведомления пачками
+по SETTLE_BATCH_SIZE аукционов, одной транзакцией на пачку
+
+    python settlement.py            # воркер: опрашивает завершённые аукционы раз в SETTLE_POLL_INTERVAL
+    python settlement.py --once     # рассчитать всё накопившееся и выйти
+
+Пачка помечается settled_at в той же транзакции, поэтому перезапуск в любой момент
+не создаёт повторных заказов и уведомлений.
+"""
+import argparse
+import json
+import os
+import threading
+from db import get_db, release_db
+
+BATCH_SIZE = int(os.environ.get('SETTLE_BATCH_SIZE', 500))
+POLL_INTERVAL = float(os.environ.get('SETTLE_POLL_INTERVAL', 1.0))
+
+
+def settle(conn, batch_size: int = BATCH_SIZE) -> dict:
+    """Рассчитывает пачки, пока завершённые аукционы не кончатся."""
+    cur = conn.cursor()
+    total = {'auctions': 0, 'orders': 0, 'badges': 0, 'notifications': 0, 'batches': 0}
+    while True:
+        cur.execute("SELECT * FROM settle_auctions(%s)", (batch_size,))
+        auctions, orders, badges, notifications = cur.fetchone()
+        conn.commit()
+        if not auctions:
+            break
+        total['auctions'] += auctions
+        total['orders'] += orders
+        total['badges'] += badges
+        total['notifications'] += notifications
+        total['batches'] += 1
+    cur.close()
+    return total
+
+
+def run(stop: threading.Event = None):
+    stop = stop or threading.Event()
+    conn = get_db()
+    try:
+        while not stop.is_set():
+            if not settle(conn)['batches']:
+                stop.wait(POLL_INTERVAL)
+    finally:
+        release_db(conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--once', action='store_true')
+    args = parser.parse_args()
+
+    if args.once:
+        conn = get_db()
+        try:
+            print(json.dumps(settle(conn)))
+        finally:
+            release_db(conn)
+    else:
+        run()
@@ -0,0 +1,156 @@
+"""
+Таймер аукционов: держит дедлайны активных аукционов в куче и закрывает истёкшие пачками
+
+Запуск воркера: python timer_engine.py
+"""
+import heapq
+import os
+import threading
+import time
+from db import get_db, release_db
+
+WATERMARK_SLACK = 5.0
+# Ставка продлевает аукцион на 10 секунд; более дальние дедлайны (старт по расписанию,
+# длинный timer_seconds) читаются, только когда подойдут ближе горизонта: иначе водяной знак
+# проскочил бы дедлайны ставок, а каждый refresh перечитывал бы все дальние аукционы
+WATERMARK_HORIZON = 10.0
+
+REFRESH_SQL = """
+    SELECT EXTRACT(EPOCH FROM LOCALTIMESTAMP)::float8, id, EXTRACT(EPOCH FROM ends_at)::float8
+    FROM (SELECT 1) t
+    LEFT JOIN auctions a ON a.status = 'active'
+        AND a.ends_at > TIMESTAMP 'epoch' + %s * INTERVAL '1 second'
+        AND a.ends_at <= LOCALTIMESTAMP + %s * INTERVAL '1 second'
+"""
+
+
+class DeadlineHeap:
+    """Мин-куча дедлайнов с ленивым удалением: перенос дедлайна стоит O(log n)."""
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, auction_id):
+        return auction_id in self._deadlines
+
+    def schedule(self, auction_id: int, deadline: float):
+        if self._deadlines.get(auction_id) == deadline:
+            return
+        self._deadlines[auction_id] = deadline
+        heapq.heappush(self._heap, (deadline, auction_id))
+        if len(self._heap) > 2 * len(self._deadlines) + 1024:
+            self._compact()
+
+    def remove(self, auction_id: int):
+        self._deadlines.pop(auction_id, None)
+
+    def next_deadline(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: float, limit: int) -> list:
+        expired = []
+        while len(expired) < limit:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, auction_id = heapq.heappop(self._heap)
+            del self._deadlines[auction_id]
+            expired.append(auction_id)
+        return expired
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def _compact(self):
+        self._heap = [(d, a) for a, d in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+
+class TimerEngine:
+    """Дедлайны хранятся как секунды эпохи в часах БД (EXTRACT(EPOCH FROM ends_at)).
+
+    Новые и продлённые дедлайны подтягиваются диапазонным запросом по
+    idx_auctions_active_ends_at: ends_at выше последнего виденного минус
+    WATERMARK_SLACK (транзакции, закоммиченные не по порядку) и не дальше
+    WATERMARK_HORIZON от текущего времени. Дальний дедлайн попадает в окно раньше,
+    чем наступит, поэтому каждый тик читает только ближайшие дедлайны, а не всю таблицу.
+    """
+
+    def __init__(self, batch_size: int = 500, refresh_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self.heap = DeadlineHeap()
+        self.stats = {'closed': 0, 'rescheduled': 0, 'batches': 0, 'refreshes': 0}
+        self._watermark = 0.0
+        self._clock_offset = 0.0
+        self._last_refresh = 0.0
+
+    def now(self) -> float:
+        return time.time() + self._clock_offset
+
+    def refresh(self, cur):
+        cur.execute(REFRESH_SQL, (self._watermark - WATERMARK_SLACK, WATERMARK_HORIZON))
+        rows = cur.fetchall()
+        db_now = rows[0][0]
+        self._clock_offset = db_now - time.time()
+        for _, auction_id, deadline in rows:
+            if auction_id is not None:
+                self.heap.schedule(auction_id, deadline)
+                self._watermark = max(self._watermark, deadline)
+        self._last_refresh = time.monotonic()
+        self.stats['refreshes'] += 1
+
+    def close_expired(self, conn, cur) -> int:
+        expired = self.heap.pop_expired(self.now(), self.batch_size)
+        if not expired:
+            return 0
+        cur.execute("""
+            SELECT auction_id, closed, EXTRACT(EPOCH FROM deadline)::float8
+            FROM close_expired_auctions(%s)
+        """, (expired,))
+        rows = cur.fetchall()
+        conn.commit()
+        for auction_id, closed, deadline in rows:
+            if closed:
+                self.stats['closed'] += 1
+            elif deadline is not None:
+                self.heap.schedule(auction_id, deadline)
+                self.stats['rescheduled'] += 1
+        self.stats['batches'] += 1
+        return len(expired)
+
+    def run(self, stop: threading.Event = None):
+        stop = stop or threading.Event()
+        conn = get_db()
+        try:
+            cur = conn.cursor()
+            self.refresh(cur)
+            conn.commit()
+            while not stop.is_set():
+                if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                    self.refresh(cur)
+                    conn.commit()
+                if self.close_expired(conn, cur):
+                    continue
+                next_deadline = self.heap.next_deadline()
+                sleep_for = self.refresh_interval
+                if next_deadline is not None:
+                    sleep_for = min(sleep_for, max(0.0, next_deadline - self.now()))
+                stop.wait(sleep_for)
+            cur.close()
+        finally:
+            release_db(conn)
+
+
+if __name__ == '__main__':
+    TimerEngine(
+        batch_size=int(os.environ.get('TIMER_BATCH_SIZE', 500)),
+        refresh_interval=float(os.environ.get('TIMER_REFRESH_INTERVAL', 1.0))
+    ).run()
@@ -0,0 +1,51 @@
+"""
+Свёртка слотов кошелька: кредит и счётчики ставок из wallet_slots, не менявшиеся
+WALLET_SLOT_IDLE секунд, возвращаются в users.balance и users.total_bids
+
+    python wallet_slots.py            # один проход
+    python wallet_slots.py --loop     # воркер: проход раз в WALLET_COMPACT_INTERVAL секунд
+
+Свёртка не обязательна для корректности (баланс всегда читается через wallet_balances),
+она держит wallet_slots маленькой и возвращает неиспользуемый кредит в users.
+"""
+import argparse
+import json
+import os
+import time
+from db import get_db, release_db
+
+IDLE_SECONDS = float(os.environ.get('WALLET_SLOT_IDLE', 600))
+BATCH_SIZE = int(os.environ.get('WALLET_COMPACT_BATCH', 1000))
+INTERVAL = float(os.environ.get('WALLET_COMPACT_INTERVAL', 60))
+
+
+def compact(conn, idle_seconds: float = IDLE_SECONDS, batch_size: int = BATCH_SIZE) -> dict:
+    cur = conn.cursor()
+    report = {'slots': 0, 'batches': 0}
+    while True:
+        cur.execute("SELECT compact_wallet_slots(%s * INTERVAL '1 second', %s)", (idle_seconds, batch_size))
+        folded = cur.fetchone()[0]
+        conn.commit()
+        if not folded:
+            break
+        report['slots'] += folded
+        report['batches'] += 1
+    cur.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--idle', type=float, default=IDLE_SECONDS, help='секунды без списаний')
+    parser.add_argument('--loop', action='store_true')
+    args = parser.parse_args()
+
+    conn = get_db()
+    try:
+        while True:
+            print(json.dumps(compact(conn, args.idle)))
+            if not args.loop:
+                break
+            time.sleep(INTERVAL)
+    finally:
+        release_db(conn)
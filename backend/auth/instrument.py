@@ -0,0 +1,209 @@
+"""
+Инструментирование: время action, SQL-запросов, выдачи соединения и сериализации JSON
+
+INSTRUMENT=0 выключает всё на этапе импорта: декоратор возвращает handler как есть,
+курсоры обычные, dumps — это serialize.encode.
+"""
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from serialize import encode
+
+ENABLED = os.environ.get('INSTRUMENT', '1') != '0'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', '1') != '0'
+FLUSH_SECONDS = float(os.environ.get('INSTRUMENT_FLUSH_SECONDS', 60))
+
+BUCKETS_MS = [0.1 * 2 ** i for i in range(18)]
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает квантиль q."""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 3) if self.count else 0,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': round(self.max, 3)
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+_local = threading.local()
+_last_flush = time.monotonic()
+
+
+def log(event: str, **fields):
+    sys.stdout.write(json.dumps({'event': event, **fields}, ensure_ascii=False, default=str) + '\n')
+
+
+def record(name: str, seconds: float):
+    ms = seconds * 1000
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(ms)
+    current = getattr(_local, 'request', None)
+    if current is not None:
+        prefix = name.split('.', 1)[0]
+        current[prefix + '_ms'] = current.get(prefix + '_ms', 0.0) + ms
+        current[prefix + '_count'] = current.get(prefix + '_count', 0) + 1
+
+
+@contextmanager
+def span(name: str):
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {name: h.summary() for name, h in _histograms.items()}
+
+
+def flush(force: bool = False):
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_SECONDS:
+        return
+    _last_flush = now
+    log('histograms', histograms=snapshot())
+
+
+_whitespace = re.compile(r'\s+')
+
+
+def statement_key(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return _whitespace.sub(' ', str(query)).strip()[:80]
+
+
+_cursor_class = None
+
+
+def _instrumented_cursor():
+    """Класс курсора строится при первом соединении, чтобы модуль не тянул psycopg2 при импорте."""
+    global _cursor_class
+    if _cursor_class is not None:
+        return _cursor_class
+
+    import psycopg2
+    import psycopg2.extensions
+
+    class InstrumentedCursor(psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            started = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                elapsed = time.perf_counter() - started
+                record('sql.' + statement_key(query), elapsed)
+                if elapsed * 1000 >= SLOW_QUERY_MS:
+                    self._report_slow(query, vars, elapsed)
+
+        def _report_slow(self, query, vars, elapsed: float):
+            plan = None
+            if SLOW_QUERY_EXPLAIN and self.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                try:
+                    explain = self.connection.cursor(cursor_factory=psycopg2.extensions.cursor)
+                    explain.execute('EXPLAIN (FORMAT JSON) ' + self.mogrify(query, vars).decode())
+                    plan = explain.fetchone()[0]
+                    explain.close()
+                except psycopg2.Error as e:
+                    plan = f'explain failed: {e}'
+            log('slow_query', ms=round(elapsed * 1000, 3), statement=statement_key(query), plan=plan)
+
+    _cursor_class = InstrumentedCursor
+    return _cursor_class
+
+
+def cursor_factory():
+    return _instrumented_cursor() if ENABLED else None
+
+
+def dumps(obj) -> str:
+    if not ENABLED:
+        return encode(obj)
+    started = time.perf_counter()
+    body = encode(obj)
+    record('json.dumps', time.perf_counter() - started)
+    return body
+
+
+def instrumented(default_action: str, actions=None):
+    """
+    Декоратор handler: время action, разбивка по SQL/соединению/JSON и лог-строка на запрос.
+    actions — известные имена "METHOD action" (router.names); остальные пишутся как "other",
+    чтобы произвольный ?action= не плодил гистограммы.
+    """
+    def decorate(handler):
+        if not ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            action = ((event.get('queryStringParameters') or {}).get('action') or default_action)
+            name = f"{event.get('httpMethod', 'GET')} {action}"
+            if actions is not None and name not in actions:
+                name = 'OPTIONS' if event.get('httpMethod') == 'OPTIONS' else 'other'
+            _local.request = {}
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = handler(event, context)
+                status = response.get('statusCode', 200)
+                return response
+            finally:
+                elapsed = time.perf_counter() - started
+                breakdown = _local.request
+                _local.request = None
+                record('action.' + name, elapsed)
+                log('request', action=name, status=status, ms=round(elapsed * 1000, 3),
+                    **{k: round(v, 3) if isinstance(v, float) else v for k, v in breakdown.items()})
+                flush()
+        return wrapper
+    return decorate
@@ -0,0 +1,156 @@
+"""
+Чтение с реплики: read-only action идут на DATABASE_REPLICA_URL, записи — на основную базу
+
+Read-your-writes: после записи пользователя запоминается LSN основной базы (в контейнере и,
+если задан REPLICA_PIN_URL, в Redis — ставка и пополнение приходят в разные функции) и
+отдаётся клиенту заголовком X-Min-LSN. Чтение пользователя идёт на реплику, только если она
+уже проиграла нужный LSN; иначе ждём до REPLICA_WAIT_MS и читаем с основной базы.
+Фронтенд (src/lib/api.ts) хранит X-Min-LSN и шлёт его в чтениях пользователя, поэтому
+Redis нужен только клиентам, которые заголовок не возвращают.
+
+Недоступная реплика не роняет чтения: после ошибки соединения чтения REPLICA_RETRY_SECONDS
+идут на основную базу.
+"""
+import os
+import threading
+import time
+
+from db import PoolExhausted, get_db, release_db
+
+PRIMARY_ENV = 'DATABASE_URL'
+REPLICA_ENV = 'DATABASE_REPLICA_URL'
+ENABLED = bool(os.environ.get(REPLICA_ENV))
+WAIT_MS = float(os.environ.get('REPLICA_WAIT_MS', 50))
+POLL_MS = float(os.environ.get('REPLICA_POLL_MS', 5))
+PIN_SECONDS = float(os.environ.get('REPLICA_PIN_SECONDS', 60))
+RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', 5))
+
+stats = {'replica_reads': 0, 'primary_reads': 0, 'waits': 0, 'fallbacks': 0, 'pins': 0, 'replica_errors': 0}
+_replica_down_until = 0.0
+
+
+def lsn_value(lsn: str) -> int:
+    """'16/B374D848' -> 0x16B374D848; пустой или битый LSN -> 0."""
+    try:
+        hi, lo = lsn.split('/')
+        return (int(hi, 16) << 32) | int(lo, 16)
+    except (AttributeError, ValueError):
+        return 0
+
+
+class PinStore:
+    """Последний LSN записи пользователя на PIN_SECONDS: локально и в Redis, если он задан."""
+
+    def __init__(self, url: str = None, ttl: float = 60.0):
+        self.ttl = ttl
+        self._local = {}
+        self._lock = threading.Lock()
+        self._url = url
+        self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self._url, socket_timeout=0.2)
+        return self._client
+
+    def set(self, user_id, lsn: str):
+        with self._lock:
+            self._local[user_id] = (lsn, time.monotonic() + self.ttl)
+        if self._url:
+            try:
+                self._redis().set(f'rw:lsn:{user_id}', lsn, px=int(self.ttl * 1000))
+            except Exception:
+                pass
+
+    def get(self, user_id):
+        lsn = None
+        with self._lock:
+            item = self._local.get(user_id)
+            if item is not None:
+                if item[1] > time.monotonic():
+                    lsn = item[0]
+                else:
+                    del self._local[user_id]
+        if self._url:
+            try:
+                raw = self._redis().get(f'rw:lsn:{user_id}')
+                if raw is not None and lsn_value(raw.decode()) > lsn_value(lsn):
+                    lsn = raw.decode()
+            except Exception:
+                pass
+        return lsn
+
+
+pins = PinStore(os.environ.get('REPLICA_PIN_URL'), PIN_SECONDS)
+
+
+def note_write(conn, user_id):
+    """Вызывается после коммита записи пользователя; возвращает LSN для заголовка X-Min-LSN."""
+    if not ENABLED or user_id is None:
+        return None
+    cur = conn.cursor()
+    cur.execute("SELECT pg_current_wal_lsn()::text")
+    lsn = cur.fetchone()[0]
+    cur.close()
+    pins.set(user_id, lsn)
+    stats['pins'] += 1
+    return lsn
+
+
+def _replica_failed():
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + RETRY_SECONDS
+    stats['replica_errors'] += 1
+
+
+def _primary():
+    stats['fallbacks'] += 1
+    stats['primary_reads'] += 1
+    return get_db(PRIMARY_ENV), PRIMARY_ENV
+
+
+def acquire_read(user_id=None, min_lsn: str = None):
+    """
+    Соединение для чтения и имя пула, в который его вернуть: реплика, если она доступна и
+    догнала последнюю запись пользователя (X-Min-LSN или закреплённый LSN), иначе основная база.
+    """
+    import psycopg2
+
+    if not ENABLED:
+        return get_db(PRIMARY_ENV), PRIMARY_ENV
+    if time.monotonic() < _replica_down_until:
+        return _primary()
+
+    pinned = pins.get(user_id) if user_id is not None else None
+    required = max(lsn_value(min_lsn), lsn_value(pinned))
+    try:
+        conn = get_db(REPLICA_ENV)
+    except (psycopg2.Error, PoolExhausted):
+        _replica_failed()
+        return _primary()
+    if not required:
+        stats['replica_reads'] += 1
+        return conn, REPLICA_ENV
+
+    deadline = time.monotonic() + WAIT_MS / 1000
+    try:
+        cur = conn.cursor()
+        try:
+            while True:
+                cur.execute("SELECT NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= %s::pg_lsn",
+                            (f'{required >> 32:X}/{required & 0xFFFFFFFF:X}',))
+                if cur.fetchone()[0]:
+                    stats['replica_reads'] += 1
+                    return conn, REPLICA_ENV
+                if time.monotonic() >= deadline:
+                    break
+                stats['waits'] += 1
+                time.sleep(POLL_MS / 1000)
+        finally:
+            cur.close()
+    except psycopg2.Error:
+        _replica_failed()
+
+    release_db(conn, REPLICA_ENV)
+    return _primary()
@@ -0,0 +1,225 @@
+"""
+Маршрутизация запросов: таблица (action, метод) -> обработчик, CORS, авторизация и ошибки в одном месте
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from db import get_db, release_db
+from replica import PRIMARY_ENV, acquire_read
+from instrument import dumps
+from serialize import compress
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def response(status: int, body, headers: dict = None) -> dict:
+    return {
+        'statusCode': status,
+        'headers': dict(JSON_HEADERS, **headers) if headers else dict(JSON_HEADERS),
+        'body': dumps(body)
+    }
+
+
+def error(status: int, message: str) -> dict:
+    return response(status, {'error': message})
+
+
+class TokenCache:
+    """
+    Проверенные JWT по sha256 токена: повторная проверка HMAC не нужна до exp или истечения TTL.
+    jwt и hashlib загружаются при первой проверке — маршруты без авторизации их не импортируют.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def verify(self, token: str):
+        if not token:
+            return None
+        import hashlib
+
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                payload, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return payload
+                del self._data[key]
+                self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+
+        try:
+            import jwt
+
+            payload = jwt.decode(token, os.environ['JWT_SECRET'], algorithms=['HS256'])
+        except Exception:
+            return None
+
+        expires_at = now + self.ttl
+        if 'exp' in payload:
+            expires_at = min(expires_at, float(payload['exp']))
+        with self._lock:
+            self._data[key] = (payload, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+        return payload
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, size=len(self._data), max_size=self.max_size)
+
+
+_token_cache = None
+
+
+def get_token_cache() -> TokenCache:
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache(
+            max_size=int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+            ttl=float(os.environ.get('TOKEN_CACHE_TTL', 300))
+        )
+    return _token_cache
+
+
+def verify_token(token: str):
+    return get_token_cache().verify(token)
+
+
+class Request:
+    __slots__ = ('event', 'method', 'params', 'headers', 'user_id', 'read_only', '_conn', '_pool', '_cur', '_body')
+
+    def __init__(self, event: dict):
+        self.event = event
+        self.method = event.get('httpMethod', 'GET')
+        self.params = event.get('queryStringParameters') or {}
+        self.headers = event.get('headers') or {}
+        self.user_id = None
+        self.read_only = False
+        self._conn = None
+        self._pool = PRIMARY_ENV
+        self._cur = None
+        self._body = None
+
+    @property
+    def conn(self):
+        """
+        Соединение из пула берётся при первом обращении: ответ из кэша его не занимает.
+        Read-only маршруты читают с реплики, если она догнала последнюю запись пользователя.
+        """
+        if self._conn is None:
+            if self.read_only:
+                self._conn, self._pool = acquire_read(self.user_id, self.header('X-Min-LSN'))
+            else:
+                self._conn = get_db()
+        return self._conn
+
+    @property
+    def cur(self):
+        if self._cur is None:
+            self._cur = self.conn.cursor()
+        return self._cur
+
+    def header(self, name: str, default: str = None):
+        return self.headers.get(name, self.headers.get(name.lower(), default))
+
+    @property
+    def body(self) -> dict:
+        if self._body is None:
+            self._body = json.loads(self.event.get('body') or '{}')
+        return self._body
+
+
+class Route:
+    __slots__ = ('fn', 'auth', 'auth_error', 'read_only')
+
+    def __init__(self, fn, auth: bool, auth_error: str, read_only: bool):
+        self.fn = fn
+        self.auth = auth
+        self.auth_error = auth_error
+        self.read_only = read_only
+
+
+class Router:
+    """
+    Таблица маршрутов функции. Маршрут объявляется декоратором:
+
+        @router.route('bid', 'POST', auth=True)
+        def place_bid(request): ...
+
+    Обработчик получает Request с user_id (для auth=True) и conn/cur, которые берутся
+    из пула при первом обращении (для read_only=True — с реплики), и возвращает готовый
+    ответ (response/error); тело сжимается по Accept-Encoding.
+    """
+
+    def __init__(self, default_action: str, allow_headers: str = 'Content-Type, X-Auth-Token, X-Min-LSN'):
+        self.default_action = default_action
+        self.routes = {}
+        self.names = set()
+        self.preflight = {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': allow_headers
+            },
+            'body': ''
+        }
+
+    def route(self, action: str, method: str = 'GET', auth: bool = False,
+              auth_error: str = 'Требуется авторизация', read_only: bool = False):
+        def register(fn):
+            self.routes[(action, method)] = Route(fn, auth, auth_error, read_only)
+            self.names.add(f'{method} {action}')
+            return fn
+        return register
+
+    def dispatch(self, event: dict, context) -> dict:
+        request = Request(event)
+
+        if request.method == 'OPTIONS':
+            return dict(self.preflight)
+
+        route = self.routes.get((request.params.get('action', self.default_action), request.method))
+        if route is None:
+            return error(404, 'Endpoint не найден')
+
+        if route.auth:
+            payload = verify_token(request.header('X-Auth-Token', ''))
+            if not payload or 'user_id' not in payload:
+                return error(401, route.auth_error)
+            request.user_id = payload['user_id']
+        request.read_only = route.read_only
+
+        try:
+            return compress(route.fn(request), request.header('Accept-Encoding'))
+        except json.JSONDecodeError:
+            self._rollback(request)
+            return error(400, 'Некорректный JSON')
+        except Exception as e:
+            self._rollback(request)
+            return error(500, str(e))
+        finally:
+            if request._cur is not None:
+                request._cur.close()
+            if request._conn is not None:
+                release_db(request._conn, request._pool)
+
+    @staticmethod
+    def _rollback(request: Request):
+        if request._conn is not None and not request._conn.closed:
+            request._conn.rollback()
@@ -0,0 +1,103 @@
+"""
+Сериализация ответов: маппинг строк выборки в dict, JSON-кодирование и сжатие тела ответа
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', 4))
+
+
+def _default(value):
+    import datetime
+    import decimal
+
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def encode(obj) -> str:
+        return orjson.dumps(obj, default=_default).decode()
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def encode(obj) -> str:
+        return _encoder.encode(obj)
+
+
+def row_mapper(keys):
+    """
+    Функция tuple -> dict для фиксированного списка колонок SELECT, собирается один раз
+    при импорте. Decimal и datetime остаются как есть — их пишет encode().
+    """
+    keys = tuple(keys)
+    return lambda row: dict(zip(keys, row))
+
+
+_brotli = None
+
+
+def _load_brotli():
+    """brotli — необязательный пакет; импорт откладывается до первого клиента с br."""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+
+def _accepted(header: str) -> set:
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def compress(response: dict, accept_encoding: str) -> dict:
+    """Сжимает body ответа в br или gzip по Accept-Encoding, тело отдаётся в base64 (isBase64Encoded).
+
+    Vary: Accept-Encoding ставится на любой ответ, который мог бы быть сжат, в том числе
+    отданный без сжатия: иначе кэш отдаст несжатую копию клиенту с br или сжатую — без.
+    """
+    body = response.get('body')
+    if not body or response.get('isBase64Encoded') or len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    headers = dict(response.get('headers') or {})
+    vary = headers.get('Vary')
+    if not vary:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        headers['Vary'] = vary + ', Accept-Encoding'
+
+    accepted = _accepted(accept_encoding) if accept_encoding else set()
+    brotli = 'br' in accepted and _load_brotli()
+    if brotli:
+        coding, compressed = 'br', brotli.compress(body.encode(), quality=BROTLI_QUALITY)
+    elif 'gzip' in accepted or '*' in accepted:
+        import gzip
+
+        coding, compressed = 'gzip', gzip.compress(body.encode(), compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return dict(response, headers=headers)
+
+    import base64
+
+    headers['Content-Encoding'] = coding
+    return dict(response, headers=headers, body=base64.b64encode(compressed).decode(), isBase64Encoded=True)
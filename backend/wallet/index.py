@@ -1,248 +1,154 @@
 """
 API для управления кошельком и интеграции с CloudPayments
 """
-import json
 import os
-import psycopg2
-import jwt
-import hashlib
-import hmac
-from datetime import datetime
+from instrument import instrumented
+from router import Router, response, error
+from pagination import page_size, decode_cursor, split_page
+from serialize import row_mapper
+from replica import note_write
+import payments
 
-def get_db():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+transaction_row = row_mapper((
+    'id', 'type', 'amount', 'balance_after', 'reference', 'payment_method', 'status', 'created_at'
+))
+
+router = Router(default_action='balance')
 
-def verify_token(token: str):
-    try:
-        return jwt.decode(token, os.environ['JWT_SECRET'], algorithms=['HS256'])
-    except:
-        return None
 
 def verify_cloudpayments_signature(data: dict, signature: str) -> bool:
+    import hashlib
+    import hmac
+
     api_secret = os.environ.get('CLOUDPAYMENTS_API_SECRET', '')
     message = f"{data.get('TransactionId')}{data.get('Amount')}{data.get('Currency')}"
     expected = hmac.new(api_secret.encode(), message.encode(), hashlib.sha256).hexdigest()
     return hmac.compare_digest(expected, signature)
 
-def handler(event, context):
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token'
-            },
-            'body': ''
-        }
-    
-    query_params = event.get('queryStringParameters', {}) or {}
-    path = query_params.get('action', 'balance')
-    
+
+@router.route('balance', 'GET', auth=True, read_only=True)
+def balance(request):
+    cur = request.cur
+
+    cur.execute("""
+        SELECT w.balance, u.total_deposit, u.loyalty_level
+        FROM users u
+        JOIN wallet_balances w ON w.user_id = u.id
+        WHERE u.id = %s
+    """, (request.user_id,))
+
+    user = cur.fetchone()
+
+    if not user:
+        return error(404, 'Пользователь не найден')
+
+    return response(200, {
+        'balance': float(user[0]),
+        'total_deposit': float(user[1]),
+        'loyalty_level': user[2]
+    })
+
+
+@router.route('transactions', 'GET', auth=True, read_only=True)
+def transactions(request):
+    cur = request.cur
+    limit = page_size(request.params.get('limit'))
+    cursor = request.params.get('cursor')
+
+    query = """
+        SELECT id, type, amount, balance_after, reference,
+               payment_method, status, created_at
+        FROM transactions
+        WHERE user_id = %s
+    """
+    params = [request.user_id]
+
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            return error(400, 'Некорректный курсор')
+        query += " AND (created_at, id) < (%s, %s)"
+        params.extend([cursor_created_at, cursor_id])
+
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    cur.execute(query, params)
+    rows, next_cursor = split_page(cur.fetchall(), limit, lambda row: (row[7], row[0]))
+
+    return response(200, {'transactions': [transaction_row(row) for row in rows], 'nextCursor': next_cursor})
+
+
+@router.route('topup', 'POST', auth=True, read_only=True)
+def topup(request):
+    cur = request.cur
+    user_id = request.user_id
+    amount = float(request.body.get('amount', 0))
+
+    if amount < 100:
+        return error(400, 'Минимальная сумма 100₸')
+
+    cur.execute("SELECT email FROM users WHERE id = %s", (user_id,))
+    user = cur.fetchone()
+
+    if not user:
+        return error(404, 'Пользователь не найден')
+
+    public_id = os.environ.get('CLOUDPAYMENTS_PUBLIC_ID', 'demo')
+
+    return response(200, {
+        'public_id': public_id,
+        'amount': amount,
+        'currency': 'KZT',
+        'description': f'Пополнение кошелька на {amount}₸',
+        'account_id': str(user_id),
+        'email': user[0]
+    })
+
+
+@router.route('callback', 'POST')
+def callback(request):
+    data = request.body
+
+    if os.environ.get('CLOUDPAYMENTS_API_SECRET') and \
+            not verify_cloudpayments_signature(data, request.header('Content-HMAC', '')):
+        return error(401, 'Неверная подпись')
+
+    if data.get('Status') != 'Completed':
+        return response(200, {'code': 0})
+
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        if path == 'balance' and method == 'GET':
-            auth_token = event.get('headers', {}).get('X-Auth-Token', '')
-            payload = verify_token(auth_token)
-            
-            if not payload:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Требуется авторизация'})
-                }
-            
-            user_id = payload['user_id']
-            
-            cur.execute("""
-                SELECT balance, total_deposit, loyalty_level 
-                FROM users WHERE id = %s
-            """, (user_id,))
-            
-            user = cur.fetchone()
-            
-            if not user:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Пользователь не найден'})
-                }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'balance': float(user[0]),
-                    'total_deposit': float(user[1]),
-                    'loyalty_level': user[2]
-                })
-            }
-        
-        elif path == 'transactions' and method == 'GET':
-            auth_token = event.get('headers', {}).get('X-Auth-Token', '')
-            payload = verify_token(auth_token)
-            
-            if not payload:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Требуется авторизация'})
-                }
-            
-            user_id = payload['user_id']
-            limit = int(query_params.get('limit', 50))
-            
-            cur.execute("""
-                SELECT id, type, amount, balance_after, reference, 
-                       payment_method, status, created_at
-                FROM transactions 
-                WHERE user_id = %s 
-                ORDER BY created_at DESC 
-                LIMIT %s
-            """, (user_id, limit))
-            
-            transactions = []
-            for row in cur.fetchall():
-                transactions.append({
-                    'id': row[0],
-                    'type': row[1],
-                    'amount': float(row[2]),
-                    'balance_after': float(row[3]),
-                    'reference': row[4],
-                    'payment_method': row[5],
-                    'status': row[6],
-                    'created_at': row[7].isoformat() if row[7] else None
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'transactions': transactions})
-            }
-        
-        elif path == 'topup' and method == 'POST':
-            auth_token = event.get('headers', {}).get('X-Auth-Token', '')
-            payload = verify_token(auth_token)
-            
-            if not payload:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Требуется авторизация'})
-                }
-            
-            user_id = payload['user_id']
-            data = json.loads(event.get('body', '{}'))
-            amount = float(data.get('amount', 0))
-            
-            if amount < 100:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Минимальная сумма 100₸'})
-                }
-            
-            cur.execute("SELECT email FROM users WHERE id = %s", (user_id,))
-            user = cur.fetchone()
-            
-            if not user:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Пользователь не найден'})
-                }
-            
-            public_id = os.environ.get('CLOUDPAYMENTS_PUBLIC_ID', 'demo')
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'public_id': public_id,
-                    'amount': amount,
-                    'currency': 'KZT',
-                    'description': f'Пополнение кошелька на {amount}₸',
-                    'account_id': str(user_id),
-                    'email': user[0]
-                })
-            }
-        
-        elif path == 'callback' and method == 'POST':
-            data = json.loads(event.get('body', '{}'))
-            
-            if data.get('Status') != 'Completed':
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'code': 0})
-                }
-            
-            user_id = int(data.get('AccountId', 0))
-            amount = float(data.get('Amount', 0))
-            transaction_id = data.get('TransactionId')
-            
-            cur.execute("""
-                SELECT balance, total_deposit FROM users WHERE id = %s FOR UPDATE
-            """, (user_id,))
-            
-            user = cur.fetchone()
-            
-            if not user:
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'code': 13})
-                }
-            
-            new_balance = user[0] + amount
-            new_deposit = user[1] + amount
-            
-            new_loyalty = 'Hero'
-            if new_deposit >= 150000:
-                new_loyalty = 'Monarch'
-            elif new_deposit >= 50000:
-                new_loyalty = 'Noble'
-            
-            cur.execute("""
-                UPDATE users 
-                SET balance = %s, total_deposit = %s, loyalty_level = %s
-                WHERE id = %s
-            """, (new_balance, new_deposit, new_loyalty, user_id))
-            
-            cur.execute("""
-                INSERT INTO transactions (user_id, type, amount, balance_after, reference, payment_method, status)
-                VALUES (%s, 'topup', %s, %s, %s, 'cloudpayments', 'completed')
-            """, (user_id, amount, new_balance, transaction_id))
-            
-            conn.commit()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'code': 0})
-            }
-        
-        else:
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Endpoint не найден'})
-            }
-    
-    except Exception as e:
-        if 'conn' in locals():
-            conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+        transaction_id = int(data.get('TransactionId'))
+        user_id = int(data.get('AccountId', 0))
+        amount = float(data.get('Amount', 0))
+    except (TypeError, ValueError):
+        return error(400, 'Некорректное уведомление')
+
+    if amount <= 0:
+        return error(400, 'Некорректная сумма')
+
+    code = payments.recent.get(transaction_id)
+    if code is not None:
+        payments.stats['recent_hits'] += 1
+        return response(200, {'code': code})
+
+    conn, cur = request.conn, request.cur
+
+    if payments.QUEUED:
+        payments.enqueue(cur, transaction_id, user_id, amount)
+        conn.commit()
+        code = payments.CODE_OK
+    else:
+        code, new_balance = payments.apply(cur, transaction_id, user_id, amount)
+        conn.commit()
+        if new_balance is not None:
+            note_write(conn, user_id)
+
+    payments.recent.add(transaction_id, code)
+    return response(200, {'code': code})
+
+
+@instrumented(default_action='balance', actions=router.names)
+def handler(event, context):
+    return router.dispatch(event, context)
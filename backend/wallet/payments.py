@@ -0,0 +1,104 @@
+"""
+Зачисление платежей CloudPayments: ровно один раз на TransactionId, синхронно или через очередь
+
+Повтор уведомления отсекается локальным списком недавних TransactionId контейнера (без
+обращения к базе), а окончательно — первичным ключом payment_callbacks. С CALLBACK_QUEUE=1
+callback только записывает уведомление в очередь и сразу отвечает; воркер применяет очередь
+пачками, по одному UPDATE на пользователя:
+
+    python payments.py
+"""
+import os
+import threading
+from collections import OrderedDict
+from db import get_db, release_db
+
+QUEUED = os.environ.get('CALLBACK_QUEUE', '0') == '1'
+BATCH_SIZE = int(os.environ.get('CALLBACK_BATCH_SIZE', 500))
+POLL_INTERVAL = float(os.environ.get('CALLBACK_POLL_INTERVAL', 0.5))
+RECENT_SIZE = int(os.environ.get('CALLBACK_RECENT_SIZE', 10000))
+
+CODE_OK = 0
+CODE_REJECTED = 13
+
+stats = {'applied': 0, 'queued': 0, 'duplicates': 0, 'recent_hits': 0, 'rejected': 0}
+
+
+class RecentIds:
+    """TransactionId -> код ответа для последних max_size уведомлений контейнера."""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, transaction_id):
+        with self._lock:
+            return self._data.get(transaction_id)
+
+    def add(self, transaction_id, code: int):
+        with self._lock:
+            self._data[transaction_id] = code
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+recent = RecentIds(RECENT_SIZE)
+
+
+def apply(cur, transaction_id: int, user_id: int, amount: float):
+    """Синхронное зачисление; возвращает (код ответа, новый баланс или None)."""
+    cur.execute("SELECT result, new_balance FROM apply_topup(%s, %s, %s)", (transaction_id, user_id, amount))
+    result, new_balance = cur.fetchone()
+    if result == 'applied':
+        stats['applied'] += 1
+        return CODE_OK, new_balance
+    if result == 'rejected':
+        stats['rejected'] += 1
+        return CODE_REJECTED, None
+    stats['duplicates'] += 1
+    return CODE_OK, None
+
+
+def enqueue(cur, transaction_id: int, user_id: int, amount: float) -> bool:
+    cur.execute("""
+        INSERT INTO payment_callbacks (transaction_id, user_id, amount, status)
+        VALUES (%s, %s, %s, 'queued')
+        ON CONFLICT (transaction_id) DO NOTHING
+    """, (transaction_id, user_id, amount))
+    queued = cur.rowcount == 1
+    stats['queued' if queued else 'duplicates'] += 1
+    return queued
+
+
+def drain(conn, batch_size: int = BATCH_SIZE) -> dict:
+    """Применяет очередь пачками, пока она не опустеет."""
+    cur = conn.cursor()
+    total = {'applied': 0, 'rejected': 0, 'users': 0, 'batches': 0}
+    while True:
+        cur.execute("SELECT * FROM apply_queued_callbacks(%s)", (batch_size,))
+        applied, rejected, users = cur.fetchone()
+        conn.commit()
+        if not applied and not rejected:
+            break
+        total['applied'] += applied
+        total['rejected'] += rejected
+        total['users'] += users
+        total['batches'] += 1
+    cur.close()
+    return total
+
+
+def run(stop: threading.Event = None):
+    stop = stop or threading.Event()
+    conn = get_db()
+    try:
+        while not stop.is_set():
+            if not drain(conn)['batches']:
+                stop.wait(POLL_INTERVAL)
+    finally:
+        release_db(conn)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,86 @@
+"""
+action=details без кэша: синхронный путь (запросы друг за другом) против ASYNC_READS=1 (параллельно через asyncpg)
+
+    DATABASE_URL=postgres://... python benchmarks/bench_async.py --requests 2000 --threads 1,8
+
+Выигрыш равен сэкономленным сетевым задержкам, поэтому сравнивать стоит против базы
+в той же сети, что и функция, а не на localhost.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+from contextlib import redirect_stdout
+
+from common import connect, load_function, make_event, percentile, timer
+
+
+def child(requests: int, threads: int):
+    index = load_function('auctions')
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM auctions ORDER BY id DESC LIMIT 1000")
+    auction_ids = [str(r[0]) for r in cur.fetchall()]
+    conn.close()
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(n):
+        rnd = random.Random(n)
+        local = []
+        for _ in range(requests // threads):
+            event = make_event('GET', 'details', {'id': rnd.choice(auction_ids)})
+            started = timer()
+            response = index.handler(event, None)
+            local.append(timer() - started)
+            with lock:
+                statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+        with lock:
+            latencies.extend(local)
+
+    index.handler(make_event('GET', 'details', {'id': auction_ids[0]}), None)
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = timer()
+    with redirect_stdout(io.StringIO()):
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    elapsed = timer() - started
+    print(json.dumps({
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'statuses': statuses
+    }))
+
+
+def run(requests: int, threads: list) -> dict:
+    result = {}
+    for n in threads:
+        for mode in ('0', '1'):
+            env = dict(os.environ, ASYNC_READS=mode, INSTRUMENT='0', DETAILS_STATIC_TTL='0',
+                       DETAILS_DYNAMIC_TTL='0', DB_POOL_SIZE=str(n + 1), ASYNC_POOL_SIZE=str(2 * n + 2))
+            out = subprocess.check_output([sys.executable, __file__, '--child', '--requests', str(requests),
+                                           '--threads', str(n)], env=env, text=True)
+            result[f"{'async' if mode == '1' else 'sync'}_threads_{n}"] = json.loads(out.strip().splitlines()[-1])
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', default='1,8')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests, int(args.threads))
+    else:
+        print(json.dumps(run(args.requests, [int(n) for n in args.threads.split(',')]), indent=2))
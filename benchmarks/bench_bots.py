@@ -0,0 +1,155 @@
+"""
+Симуляция бот-ставок: --auctions активных аукционов ниже bot_threshold, движок bot_engine.py
+и параллельно ставки пользователей через handler
+
+    DATABASE_URL=postgres://... python benchmarks/bench_bots.py --auctions 10000 --duration 20
+
+Сначала замеряются ставки пользователей без движка, затем те же ставки вместе с движком.
+Дедлайны аукционов разбросаны по ближайшим 10 секундам, поэтому в установившемся режиме
+движок ставит около auctions / (10 - BOT_BID_BEFORE) ставок в секунду. missed — аукционы,
+дедлайн которых прошёл без ставки бота (должно быть 0), bot_bids_mismatch — расхождение
+bot_bids_count с числом ставок is_bot в bids.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import threading
+from contextlib import redirect_stdout
+
+from common import BACKEND, connect, ensure_users, load_function, make_event, make_token, percentile, timer
+
+TITLE = 'bot bench'
+
+
+def setup(cur, auctions: int, bots: bool) -> list:
+    """Без ботов дедлайн аукционов отодвинут на сутки, чтобы они не истекали во время замера."""
+    cur.execute("UPDATE auctions SET status = 'ended' WHERE title = %s AND status = 'active'", (TITLE,))
+    cur.execute("""
+        INSERT INTO auctions (title, retail_price, purchase_price, current_price, bot_threshold,
+                              min_price_limit, status, ends_at)
+        SELECT %s, 100000, 50000, 0, CASE WHEN %s THEN 99999999 ELSE 0 END, 99999999, 'active',
+               CASE WHEN %s THEN LOCALTIMESTAMP + INTERVAL '4 seconds' + random() * INTERVAL '6 seconds'
+                    ELSE LOCALTIMESTAMP + INTERVAL '1 day' END
+        FROM generate_series(1, %s)
+        RETURNING id
+    """, (TITLE, bots, bots, auctions))
+    return [r[0] for r in cur.fetchall()]
+
+
+def users_bidding(index, tokens: list, auction_ids: list, duration: float) -> dict:
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = timer() + duration
+
+    def worker(token, seed):
+        rnd = random.Random(seed)
+        local = []
+        local_statuses = {}
+        while timer() < stop_at:
+            event = make_event('POST', 'bid', body={'auction_id': rnd.choice(auction_ids)}, token=token)
+            started = timer()
+            status = index.handler(event, None)['statusCode']
+            local.append(timer() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for code, n in local_statuses.items():
+                statuses[code] = statuses.get(code, 0) + n
+
+    workers = [threading.Thread(target=worker, args=(t, n)) for n, t in enumerate(tokens)]
+    with redirect_stdout(io.StringIO()):
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    return {
+        'bids_per_sec': statuses.get(200, 0) / duration,
+        'statuses': statuses,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def audit(cur, auction_ids: list) -> dict:
+    cur.execute("""
+        SELECT COUNT(*) FILTER (WHERE ends_at <= LOCALTIMESTAMP),
+               COALESCE(SUM(bot_bids_count), 0),
+               COALESCE(SUM(total_bids), 0)
+        FROM auctions WHERE id = ANY(%s)
+    """, (auction_ids,))
+    missed, bot_bids, total_bids = cur.fetchone()
+    cur.execute("""
+        SELECT COUNT(*) FILTER (WHERE is_bot), COUNT(*)
+        FROM bids WHERE auction_id = ANY(%s) AND created_at >= LOCALTIMESTAMP - INTERVAL '1 day'
+    """, (auction_ids,))
+    bot_rows, all_rows = cur.fetchone()
+    return {
+        'missed': missed,
+        'bot_bids_mismatch': int(bot_bids) - bot_rows,
+        'total_bids_mismatch': int(total_bids) - all_rows
+    }
+
+
+def run(auctions: int, users: int, duration: float, batch_size: int, bid_before: float, tick: float) -> dict:
+    conn = connect()
+    cur = conn.cursor()
+    user_ids = ensure_users(cur, 'botbench', users, 10000000)
+    conn.commit()
+    tokens = [make_token(uid) for uid in user_ids]
+    index = load_function('auctions')
+    sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+    import bot_engine
+
+    report = {'auctions': auctions}
+    auction_ids = setup(cur, auctions, False)
+    conn.commit()
+    report['users_alone'] = users_bidding(index, tokens, auction_ids, duration / 2)
+
+    auction_ids = setup(cur, auctions, True)
+    conn.commit()
+
+    engine = bot_engine.BotEngine(batch_size=batch_size, bid_before=bid_before, tick_interval=tick)
+    stop = threading.Event()
+    worker = threading.Thread(target=engine.run, args=(stop,))
+    started = timer()
+    worker.start()
+    report['users_with_bots'] = users_bidding(index, tokens, auction_ids, duration)
+    stop.set()
+    worker.join()
+    elapsed = timer() - started
+
+    stats = engine.stats
+    report['engine'] = {
+        'bot_bids_per_sec': stats['bids'] / elapsed,
+        'bids': stats['bids'],
+        'batches': stats['batches'],
+        'bids_per_batch': stats['bids'] / max(1, stats['batches']),
+        'batch_ms': stats['batch_seconds'] / max(1, stats['batches']) * 1000
+    }
+    report['engine'].update(audit(cur, auction_ids))
+    cur.execute("UPDATE auctions SET status = 'ended' WHERE id = ANY(%s)", (auction_ids,))
+    conn.commit()
+    conn.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--auctions', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=8, help='потоков пользователей, по одному пользователю на поток')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--bid-before', type=float, default=3.0)
+    parser.add_argument('--tick', type=float, default=0.5)
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_SIZE'] = str(args.users + 2)
+    report = run(args.auctions, args.users, args.duration, args.batch_size, args.bid_before, args.tick)
+    print(json.dumps(report, indent=2))
+    engine = report['engine']
+    if engine['missed'] or engine['bot_bids_mismatch'] or engine['total_bids_mismatch']:
+        raise SystemExit(1)
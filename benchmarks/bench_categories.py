@@ -0,0 +1,141 @@
+"""
+action=list по поддереву категорий: один запрос с category_id = ANY(поддерево) против запроса
+на каждую подкатегорию, стоимость разворота поддерева в памяти и корректность после
+выключения ветки
+
+    DATABASE_URL=postgres://... python benchmarks/bench_categories.py --fanout 5 --depth 3
+
+Строится дерево из --fanout^1 + ... + --fanout^depth категорий под одним корнем, аукционы
+раскладываются по всем узлам. Выдача по корню сверяется с первой страницей объединения
+выдач по отдельным категориям; после выключения одной ветки и CATEGORY_TREE_INTERVAL
+аукционы ветки должны пропасть из выдачи, а ETag — смениться.
+"""
+import argparse
+import io
+import json
+import os
+import time
+from contextlib import redirect_stdout
+
+from common import connect, load_function, make_event, percentile, timer
+
+SLUG = 'tree-bench'
+
+
+def build_tree(cur, fanout: int, depth: int) -> list:
+    cleanup(cur)
+    cur.execute("INSERT INTO categories (name, slug) VALUES ('Tree bench', %s) RETURNING id", (SLUG,))
+    levels = [[cur.fetchone()[0]]]
+    for level in range(depth):
+        cur.execute("""
+            INSERT INTO categories (name, slug, parent_id, sort_order)
+            SELECT 'Tree bench ' || p || '.' || g, %s || '-' || p || '-' || g, p, g
+            FROM unnest(%s::int[]) p, generate_series(1, %s) g
+            RETURNING id
+        """, (SLUG, levels[-1], fanout))
+        levels.append([r[0] for r in cur.fetchall()])
+    return levels
+
+
+def populate(cur, category_ids: list, auctions: int):
+    cur.execute("""
+        INSERT INTO auctions (title, category_id, retail_price, purchase_price, current_price, bot_threshold,
+                              min_price_limit, status, started_at)
+        SELECT 'tree bench', (%s::int[])[1 + g %% cardinality(%s::int[])], 100000, 50000, 0, 0, 99999999, 'active',
+               LOCALTIMESTAMP - g * INTERVAL '1 second'
+        FROM generate_series(1, %s) g
+    """, (category_ids, category_ids, auctions))
+    cur.execute("ANALYZE auctions")
+
+
+def cleanup(cur):
+    cur.execute("DELETE FROM auctions WHERE title = 'tree bench'")
+    cur.execute("""
+        WITH RECURSIVE t AS (
+            SELECT id FROM categories WHERE slug = %s
+            UNION ALL
+            SELECT c.id FROM categories c JOIN t ON c.parent_id = t.id
+        )
+        DELETE FROM categories WHERE id IN (SELECT id FROM t)
+    """, (SLUG,))
+
+
+class Request:
+    def __init__(self, cur):
+        self.cur = cur
+
+
+def list_ids(index, category_id: int) -> tuple:
+    result = index.handler(make_event('GET', 'list', params={'category_id': str(category_id)}), None)
+    return [a['id'] for a in json.loads(result['body'])['auctions']], result['headers']['ETag']
+
+
+def timed(fn, calls: int) -> float:
+    times = []
+    for _ in range(calls):
+        started = timer()
+        fn()
+        times.append(timer() - started)
+    return percentile(times, 50) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fanout', type=int, default=5)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--auctions', type=int, default=100000)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--refresh-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    os.environ['CATEGORY_TREE_INTERVAL'] = str(args.refresh_interval)
+    conn = connect()
+    cur = conn.cursor()
+    levels = build_tree(cur, args.fanout, args.depth)
+    all_ids = [category_id for level in levels for category_id in level]
+    populate(cur, all_ids, args.auctions)
+    conn.commit()
+
+    index = load_function('auctions')
+    from categories import get_category_tree
+    tree = get_category_tree()
+    root = levels[0][0]
+    branch = levels[1][0]
+    report = {'categories': len(all_ids)}
+
+    with redirect_stdout(io.StringIO()):
+        subtree, etag = list_ids(index, root)
+        request = Request(cur)
+        report['expand_us'] = timed(lambda: tree.subtree(request, root), 1000) * 1000
+        report['subtree_list_p50_ms'] = timed(lambda: list_ids(index, root), args.calls)
+        report['per_category_p50_ms'] = timed(lambda: [list_ids(index, c) for c in all_ids], max(5, args.calls // len(all_ids)))
+        report['leaf_list_p50_ms'] = timed(lambda: list_ids(index, levels[-1][0]), args.calls)
+
+        per_category = [auction_id for c in all_ids for auction_id in list_ids(index, c)[0]]
+        cur.execute("""
+            SELECT id FROM auctions WHERE id = ANY(%s) ORDER BY started_at DESC, id DESC LIMIT %s
+        """, (per_category, len(subtree)))
+        merged = [r[0] for r in cur.fetchall()]
+
+        cur.execute("UPDATE categories SET is_active = false WHERE id = %s", (branch,))
+        conn.commit()
+        time.sleep(args.refresh_interval)
+        after, after_etag = list_ids(index, root)
+    cur.execute("""
+        WITH RECURSIVE t AS (
+            SELECT id FROM categories WHERE id = %s
+            UNION ALL
+            SELECT c.id FROM categories c JOIN t ON c.parent_id = t.id
+        )
+        SELECT COUNT(*) FROM auctions WHERE id = ANY(%s) AND category_id IN (SELECT id FROM t)
+    """, (branch, after))
+    leaked = cur.fetchone()[0]
+
+    report['tree'] = tree.snapshot()
+    report['consistent'] = subtree == merged and leaked == 0 and after_etag != etag and len(subtree) > 0
+    cleanup(cur)
+    conn.commit()
+    conn.close()
+    print(json.dumps(report, indent=2))
+    if not report['consistent']:
+        raise SystemExit(1)
@@ -0,0 +1,143 @@
+"""
+action=feed: стоимость отдачи готового документа при разном размере каталога и корректность
+инкрементального обновления
+
+    DATABASE_URL=postgres://... python benchmarks/bench_feed.py --sizes 1000,100000
+
+Для каждого размера каталога создаётся столько активных аукционов, затем замеряются холодный
+запрос, тёплые запросы (без сжатия, gzip, If-None-Match -> 304) и для сравнения action=list.
+После этого меняются цены в окне первой страницы, добавляется новый аукцион, один
+завершается, выключается категория и добавляется баннер, окно показа которого открывается
+через секунду; документ после обновления сверяется с собранным с нуля.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+from common import connect, load_function, make_event, percentile, timer
+
+TITLE = 'feed bench'
+
+
+def populate(cur, size: int):
+    cur.execute("UPDATE auctions SET status = 'ended' WHERE title = %s AND status = 'active'", (TITLE,))
+    cur.execute("""
+        WITH c AS (SELECT array_agg(id) AS ids FROM categories)
+        INSERT INTO auctions (title, category_id, retail_price, purchase_price, current_price, bot_threshold,
+                              min_price_limit, status, started_at)
+        SELECT %s, c.ids[1 + g %% cardinality(c.ids)], 100000, 50000, 0, 0, 99999999, 'active',
+               LOCALTIMESTAMP - g * INTERVAL '1 second'
+        FROM generate_series(1, %s) g, c
+    """, (TITLE, size))
+    cur.execute("ANALYZE auctions")
+
+
+def timed(index, event: dict, calls: int) -> dict:
+    times = []
+    with redirect_stdout(io.StringIO()):
+        for _ in range(calls):
+            started = timer()
+            result = index.handler(event, None)
+            times.append(timer() - started)
+    return {'status': result['statusCode'], 'p50_ms': percentile(times, 50) * 1000,
+            'p99_ms': percentile(times, 99) * 1000, 'bytes': len(result['body'])}
+
+
+def content(document) -> dict:
+    body = json.loads(document.body)
+    body.pop('serverTime')
+    return body
+
+
+def check_incremental(index, feed_module, cur, conn) -> dict:
+    feed = feed_module.get_feed()
+    window = [row[0] for row in feed._window]
+    cur.execute("UPDATE auctions SET current_price = current_price + 50, total_bids = total_bids + 1 WHERE id = ANY(%s)",
+                (window[:10],))
+    cur.execute("UPDATE auctions SET status = 'ended' WHERE id = %s", (window[-1],))
+    cur.execute("""
+        INSERT INTO auctions (title, retail_price, purchase_price, current_price, bot_threshold, min_price_limit, status)
+        VALUES (%s, 100000, 50000, 0, 0, 99999999, 'active') RETURNING id
+    """, (TITLE,))
+    new_id = cur.fetchone()[0]
+    cur.execute("SELECT id FROM categories WHERE is_active = true ORDER BY id LIMIT 1")
+    category_id = cur.fetchone()[0]
+    cur.execute("UPDATE categories SET is_active = false WHERE id = %s", (category_id,))
+    cur.execute("""
+        INSERT INTO banners (title, image_url, is_active, start_date, end_date)
+        VALUES ('feed bench', '/banner.png', true, LOCALTIMESTAMP + INTERVAL '1 second', LOCALTIMESTAMP + INTERVAL '1 hour')
+        RETURNING id
+    """)
+    banner_id = cur.fetchone()[0]
+    conn.commit()
+
+    time.sleep(feed.refresh_interval)
+    event = make_event('GET', 'feed')
+    with redirect_stdout(io.StringIO()):
+        index.handler(event, None)
+    incremental = feed.document
+    before_banner = [b['id'] for b in json.loads(incremental.body)['banners']]
+    time.sleep(1.0 + feed.refresh_interval)
+    with redirect_stdout(io.StringIO()):
+        index.handler(event, None)
+    after_banner = [b['id'] for b in json.loads(feed.document.body)['banners']]
+    stats = dict(feed.stats)
+
+    feed_module._feed = None
+    with redirect_stdout(io.StringIO()):
+        index.handler(event, None)
+    rebuilt = feed_module.get_feed().document
+
+    cur.execute("UPDATE categories SET is_active = true WHERE id = %s", (category_id,))
+    cur.execute("DELETE FROM banners WHERE id = %s", (banner_id,))
+    conn.commit()
+    auctions = [a['id'] for a in json.loads(incremental.body)['auctions']]
+    categories = [c['id'] for c in json.loads(incremental.body)['categories']]
+    return {
+        'feed_stats': stats,
+        'consistent': content(feed.document) == content(rebuilt)
+                      and new_id in auctions and window[-1] not in auctions and category_id not in categories
+                      and banner_id not in before_banner and banner_id in after_banner
+    }
+
+
+def run(size: int, calls: int, index, feed_module) -> dict:
+    conn = connect()
+    cur = conn.cursor()
+    populate(cur, size)
+    conn.commit()
+    feed_module._feed = None
+
+    event = make_event('GET', 'feed')
+    started = timer()
+    with redirect_stdout(io.StringIO()):
+        first = index.handler(event, None)
+    report = {'cold_ms': (timer() - started) * 1000}
+    etag = first['headers']['ETag']
+    report['feed'] = timed(index, event, calls)
+    report['feed_gzip'] = timed(index, make_event('GET', 'feed', headers={'Accept-Encoding': 'gzip'}), calls)
+    report['feed_304'] = timed(index, make_event('GET', 'feed', headers={'If-None-Match': etag}), calls)
+    report['list'] = timed(index, make_event('GET', 'list'), min(calls, 200))
+    report['incremental'] = check_incremental(index, feed_module, cur, conn)
+    conn.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,100000')
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--refresh-interval', type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.environ['FEED_REFRESH_INTERVAL'] = str(args.refresh_interval)
+    index = load_function('auctions')
+    feed_module = sys.modules['feed']
+    report = {size: run(int(size), args.calls, index, feed_module) for size in args.sizes.split(',')}
+    print(json.dumps(report, indent=2))
+    if not all(r['incremental']['consistent'] for r in report.values()):
+        raise SystemExit(1)
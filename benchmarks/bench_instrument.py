@@ -0,0 +1,85 @@
+"""
+Накладные расходы инструментирования: микробенчмарк примитивов и сквозной прогон с INSTRUMENT=1/0
+
+    python benchmarks/bench_instrument.py
+    DATABASE_URL=postgres://... python benchmarks/bench_instrument.py --end-to-end --requests 2000
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+from contextlib import redirect_stdout
+
+from common import BACKEND, load_function, make_event, percentile, timer
+
+
+def micro(iterations: int) -> dict:
+    sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+    import instrument
+
+    payload = {'auctions': [{'id': i, 'title': 'x' * 40, 'currentPrice': 1250.0} for i in range(50)]}
+
+    def bare_handler(event, context):
+        return {'statusCode': 200, 'body': ''}
+
+    wrapped = instrument.instrumented('list')(bare_handler)
+    event = make_event('GET', 'list')
+    sink = io.StringIO()
+    result = {}
+
+    with redirect_stdout(sink):
+        for name, fn in (('handler_bare', lambda: bare_handler(event, None)),
+                         ('handler_instrumented', lambda: wrapped(event, None)),
+                         ('json_dumps', lambda: json.dumps(payload)),
+                         ('instrument_dumps', lambda: instrument.dumps(payload))):
+            started = timer()
+            for _ in range(iterations):
+                fn()
+            result[name + '_us'] = (timer() - started) / iterations * 1e6
+
+    result['handler_overhead_us'] = result['handler_instrumented_us'] - result['handler_bare_us']
+    result['dumps_overhead_us'] = result['instrument_dumps_us'] - result['json_dumps_us']
+    return result
+
+
+def end_to_end_child(requests: int):
+    index = load_function('auctions')
+    event = make_event('GET', 'list')
+    latencies = []
+    with redirect_stdout(io.StringIO()):
+        for _ in range(requests):
+            started = timer()
+            index.handler(event, None)
+            latencies.append(timer() - started)
+    print(json.dumps({
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'avg_ms': sum(latencies) / len(latencies) * 1000
+    }))
+
+
+def end_to_end(requests: int) -> dict:
+    result = {}
+    for mode in ('1', '0'):
+        env = dict(os.environ, INSTRUMENT=mode)
+        out = subprocess.check_output([sys.executable, __file__, '--child', '--requests', str(requests)], env=env, text=True)
+        result['instrument_on' if mode == '1' else 'instrument_off'] = json.loads(out.strip().splitlines()[-1])
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--end-to-end', action='store_true')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        end_to_end_child(args.requests)
+    elif args.end_to_end:
+        print(json.dumps(end_to_end(args.requests), indent=2))
+    else:
+        print(json.dumps(micro(args.iterations), indent=2))
@@ -0,0 +1,112 @@
+"""
+Бенчмарк живого потока: сообщений/сек и задержка раздачи на много SSE-подписчиков
+
+    python benchmarks/bench_live.py --subscribers 500 --messages 2000
+    DATABASE_URL=postgres://... python benchmarks/bench_live.py --pg   # через LISTEN/NOTIFY
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from common import BACKEND, percentile, timer
+
+sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+import live  # noqa: E402
+
+
+async def subscriber(port: int, expected: int, latencies: list, ready: asyncio.Event, counter: list):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await writer.drain()
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+    counter[0] += 1
+    if counter[0] == counter[1]:
+        ready.set()
+    received = 0
+    while received < expected:
+        line = await reader.readline()
+        if not line:
+            break
+        if line.startswith(b'data: '):
+            sent = json.loads(line[6:])['sent']
+            latencies.append(timer() - sent)
+            received += 1
+    writer.close()
+    await writer.wait_closed()
+
+
+async def publish_direct(broadcaster, count: int, rate: float):
+    for i in range(count):
+        broadcaster.publish(1, json.dumps({'id': 1, 'currentPrice': i * 50, 'totalBids': i, 'timeLeft': 10, 'status': 'active', 'sent': timer()}))
+        if rate:
+            await asyncio.sleep(1.0 / rate)
+        elif i % 100 == 0:
+            await asyncio.sleep(0)
+
+
+async def publish_pg(count: int, rate: float):
+    import psycopg2
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    for i in range(count):
+        payload = json.dumps({'id': 1, 'currentPrice': i * 50, 'totalBids': i, 'timeLeft': 10, 'status': 'active', 'sent': timer()})
+        cur.execute("SELECT pg_notify(%s, %s)", (live.CHANNEL, payload))
+        await asyncio.sleep(1.0 / rate if rate else 0)
+    conn.close()
+
+
+async def main(args):
+    loop = asyncio.get_running_loop()
+    broadcaster = live.Broadcaster()
+    if args.pg:
+        listen_conn = live.listen(loop, broadcaster, os.environ['DATABASE_URL'])
+    server = await live.serve(broadcaster, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    latencies = []
+    ready = asyncio.Event()
+    counter = [0, args.subscribers]
+    tasks = [asyncio.create_task(subscriber(port, args.messages, latencies, ready, counter)) for _ in range(args.subscribers)]
+    await ready.wait()
+
+    started = timer()
+    if args.pg:
+        await publish_pg(args.messages, args.rate)
+    else:
+        await publish_direct(broadcaster, args.messages, args.rate)
+    await asyncio.wait(tasks, timeout=args.timeout)
+    elapsed = timer() - started
+
+    server.close()
+    for _ in range(500):
+        if not broadcaster.subscribers:
+            break
+        await asyncio.sleep(0.01)
+    if args.pg:
+        listen_conn.close()
+
+    print(json.dumps({
+        'mode': 'pg' if args.pg else 'direct',
+        'subscribers': args.subscribers,
+        'published': broadcaster.stats['published'],
+        'delivered': len(latencies),
+        'dropped': broadcaster.stats['dropped'],
+        'messages_per_sec': len(latencies) / elapsed,
+        'fanout_p50_ms': percentile(latencies, 50) * 1000,
+        'fanout_p95_ms': percentile(latencies, 95) * 1000,
+        'fanout_p99_ms': percentile(latencies, 99) * 1000
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=500, help='сообщений/сек от издателя, 0 — без ограничения')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--pg', action='store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,198 @@
+"""
+Уведомления о перебитых ставках: стоимость ставки с очередью outbid_events против записи
+уведомлений в транзакции ставки, пропускная способность воркера outbid.py и счётчик непрочитанных
+
+    DATABASE_URL=postgres://... python benchmarks/bench_outbid.py --threads 8 --duration 10
+
+queued — place_bid() только ставит событие, воркер разбирает очередь в фоне; inline — та же
+работа fanout_outbid_events() выполняется в транзакции каждой ставки. Все ставки делаются до
+min_price_limit, поэтому каждый участник аукциона — ранний и получает уведомление. После
+замера очередь дочищается и сверяется, что каждый ранний участник, который сейчас не лидирует,
+имеет непрочитанное уведомление, а notification_counters совпадает с COUNT(*).
+В конце action=unread пользователя с --unread уведомлениями сравнивается с COUNT(*).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import threading
+from contextlib import redirect_stdout
+
+from common import BACKEND, connect, ensure_users, load_function, make_event, make_token, percentile, timer
+
+TITLE = 'outbid bench'
+
+
+def setup(cur, auctions: int) -> list:
+    cur.execute("UPDATE auctions SET status = 'ended' WHERE title = %s AND status = 'active'", (TITLE,))
+    cur.execute("""
+        INSERT INTO auctions (title, retail_price, purchase_price, current_price, bot_threshold, min_price_limit, status,
+                              ends_at)
+        SELECT %s, 100000, 50000, 0, 0, 99999999, 'active', LOCALTIMESTAMP + INTERVAL '1 day' FROM generate_series(1, %s)
+        RETURNING id
+    """, (TITLE, auctions))
+    return [r[0] for r in cur.fetchall()]
+
+
+def bidding(user_ids: list, auction_ids: list, duration: float, inline: bool) -> dict:
+    latencies = []
+    accepted = [0]
+    lock = threading.Lock()
+    stop_at = timer() + duration
+
+    def worker(user_id):
+        rnd = random.Random(user_id)
+        conn = connect()
+        cur = conn.cursor()
+        local = []
+        ok = 0
+        while timer() < stop_at:
+            started = timer()
+            cur.execute("SELECT result FROM place_bid(%s, %s)", (rnd.choice(auction_ids), user_id))
+            ok += cur.fetchone()[0] == 'ok'
+            if inline:
+                cur.execute("SELECT * FROM fanout_outbid_events(1)")
+            conn.commit()
+            local.append(timer() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            accepted[0] += ok
+
+    workers = [threading.Thread(target=worker, args=(uid,)) for uid in user_ids]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return {
+        'bids_per_sec': accepted[0] / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def audit(cur, user_ids: list, auction_ids: list) -> dict:
+    cur.execute("""
+        SELECT COUNT(*) FROM early_participants ep
+        JOIN auctions a ON a.id = ep.auction_id
+        WHERE ep.auction_id = ANY(%s)
+          AND ep.user_id IS DISTINCT FROM a.leader_id
+          AND NOT EXISTS (
+              SELECT 1 FROM notifications n
+              WHERE n.user_id = ep.user_id AND n.auction_id = ep.auction_id
+                AND n.type = 'outbid' AND n.is_read = false
+          )
+    """, (auction_ids,))
+    missing = cur.fetchone()[0]
+    cur.execute("""
+        SELECT COUNT(*) FROM unnest(%s::int[]) AS u(user_id)
+        LEFT JOIN notification_counters c ON c.user_id = u.user_id
+        WHERE COALESCE(c.unread, 0) <> (
+            SELECT COUNT(*) FROM notifications n WHERE n.user_id = u.user_id AND n.is_read = false
+        )
+    """, (user_ids,))
+    return {'missing_notifications': missing, 'counter_mismatches': cur.fetchone()[0]}
+
+
+def run_mode(outbid, mode: str, user_ids: list, auctions: int, duration: float) -> dict:
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM notifications WHERE user_id = ANY(%s)", (user_ids,))
+    auction_ids = setup(cur, auctions)
+    conn.commit()
+    outbid.drain(conn)
+    before = dict(outbid.stats)
+
+    stop = threading.Event()
+    worker = threading.Thread(target=outbid.run, args=(stop,))
+    if mode == 'queued':
+        worker.start()
+    result = bidding(user_ids, auction_ids, duration, mode == 'inline')
+    stop.set()
+    if mode == 'queued':
+        worker.join()
+
+    cur.execute("SELECT COUNT(*) FROM outbid_events")
+    result['backlog_at_stop'] = cur.fetchone()[0]
+    conn.commit()
+    started = timer()
+    result['drain'] = outbid.drain(conn)
+    result['drain']['seconds'] = timer() - started
+    result['worker'] = {k: v - before[k] for k, v in outbid.stats.items()}
+    cur.execute("SELECT COUNT(*) FROM notifications WHERE user_id = ANY(%s) AND type = 'outbid'", (user_ids,))
+    result['outbid_notifications'] = cur.fetchone()[0]
+    result.update(audit(cur, user_ids, auction_ids))
+    cur.execute("UPDATE auctions SET status = 'ended' WHERE id = ANY(%s)", (auction_ids,))
+    conn.commit()
+    conn.close()
+    return result
+
+
+def unread_endpoint(user_id: int, unread: int, calls: int) -> dict:
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM notifications WHERE user_id = %s", (user_id,))
+    cur.execute("""
+        INSERT INTO notifications (user_id, type, title)
+        SELECT %s, 'system', 'Уведомление ' || g FROM generate_series(1, %s) g
+    """, (user_id, unread))
+    conn.commit()
+    cur.execute("ANALYZE notifications")
+    conn.commit()
+
+    count_times = []
+    for _ in range(calls):
+        started = timer()
+        cur.execute("SELECT COUNT(*) FROM notifications WHERE user_id = %s AND is_read = false", (user_id,))
+        counted = cur.fetchone()[0]
+        count_times.append(timer() - started)
+    conn.commit()
+
+    auth = load_function('auth')
+    event = make_event('GET', 'unread', token=make_token(user_id))
+    endpoint_times = []
+    with redirect_stdout(io.StringIO()):
+        for _ in range(calls):
+            started = timer()
+            result = auth.handler(event, None)
+            endpoint_times.append(timer() - started)
+    served = json.loads(result['body'])['unread']
+
+    cur.execute("DELETE FROM notifications WHERE user_id = %s", (user_id,))
+    conn.commit()
+    conn.close()
+    return {
+        'unread': unread,
+        'endpoint_p50_ms': percentile(endpoint_times, 50) * 1000,
+        'count_query_p50_ms': percentile(count_times, 50) * 1000,
+        'consistent': served == counted == unread
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--auctions', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--modes', default='queued,inline')
+    parser.add_argument('--unread', type=int, default=100000)
+    args = parser.parse_args()
+
+    conn = connect()
+    cur = conn.cursor()
+    user_ids = ensure_users(cur, 'outbid', args.threads, 10000000)
+    conn.commit()
+    conn.close()
+
+    load_function('auctions')
+    sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+    import outbid
+
+    report = {mode: run_mode(outbid, mode, user_ids, args.auctions, args.duration) for mode in args.modes.split(',')}
+    report['unread_endpoint'] = unread_endpoint(user_ids[0], args.unread, 200)
+    print(json.dumps(report, indent=2))
+    if not report['unread_endpoint']['consistent'] or any(
+            r['missing_notifications'] or r['counter_mismatches'] for k, r in report.items() if k != 'unread_endpoint'):
+        raise SystemExit(1)
@@ -0,0 +1,41 @@
+"""
+Стоимость авторизации на запрос: jwt.decode на каждый вызов против кэша проверенных токенов
+
+    python benchmarks/bench_router.py --iterations 100000
+"""
+import argparse
+import json
+import os
+import sys
+
+from common import BACKEND, make_token, timer
+
+
+def run(iterations: int, users: int) -> dict:
+    sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+    import jwt
+    import router
+
+    tokens = [make_token(uid) for uid in range(1, users + 1)]
+    secret = os.environ['JWT_SECRET']
+    cache = router.TokenCache(max_size=users * 2)
+    result = {}
+
+    for name, verify in (('jwt_decode', lambda t: jwt.decode(t, secret, algorithms=['HS256'])),
+                         ('token_cache', cache.verify)):
+        started = timer()
+        for i in range(iterations):
+            verify(tokens[i % users])
+        result[name + '_us'] = (timer() - started) / iterations * 1e6
+
+    result['speedup'] = result['jwt_decode_us'] / result['token_cache_us']
+    result['cache'] = cache.snapshot()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations, args.users), indent=2))
@@ -0,0 +1,88 @@
+"""
+Бенчмарк ставок на один аукцион: ставок/сек с секвенсором и без него
+
+    DATABASE_URL=postgres://... python benchmarks/bench_sequencer.py --threads 64 --duration 10 --window-ms 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+
+from common import load_function, connect, make_token, make_event, ensure_users, create_auction, percentile, timer
+
+
+def run(index, auction_id: int, tokens: list, duration: float) -> dict:
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = timer() + duration
+
+    def worker(token):
+        local_latencies = []
+        local_statuses = {}
+        while timer() < stop_at:
+            started = timer()
+            response = index.handler(make_event('POST', 'bid', body={'auction_id': auction_id}, token=token), None)
+            local_latencies.append(timer() - started)
+            local_statuses[response['statusCode']] = local_statuses.get(response['statusCode'], 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for code, n in local_statuses.items():
+                statuses[code] = statuses.get(code, 0) + n
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in tokens]
+    started = timer()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = timer() - started
+
+    accepted = statuses.get(200, 0)
+    return {
+        'bids_per_sec': accepted / elapsed,
+        'requests': sum(statuses.values()),
+        'statuses': statuses,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--window-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_SIZE'] = str(args.threads + 1)
+    index = load_function('auctions')
+    sequencer_module = sys.modules['sequencer']
+
+    conn = connect()
+    cur = conn.cursor()
+    user_ids = ensure_users(cur, 'seq', args.threads, 10000000)
+    tokens = [make_token(uid) for uid in user_ids]
+    results = {}
+
+    for mode, window in (('direct', 0), ('sequencer', args.window_ms)):
+        auction_id = create_auction(cur, f'bench sequencer {mode}')
+        conn.commit()
+        os.environ['BID_SEQUENCER_WINDOW_MS'] = str(window)
+        sequencer_module._sequencer = None
+        results[mode] = run(index, auction_id, tokens, args.duration)
+        sequencer = sequencer_module._sequencer
+        if sequencer:
+            results[mode]['batches'] = sequencer.stats['batches']
+            results[mode]['avg_batch'] = sequencer.stats['bids'] / max(1, sequencer.stats['batches'])
+
+        cur.execute("SELECT total_bids FROM auctions WHERE id = %s", (auction_id,))
+        results[mode]['total_bids_in_db'] = cur.fetchone()[0]
+
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Сериализация list и transactions: ручные dict + float() + json.dumps против row_mapper + serialize.encode,
+размер тела без сжатия, с gzip и br
+
+    python benchmarks/bench_serialize.py --rows 50 --iterations 5000
+"""
+import argparse
+import datetime
+import decimal
+import json
+import os
+import sys
+
+from common import BACKEND, timer
+
+
+def auction_rows(n: int) -> list:
+    now = datetime.datetime(2024, 5, 1, 12, 0, 0, 123456)
+    return [(
+        i, f'iPhone 15 Pro 256GB, лот {i}', f'https://cdn.example.com/auctions/{i}.jpg',
+        decimal.Decimal('1250.50'), 125, 10, decimal.Decimal('549990.00'), decimal.Decimal('99999999.00'),
+        'active', None, None, 3, now - datetime.timedelta(minutes=i), 'Смартфоны', 'Apple Store KZ'
+    ) for i in range(n)]
+
+
+def transaction_rows(n: int) -> list:
+    now = datetime.datetime(2024, 5, 1, 12, 0, 0, 123456)
+    return [(
+        i, 'bid', decimal.Decimal('-50.00'), decimal.Decimal('9950.00') - i, f'Auction #{i}',
+        None, 'completed', now - datetime.timedelta(seconds=i)
+    ) for i in range(n)]
+
+
+def legacy_auctions(rows):
+    auctions = []
+    for row in rows:
+        auctions.append({
+            'id': row[0],
+            'title': row[1],
+            'image': row[2],
+            'currentPrice': float(row[3]),
+            'totalBids': row[4],
+            'timeLeft': row[5],
+            'retail': float(row[6]),
+            'minPrice': float(row[7]),
+            'status': row[8],
+            'winnerId': row[9],
+            'buyItNowDeadline': row[10].isoformat() if row[10] else None,
+            'botBidsCount': row[11],
+            'startedAt': row[12].isoformat() if row[12] else None,
+            'category': row[13],
+            'supplier': row[14]
+        })
+    return json.dumps({'auctions': auctions, 'version': 1, 'nextCursor': None})
+
+
+def legacy_transactions(rows):
+    transactions = []
+    for row in rows:
+        transactions.append({
+            'id': row[0],
+            'type': row[1],
+            'amount': float(row[2]),
+            'balance_after': float(row[3]),
+            'reference': row[4],
+            'payment_method': row[5],
+            'status': row[6],
+            'created_at': row[7].isoformat() if row[7] else None
+        })
+    return json.dumps({'transactions': transactions, 'nextCursor': None})
+
+
+def measure(fn, iterations: int) -> float:
+    started = timer()
+    for _ in range(iterations):
+        fn()
+    return (timer() - started) / iterations * 1e6
+
+
+def run(rows: int, iterations: int) -> dict:
+    sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+    import serialize
+
+    auction_row = serialize.row_mapper((
+        'id', 'title', 'image', 'currentPrice', 'totalBids', 'timeLeft', 'retail', 'minPrice', 'status',
+        'winnerId', 'buyItNowDeadline', 'botBidsCount', 'startedAt', 'category', 'supplier'
+    ))
+    transaction_row = serialize.row_mapper((
+        'id', 'type', 'amount', 'balance_after', 'reference', 'payment_method', 'status', 'created_at'
+    ))
+    cases = {
+        'list': (
+            auction_rows(rows), legacy_auctions,
+            lambda r: serialize.encode({'auctions': [auction_row(x) for x in r], 'version': 1, 'nextCursor': None})
+        ),
+        'transactions': (
+            transaction_rows(rows), legacy_transactions,
+            lambda r: serialize.encode({'transactions': [transaction_row(x) for x in r], 'nextCursor': None})
+        )
+    }
+
+    result = {'encoder': 'orjson' if serialize.orjson else 'json', 'brotli': bool(serialize._load_brotli())}
+    for name, (data, legacy, fast) in cases.items():
+        body = fast(data)
+        sizes = {'legacy_bytes': len(legacy(data).encode()), 'bytes': len(body.encode())}
+        for coding in ('gzip', 'br'):
+            response = serialize.compress({'body': body, 'headers': {}}, coding)
+            if response.get('isBase64Encoded'):
+                sizes[coding + '_bytes'] = len(response['body']) * 3 // 4
+                sizes[coding + '_us'] = measure(lambda: serialize.compress({'body': body, 'headers': {}}, coding), iterations // 10 or 1)
+        result[name] = {
+            'legacy_us': measure(lambda: legacy(data), iterations),
+            'fast_us': measure(lambda: fast(data), iterations),
+            **sizes
+        }
+        result[name]['speedup'] = result[name]['legacy_us'] / result[name]['fast_us']
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.iterations), indent=2))
@@ -0,0 +1,144 @@
+"""
+Скорость расчёта завершённых аукционов (settlement.py) при разном размере пачки
+
+    DATABASE_URL=postgres://... python benchmarks/bench_settlement.py --auctions 20000 --batch-sizes 10,100,500,2000
+
+Создаёт --auctions завершённых нерассчитанных аукционов по --bidders участников из --users
+пользователей со случайными счётчиками ставок, побед и пополнений. Перед каждым замером
+результаты прошлого прогона удаляются, одна пачка применяется и откатывается (обрыв воркера),
+после расчёта повторный проход должен ничего не найти. Сверяется число заказов, значков и
+уведомлений с ожидаемым по исходным данным.
+"""
+import argparse
+import json
+import os
+import sys
+
+from common import BACKEND, connect, ensure_users, load_function, timer
+
+TITLE = 'settle bench'
+
+
+def seed(cur, auctions: int, users: int, bidders: int) -> list:
+    user_ids = ensure_users(cur, 'settle', users, 0)
+    cur.execute("""
+        UPDATE users
+        SET total_bids = (random() * 300)::int, total_wins = (random() * 15)::int,
+            total_deposit = (random() * 200000)::int
+        WHERE id = ANY(%s)
+    """, (user_ids,))
+    cur.execute("UPDATE auctions SET settled_at = LOCALTIMESTAMP WHERE title = %s AND settled_at IS NULL", (TITLE,))
+    cur.execute("""
+        INSERT INTO auctions (title, retail_price, purchase_price, current_price, bot_threshold, status,
+                              ended_at, winner_id)
+        SELECT %s, 100000, 50000, 50 * (1 + (random() * 400)::int), 0, 'ended',
+               LOCALTIMESTAMP - random() * INTERVAL '1 hour',
+               CASE WHEN random() < 0.9 THEN (%s::int[])[1 + g %% %s] END
+        FROM generate_series(1, %s) g
+        RETURNING id, winner_id
+    """, (TITLE, user_ids, len(user_ids), auctions))
+    rows = cur.fetchall()
+    auction_ids = [r[0] for r in rows]
+    cur.execute("""
+        INSERT INTO auction_bidders (auction_id, user_id)
+        SELECT a.id, (%s::int[])[1 + (a.n * 7 + j * 131) %% %s]
+        FROM unnest(%s::int[]) WITH ORDINALITY AS a(id, n), generate_series(1, %s) j
+        UNION
+        SELECT a.id, a.winner_id FROM unnest(%s::int[], %s::int[]) AS a(id, winner_id) WHERE a.winner_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """, (user_ids, len(user_ids), auction_ids, bidders, auction_ids, [r[1] for r in rows]))
+    return auction_ids
+
+
+def reset(cur, auction_ids: list):
+    cur.execute("""
+        DELETE FROM notifications WHERE user_id IN (SELECT user_id FROM auction_bidders WHERE auction_id = ANY(%s))
+    """, (auction_ids,))
+    cur.execute("""
+        DELETE FROM user_badges WHERE user_id IN (SELECT user_id FROM auction_bidders WHERE auction_id = ANY(%s))
+    """, (auction_ids,))
+    cur.execute("DELETE FROM orders WHERE auction_id = ANY(%s)", (auction_ids,))
+    cur.execute("UPDATE auctions SET settled_at = NULL WHERE id = ANY(%s)", (auction_ids,))
+
+
+def expected(cur, auction_ids: list) -> dict:
+    cur.execute("""
+        WITH p AS (SELECT DISTINCT user_id FROM auction_bidders WHERE auction_id = ANY(%(ids)s))
+        SELECT
+            (SELECT COUNT(*) FROM auctions WHERE id = ANY(%(ids)s) AND winner_id IS NOT NULL),
+            (SELECT COUNT(*) FROM auction_bidders ab JOIN auctions a ON a.id = ab.auction_id
+             WHERE a.id = ANY(%(ids)s) AND ab.user_id IS DISTINCT FROM a.winner_id),
+            (SELECT COUNT(*) FROM p
+             JOIN wallet_balances w ON w.user_id = p.user_id
+             JOIN users u ON u.id = p.user_id
+             JOIN badges bg ON CASE bg.requirement_type
+                     WHEN 'bid' THEN w.total_bids WHEN 'win' THEN u.total_wins
+                     WHEN 'deposit' THEN u.total_deposit WHEN 'loyalty' THEN u.total_deposit
+                 END >= bg.requirement_value)
+    """, {'ids': auction_ids})
+    orders, losers, badges = cur.fetchone()
+    return {'orders': orders, 'badges': badges, 'notifications': orders + losers + badges}
+
+
+def actual(cur, auction_ids: list) -> dict:
+    cur.execute("""
+        WITH p AS (SELECT DISTINCT user_id FROM auction_bidders WHERE auction_id = ANY(%(ids)s))
+        SELECT
+            (SELECT COUNT(*) FROM orders WHERE auction_id = ANY(%(ids)s)),
+            (SELECT COUNT(*) FROM user_badges WHERE user_id IN (SELECT user_id FROM p)),
+            (SELECT COUNT(*) FROM notifications WHERE user_id IN (SELECT user_id FROM p))
+    """, {'ids': auction_ids})
+    orders, badges, notifications = cur.fetchone()
+    return {'orders': orders, 'badges': badges, 'notifications': notifications}
+
+
+def run(settlement, auctions: int, users: int, bidders: int, batch_sizes: list) -> dict:
+    conn = connect()
+    cur = conn.cursor()
+    settlement.settle(conn)
+    auction_ids = seed(cur, auctions, users, bidders)
+    conn.commit()
+    want = expected(cur, auction_ids)
+    conn.commit()
+
+    report = {'auctions': auctions, 'expected': want}
+    for batch_size in batch_sizes:
+        reset(cur, auction_ids)
+        conn.commit()
+        cur.execute("SELECT * FROM settle_auctions(%s)", (batch_size,))
+        conn.rollback()
+
+        started = timer()
+        totals = settlement.settle(conn, batch_size)
+        elapsed = timer() - started
+        again = settlement.settle(conn, batch_size)
+        got = actual(cur, auction_ids)
+        conn.commit()
+        report[f'batch_{batch_size}'] = {
+            'auctions_per_sec': totals['auctions'] / elapsed,
+            'seconds': elapsed,
+            'batches': totals['batches'],
+            'settled': totals,
+            'second_pass': again['auctions'],
+            'consistent': got == want and totals['auctions'] == auctions and not again['auctions']
+        }
+    conn.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--auctions', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--bidders', type=int, default=5, help='участников на аукцион')
+    parser.add_argument('--batch-sizes', default='10,100,500,2000')
+    args = parser.parse_args()
+
+    load_function('auctions')
+    sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+    import settlement
+
+    report = run(settlement, args.auctions, args.users, args.bidders, [int(b) for b in args.batch_sizes.split(',')])
+    print(json.dumps(report, indent=2))
+    if not all(v['consistent'] for k, v in report.items() if k.startswith('batch_')):
+        raise SystemExit(1)
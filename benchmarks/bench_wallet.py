@@ -0,0 +1,155 @@
+"""
+Списания с кошелька одного пользователя, который ставит на много аукционов сразу
+
+    DATABASE_URL=postgres://... python benchmarks/bench_wallet.py --threads 16 --duration 5
+
+same_slot — все аукционы попадают в один слот wallet_slots (auction_id % 8 совпадает), то есть
+ставки сериализуются на одной строке, как раньше на users; spread — аукционы в разных слотах.
+overspend — баланс на --affordable ставок и --threads потоков, которые ставят, пока не упрутся:
+принятых ставок должно быть ровно --affordable, а итоговый баланс — не меньше нуля.
+Для каждого режима сверяется, что списано ровно 50 за каждую принятую ставку.
+--sql вызывает place_bid() напрямую со своих соединений, без handler и GIL-ограничений Python;
+--hold-ms держит транзакцию ставки открытой ещё столько миллисекунд (сетевой круг до клиента),
+чтобы на малом числе ядер было видно, сколько ставок ждут блокировок друг друга.
+"""
+import argparse
+import io
+import json
+import os
+import threading
+from contextlib import redirect_stdout
+
+from common import connect, create_auction, ensure_users, load_function, make_event, make_token, percentile, timer
+
+SLOTS = 8
+
+
+def auctions_for(cur, mode: str, count: int) -> list:
+    """count новых аукционов: с одинаковым auction_id % SLOTS для same_slot, по кругу слотов иначе."""
+    ids = []
+    while len(ids) < count:
+        auction_id = create_auction(cur, f'wallet bench {mode}')
+        if mode != 'same_slot' or auction_id % SLOTS == (ids[0] % SLOTS if ids else auction_id % SLOTS):
+            ids.append(auction_id)
+    return ids
+
+
+def sql_bidder(user_id: int, hold_ms: float = 0):
+    """place_bid() на собственном соединении потока; ответ в виде статуса HTTP, как у handler."""
+    local = threading.local()
+
+    def bid(auction_id):
+        if not hasattr(local, 'conn'):
+            local.conn = connect()
+        conn = local.conn
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT result FROM place_bid(%s, %s)", (auction_id, user_id))
+            ok = cur.fetchone()[0] == 'ok'
+            if hold_ms:
+                cur.execute("SELECT pg_sleep(%s)", (hold_ms / 1000,))
+            conn.commit()
+            return 200 if ok else 400
+        except Exception:
+            conn.rollback()
+            return 500
+        finally:
+            cur.close()
+    return bid
+
+
+def handler_bidder(index, token: str):
+    def bid(auction_id):
+        return index.handler(make_event('POST', 'bid', body={'auction_id': auction_id}, token=token), None)['statusCode']
+    return bid
+
+
+def hammer(bid, auction_ids: list, duration: float = None) -> dict:
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = timer() + duration if duration else None
+
+    def worker(auction_id):
+        local = []
+        local_statuses = {}
+        while stop_at is None or timer() < stop_at:
+            started = timer()
+            status = bid(auction_id)
+            local.append(timer() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if stop_at is None and status != 200:
+                break
+        with lock:
+            latencies.extend(local)
+            for code, n in local_statuses.items():
+                statuses[code] = statuses.get(code, 0) + n
+
+    workers = [threading.Thread(target=worker, args=(a,)) for a in auction_ids]
+    started = timer()
+    with redirect_stdout(io.StringIO()):
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    elapsed = timer() - started
+    return {
+        'bids_per_sec': statuses.get(200, 0) / elapsed,
+        'statuses': statuses,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def audit(cur, user_id: int, initial: float, accepted: int, since) -> dict:
+    cur.execute("SELECT balance FROM wallet_balances WHERE user_id = %s", (user_id,))
+    balance = float(cur.fetchone()[0])
+    cur.execute("SELECT COUNT(*), COALESCE(MIN(credit), 0) FROM wallet_slots WHERE user_id = %s", (user_id,))
+    slots, min_credit = cur.fetchone()
+    cur.execute("""
+        SELECT COUNT(*) FROM transactions WHERE user_id = %s AND type = 'bid' AND created_at >= %s
+    """, (user_id, since))
+    ledger = cur.fetchone()[0]
+    return {
+        'final_balance': balance,
+        'slots_used': slots,
+        'consistent': balance >= 0 and float(min_credit) >= 0
+                      and abs(initial - balance - 50 * accepted) < 0.005 and ledger == accepted
+    }
+
+
+def run(mode: str, threads: int, duration: float, affordable: int, sql: bool = False, hold_ms: float = 0) -> dict:
+    conn = connect()
+    cur = conn.cursor()
+    initial = 50 * affordable + 20 if mode == 'overspend' else 10000000
+    user_id = ensure_users(cur, f'wallet-{mode}', 1, initial)[0]
+    auction_ids = auctions_for(cur, mode, threads)
+    cur.execute("SELECT LOCALTIMESTAMP")
+    since = cur.fetchone()[0]
+    conn.commit()
+
+    bid = sql_bidder(user_id, hold_ms) if sql else handler_bidder(load_function('auctions'), make_token(user_id))
+    result = hammer(bid, auction_ids, None if mode == 'overspend' else duration)
+    accepted = result['statuses'].get(200, 0)
+    result.update(audit(cur, user_id, initial, accepted, since))
+    if mode == 'overspend':
+        result['consistent'] = result['consistent'] and accepted == affordable
+    conn.close()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--affordable', type=int, default=200)
+    parser.add_argument('--modes', default='same_slot,spread,overspend')
+    parser.add_argument('--sql', action='store_true')
+    parser.add_argument('--hold-ms', type=float, default=0, help='только с --sql')
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_SIZE'] = str(args.threads + 1)
+    report = {mode: run(mode, args.threads, args.duration, args.affordable, args.sql, args.hold_ms) for mode in args.modes.split(',')}
+    print(json.dumps(report, indent=2))
+    if not all(r['consistent'] for r in report.values()):
+        raise SystemExit(1)
@@ -0,0 +1,142 @@
+"""
+Локальная замена CloudPayments: шлёт в wallet callback всплески повторных и перемешанных
+уведомлений и проверяет, что каждый платёж зачислен ровно один раз
+
+    DATABASE_URL=postgres://... python benchmarks/cloudpayments_stub.py --payments 2000 --retries 3
+    python benchmarks/cloudpayments_stub.py --modes queued --threads 32
+
+Каждый платёж доставляется 1 + до --retries раз, все доставки перемешаны; часть платежей
+сопровождается уведомлением Declined с тем же TransactionId, пришедшим позже. Если задан
+CLOUDPAYMENTS_API_SECRET, уведомления подписываются, а --forged поддельных должны получить 401.
+В режиме queued после всплеска очередь применяется payments.drain.
+"""
+import argparse
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+from common import connect, ensure_users, load_function, make_event, percentile, timer
+
+
+def sign(body: dict) -> str:
+    message = f"{body['TransactionId']}{body['Amount']}{body['Currency']}"
+    return hmac.new(os.environ.get('CLOUDPAYMENTS_API_SECRET', '').encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def build_deliveries(rnd, user_ids: list, payments: int, retries: int, forged: int, first_id: int) -> tuple:
+    deliveries = []
+    expected = {uid: 0 for uid in user_ids}
+    for n in range(payments):
+        body = {'Status': 'Completed', 'AccountId': str(rnd.choice(user_ids)), 'Amount': rnd.choice((100, 500, 1000, 2500)),
+                'Currency': 'KZT', 'TransactionId': first_id + n}
+        expected[int(body['AccountId'])] += body['Amount']
+        deliveries.extend([body] * (1 + rnd.randint(0, retries)))
+        if rnd.random() < 0.1:
+            deliveries.append(dict(body, Status='Declined'))
+    for n in range(forged if os.environ.get('CLOUDPAYMENTS_API_SECRET') else 0):
+        deliveries.append({'Status': 'Completed', 'AccountId': str(user_ids[0]), 'Amount': 100000,
+                           'Currency': 'KZT', 'TransactionId': first_id + payments + n, 'forged': True})
+    rnd.shuffle(deliveries)
+    return deliveries, expected
+
+
+def burst(wallet, deliveries: list, threads: int) -> dict:
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(chunk):
+        local = []
+        for body in chunk:
+            signature = 'forged' if body.get('forged') else sign(body)
+            event = make_event('POST', 'callback', body={k: v for k, v in body.items() if k != 'forged'},
+                               headers={'Content-HMAC': signature})
+            started = timer()
+            result = wallet.handler(event, None)
+            local.append(timer() - started)
+            key = f"{result['statusCode']}:{json.loads(result['body']).get('code', '-')}"
+            with lock:
+                statuses[key] = statuses.get(key, 0) + 1
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(deliveries[i::threads],)) for i in range(threads)]
+    started = timer()
+    with redirect_stdout(io.StringIO()):
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    elapsed = timer() - started
+    return {
+        'deliveries': len(deliveries),
+        'throughput': len(deliveries) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'statuses': statuses
+    }
+
+
+def run(mode: str, payments: int, retries: int, forged: int, users: int, threads: int) -> dict:
+    os.environ['CALLBACK_QUEUE'] = '1' if mode == 'queued' else '0'
+    os.environ.setdefault('DB_POOL_SIZE', str(threads + 1))
+    rnd = random.Random(payments)
+
+    conn = connect()
+    cur = conn.cursor()
+    user_ids = ensure_users(cur, f'cpstub-{mode}', users, 0)
+    cur.execute("SELECT COALESCE(MAX(transaction_id), 0) + 1 FROM payment_callbacks")
+    first_id = max(cur.fetchone()[0], int(time.time()) * 1000)
+    conn.commit()
+
+    deliveries, expected = build_deliveries(rnd, user_ids, payments, retries, forged, first_id)
+    wallet = load_function('wallet')
+    module = sys.modules['payments']
+    result = burst(wallet, deliveries, threads)
+
+    if mode == 'queued':
+        started = timer()
+        db = sys.modules['db']
+        drain_conn = db.get_db()
+        try:
+            result['drain'] = module.drain(drain_conn)
+        finally:
+            db.release_db(drain_conn)
+        result['drain']['seconds'] = timer() - started
+
+    cur.execute("SELECT user_id, balance FROM wallet_balances WHERE user_id = ANY(%s)", (user_ids,))
+    wrong = {uid: float(balance) - expected[uid] for uid, balance in cur.fetchall() if float(balance) != expected[uid]}
+    cur.execute("""
+        SELECT COUNT(*) - COUNT(DISTINCT reference) FROM transactions
+        WHERE user_id = ANY(%s) AND type = 'topup' AND created_at > NOW() - INTERVAL '1 day'
+    """, (user_ids,))
+    result['double_credits'] = cur.fetchone()[0]
+    result['balance_mismatches'] = len(wrong)
+    result['unique_payments'] = payments
+    result['callback_stats'] = dict(module.stats)
+    conn.close()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--payments', type=int, default=2000)
+    parser.add_argument('--retries', type=int, default=3, help='до скольких повторов на платёж')
+    parser.add_argument('--forged', type=int, default=20)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--modes', default='sync,queued')
+    args = parser.parse_args()
+
+    report = {mode: run(mode, args.payments, args.retries, args.forged, args.users, args.threads)
+              for mode in args.modes.split(',')}
+    print(json.dumps(report, indent=2))
+    if any(r['double_credits'] or r['balance_mismatches'] for r in report.values()):
+        sys.exit(1)
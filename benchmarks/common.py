@@ -0,0 +1,92 @@
+"""
+Общие утилиты бенчмарков: загрузка облачных функций и работа с локальной базой
+"""
+import importlib
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, 'backend')
+
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+
+
+def load_function(name: str):
+    """Импортирует backend/<name>/index.py изолированно от остальных функций.
+
+    У функций совпадают имена модулей (index, db, ...), поэтому перед импортом
+    из sys.modules убираются модули, загруженные из других папок backend/.
+    """
+    fn_dir = os.path.join(BACKEND, name)
+    for mod_name, mod in list(sys.modules.items()):
+        mod_file = getattr(mod, '__file__', None) or ''
+        if mod_file.startswith(BACKEND + os.sep):
+            del sys.modules[mod_name]
+    sys.path.insert(0, fn_dir)
+    try:
+        return importlib.import_module('index')
+    finally:
+        sys.path.remove(fn_dir)
+
+
+def connect():
+    import psycopg2
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+
+def make_token(user_id: int) -> str:
+    import jwt
+    from datetime import datetime, timedelta
+    payload = {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(days=1)}
+    return jwt.encode(payload, os.environ['JWT_SECRET'], algorithm='HS256')
+
+
+def make_event(method: str, action: str, params: dict = None, body: dict = None, token: str = None, headers: dict = None) -> dict:
+    query = {'action': action}
+    query.update(params or {})
+    event_headers = dict(headers or {})
+    if token:
+        event_headers['X-Auth-Token'] = token
+    return {
+        'httpMethod': method,
+        'queryStringParameters': query,
+        'headers': event_headers,
+        'body': json.dumps(body) if body is not None else ''
+    }
+
+
+def ensure_users(cur, prefix: str, count: int, balance: float) -> list:
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, balance, total_deposit)
+        SELECT %s || '-' || g || '@bench.local', 'x', 'Bench ' || g, %s, %s
+        FROM generate_series(1, %s) g
+        ON CONFLICT (email) DO UPDATE SET balance = EXCLUDED.balance
+        RETURNING id
+    """, (prefix, balance, balance, count))
+    user_ids = [r[0] for r in cur.fetchall()]
+    cur.execute("DELETE FROM wallet_slots WHERE user_id = ANY(%s)", (user_ids,))
+    return user_ids
+
+
+def create_auction(cur, title: str, min_price: float = 99999999, bot_threshold: float = 0) -> int:
+    cur.execute("""
+        INSERT INTO auctions (title, retail_price, purchase_price, current_price, bot_threshold, min_price_limit, status,
+                              ends_at)
+        VALUES (%s, 100000, 50000, 0, %s, %s, 'active', LOCALTIMESTAMP + INTERVAL '1 day')
+        RETURNING id
+    """, (title, bot_threshold, min_price))
+    return cur.fetchone()[0]
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def timer():
+    return time.perf_counter()
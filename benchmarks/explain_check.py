@@ -0,0 +1,192 @@
+"""
+Регрессия планов горячих запросов: EXPLAIN на заполненной базе, падает при Seq Scan или Sort
+
+    DATABASE_URL=postgres://... python benchmarks/explain_check.py --seed
+    python benchmarks/explain_check.py
+"""
+import argparse
+import json
+import os
+import sys
+
+from common import BACKEND, connect
+import harness
+
+sys.path.insert(0, os.path.join(BACKEND, 'auctions'))
+from timer_engine import REFRESH_SQL, WATERMARK_HORIZON, WATERMARK_SLACK  # noqa: E402
+
+# Маленькие справочники, для которых последовательное чтение нормально
+SMALL_TABLES = {'categories', 'suppliers', 'badges'}
+
+HOT_QUERIES = {
+    'list': """
+        SELECT a.id, a.title, a.current_price, a.started_at, c.name, s.name
+        FROM auctions a
+        LEFT JOIN categories c ON a.category_id = c.id
+        LEFT JOIN suppliers s ON a.supplier_id = s.id
+        WHERE a.status = 'active'
+        ORDER BY a.started_at DESC, a.id DESC LIMIT 51
+    """,
+    'list_category': """
+        SELECT a.id, a.title, a.current_price, a.started_at, c.name, s.name
+        FROM auctions a
+        LEFT JOIN categories c ON a.category_id = c.id
+        LEFT JOIN suppliers s ON a.supplier_id = s.id
+        WHERE a.status = 'active' AND a.category_id = %(category_id)s
+        ORDER BY a.started_at DESC, a.id DESC LIMIT 51
+    """,
+    'list_category_tree': """
+        SELECT a.id, a.title, a.current_price, a.started_at, c.name, s.name
+        FROM auctions a
+        LEFT JOIN categories c ON a.category_id = c.id
+        LEFT JOIN suppliers s ON a.supplier_id = s.id
+        WHERE a.status = 'active' AND a.category_id = ANY(%(category_ids)s)
+        ORDER BY a.started_at DESC, a.id DESC LIMIT 51
+    """,
+    'list_cursor': """
+        SELECT a.id FROM auctions a
+        WHERE a.status = 'active' AND (a.started_at, a.id) < (NOW(), %(auction_id)s)
+        ORDER BY a.started_at DESC, a.id DESC LIMIT 51
+    """,
+    'list_version': "SELECT COALESCE(MAX(version), 0) FROM auctions",
+    'list_since': """
+        SELECT a.id FROM auctions a WHERE a.change_xid >= %(xmin)s::text::xid8 ORDER BY a.change_xid, a.id LIMIT 51
+    """,
+    'details_static': """
+        SELECT a.id, a.title, c.name, s.name, s.rating
+        FROM auctions a
+        LEFT JOIN categories c ON a.category_id = c.id
+        LEFT JOIN suppliers s ON a.supplier_id = s.id
+        WHERE a.id = %(auction_id)s
+    """,
+    'details_early_participants': """
+        SELECT user_id, joined_at FROM early_participants
+        WHERE auction_id = %(auction_id)s ORDER BY joined_at LIMIT 10
+    """,
+    'transactions': """
+        SELECT id, type, amount, balance_after, created_at FROM transactions
+        WHERE user_id = %(user_id)s ORDER BY created_at DESC, id DESC LIMIT 51
+    """,
+    'transactions_cursor': """
+        SELECT id FROM transactions
+        WHERE user_id = %(user_id)s AND (created_at, id) < (NOW(), %(auction_id)s)
+        ORDER BY created_at DESC, id DESC LIMIT 51
+    """,
+    'last_bid': """
+        SELECT user_id FROM bids
+        WHERE auction_id = %(auction_id)s AND created_at >= NOW() - INTERVAL '1 hour'
+        ORDER BY id DESC LIMIT 1
+    """,
+    # Запрос самого TimerEngine.refresh с позиционными параметрами: (SQL, параметры из sample_params)
+    'timer_refresh': (REFRESH_SQL, lambda p: (p['watermark'] - WATERMARK_SLACK, WATERMARK_HORIZON))
+}
+
+
+def seed(users: int, auctions: int, bids: int):
+    harness.seed(users, auctions, bids)
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE auctions
+        SET status = 'ended', ended_at = NOW(), winner_id = (SELECT MIN(id) FROM users) + id %% %s
+        WHERE title LIKE 'harness %%' AND id %% 10 <> 0 AND status = 'active'
+    """, (users,))
+    cur.execute("""
+        INSERT INTO early_participants (auction_id, user_id, joined_at)
+        SELECT auction_id, user_id, MIN(created_at) FROM bids
+        WHERE is_bot = false GROUP BY auction_id, user_id
+        ON CONFLICT DO NOTHING
+    """)
+    conn.commit()
+    conn.autocommit = True
+    cur.execute("VACUUM ANALYZE")
+    conn.close()
+
+
+def sample_params(cur) -> dict:
+    cur.execute("SELECT id, category_id FROM auctions WHERE status = 'active' ORDER BY id DESC LIMIT 1")
+    auction_id, category_id = cur.fetchone()
+    cur.execute("""
+        SELECT array_agg(id) FROM categories
+        WHERE id = (SELECT id FROM categories WHERE parent_id IS NULL ORDER BY sort_order, id LIMIT 1)
+           OR parent_id = (SELECT id FROM categories WHERE parent_id IS NULL ORDER BY sort_order, id LIMIT 1)
+    """)
+    category_ids = cur.fetchone()[0]
+    cur.execute("SELECT user_id FROM transactions ORDER BY id DESC LIMIT 1")
+    row = cur.fetchone()
+    cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text, EXTRACT(EPOCH FROM LOCALTIMESTAMP)::float8")
+    xmin, watermark = cur.fetchone()
+    return {
+        'auction_id': auction_id,
+        'category_id': category_id,
+        'category_ids': category_ids or [category_id],
+        'user_id': row[0] if row else 1,
+        'xmin': xmin,
+        'watermark': watermark
+    }
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def empty_tables(cur) -> set:
+    """Пустые партиции (будущие месяцы, DEFAULT) планировщик честно читает Seq Scan."""
+    cur.execute("SELECT relname FROM pg_class WHERE relkind = 'r' AND relispartition AND reltuples = 0")
+    return {r[0] for r in cur.fetchall()}
+
+
+def check(cur, name: str, query: str, params: dict, allowed: set = SMALL_TABLES) -> list:
+    cur.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+    plan = cur.fetchone()[0][0]['Plan']
+    problems = []
+    for node in walk(plan):
+        node_type = node['Node Type']
+        if node_type == 'Seq Scan' and node.get('Relation Name') not in allowed:
+            problems.append(f"Seq Scan on {node.get('Relation Name')}")
+        if node_type in ('Sort', 'Incremental Sort'):
+            problems.append(f"{node_type} by {node.get('Sort Key')}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--users', type=int, default=10000, help='на пользователя должно приходиться больше ставок, чем помещается в страницу')
+    parser.add_argument('--auctions', type=int, default=100000)
+    parser.add_argument('--bids', type=int, default=3000000)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.users, args.auctions, args.bids)
+
+    conn = connect()
+    cur = conn.cursor()
+    params = sample_params(cur)
+    allowed = SMALL_TABLES | empty_tables(cur)
+    failures = {}
+    for name, query in HOT_QUERIES.items():
+        query_params = params
+        if isinstance(query, tuple):
+            query, make_params = query
+            query_params = make_params(params)
+        problems = check(cur, name, query, query_params, allowed)
+        status = 'FAIL' if problems else 'ok'
+        print(f'{status:4} {name}' + (f": {', '.join(problems)}" if problems else ''))
+        if problems:
+            failures[name] = problems
+        if args.verbose:
+            cur.execute('EXPLAIN ' + query, query_params)
+            print('\n'.join('     ' + r[0] for r in cur.fetchall()))
+    conn.close()
+
+    if failures:
+        print(json.dumps(failures, indent=2, ensure_ascii=False))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
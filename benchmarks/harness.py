@@ -0,0 +1,246 @@
+"""
+Нагрузочный бенчмарк трёх функций: вызывает handler(event, context) напрямую против локальной базы
+
+    DATABASE_URL=postgres://... python benchmarks/harness.py --seed
+    python benchmarks/harness.py --scenarios list_browse,bid_storm --threads 32 --duration 15
+    python benchmarks/harness.py --compare benchmarks/results/<old>.json
+
+Результаты пишутся в benchmarks/results/<время>.json.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+
+from common import ROOT, load_function, connect, make_token, make_event, percentile, timer
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+USER_PREFIX = 'harness'
+
+
+def seed(users: int, auctions: int, history: int):
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, balance, total_deposit)
+        SELECT %s || '-' || g || '@bench.local', 'x', 'Bench ' || g, 10000000, 10000000
+        FROM generate_series(1, %s) g
+        ON CONFLICT (email) DO UPDATE SET balance = EXCLUDED.balance
+    """, (USER_PREFIX, users))
+    cur.execute("DELETE FROM wallet_slots WHERE user_id IN (SELECT id FROM users WHERE email LIKE %s)", (USER_PREFIX + '-%',))
+    cur.execute("SELECT COUNT(*) FROM auctions WHERE title LIKE 'harness %%' AND status = 'active'")
+    missing = max(0, auctions - cur.fetchone()[0])
+    cur.execute("""
+        WITH c AS (SELECT array_agg(id) AS ids FROM categories)
+        INSERT INTO auctions (title, description, category_id, retail_price, purchase_price,
+                              current_price, bot_threshold, min_price_limit, status, ends_at)
+        SELECT 'harness ' || g, 'Сгенерированный аукцион', c.ids[1 + g %% cardinality(c.ids)],
+               100000, 50000, 0, 0, 99999999, 'active', LOCALTIMESTAMP + INTERVAL '1 day'
+        FROM generate_series(1, %s) g, c
+    """, (missing,))
+    if history:
+        cur.execute("""
+            WITH a AS (SELECT array_agg(id) AS ids FROM auctions WHERE title LIKE 'harness %%'),
+                 u AS (SELECT array_agg(id) AS ids FROM users WHERE email LIKE %s)
+            INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot, created_at)
+            SELECT a.ids[1 + g %% cardinality(a.ids)], u.ids[1 + g %% cardinality(u.ids)],
+                   50, 50, false, NOW() - (g || ' seconds')::interval
+            FROM generate_series(1, %s) g, a, u
+        """, (USER_PREFIX + '-%', history))
+        cur.execute("""
+            INSERT INTO transactions (user_id, type, amount, balance_after, reference, created_at)
+            SELECT user_id, 'bid', -50, 0, 'Auction #' || auction_id, created_at
+            FROM bids WHERE user_id IN (SELECT id FROM users WHERE email LIKE %s)
+        """, (USER_PREFIX + '-%',))
+    conn.commit()
+    conn.close()
+
+
+def load_fixtures():
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM users WHERE email LIKE %s ORDER BY id", (USER_PREFIX + '-%',))
+    user_ids = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT id FROM auctions WHERE title LIKE 'harness %%' AND status = 'active' ORDER BY id")
+    auction_ids = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT DISTINCT category_id FROM auctions WHERE category_id IS NOT NULL")
+    category_ids = [r[0] for r in cur.fetchall()]
+    conn.close()
+    if not user_ids or not auction_ids:
+        raise SystemExit('Нет данных для бенчмарка: запустите с --seed')
+    return user_ids, auction_ids, category_ids
+
+
+def build_scenarios(functions: dict, user_ids: list, auction_ids: list, category_ids: list) -> dict:
+    tokens = {uid: make_token(uid) for uid in user_ids}
+    auctions, wallet, auth = functions['auctions'], functions['wallet'], functions['auth']
+    hot_auction = auction_ids[0]
+
+    def list_browse(rnd):
+        params = {}
+        if category_ids and rnd.random() < 0.5:
+            params['category_id'] = str(rnd.choice(category_ids))
+        return 'list', auctions.handler(make_event('GET', 'list', params), None)
+
+    def details_view(rnd):
+        return 'details', auctions.handler(make_event('GET', 'details', {'id': str(rnd.choice(auction_ids))}), None)
+
+    def bid_storm(rnd):
+        token = tokens[rnd.choice(user_ids)]
+        return 'bid', auctions.handler(make_event('POST', 'bid', body={'auction_id': hot_auction}, token=token), None)
+
+    def many_auction_bids(rnd):
+        token = tokens[rnd.choice(user_ids)]
+        body = {'auction_id': rnd.choice(auction_ids)}
+        return 'bid', auctions.handler(make_event('POST', 'bid', body=body, token=token), None)
+
+    def payment_callback_burst(rnd):
+        body = {
+            'Status': 'Completed',
+            'AccountId': str(rnd.choice(user_ids)),
+            'Amount': 1000,
+            'Currency': 'KZT',
+            'TransactionId': rnd.randrange(10 ** 12)
+        }
+        return 'callback', wallet.handler(make_event('POST', 'callback', body=body), None)
+
+    def wallet_views(rnd):
+        token = tokens[rnd.choice(user_ids)]
+        action = 'balance' if rnd.random() < 0.5 else 'transactions'
+        return action, wallet.handler(make_event('GET', action, token=token), None)
+
+    def profile_views(rnd):
+        return 'me', auth.handler(make_event('GET', 'me', token=tokens[rnd.choice(user_ids)]), None)
+
+    return {
+        'list_browse': list_browse,
+        'details_view': details_view,
+        'bid_storm': bid_storm,
+        'many_auction_bids': many_auction_bids,
+        'payment_callback_burst': payment_callback_burst,
+        'wallet_views': wallet_views,
+        'profile_views': profile_views
+    }
+
+
+def run_scenario(step, threads: int, duration: float, seed_value: int) -> dict:
+    samples = {}
+    lock = threading.Lock()
+    stop_at = timer() + duration
+
+    def worker(n):
+        rnd = random.Random(seed_value + n)
+        local = {}
+        while timer() < stop_at:
+            started = timer()
+            action, response = step(rnd)
+            elapsed = timer() - started
+            entry = local.setdefault(action, {'latencies': [], 'statuses': {}})
+            entry['latencies'].append(elapsed)
+            code = response['statusCode']
+            entry['statuses'][code] = entry['statuses'].get(code, 0) + 1
+        with lock:
+            for action, entry in local.items():
+                merged = samples.setdefault(action, {'latencies': [], 'statuses': {}})
+                merged['latencies'].extend(entry['latencies'])
+                for code, n in entry['statuses'].items():
+                    merged['statuses'][code] = merged['statuses'].get(code, 0) + n
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = timer()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = timer() - started
+
+    report = {}
+    for action, entry in samples.items():
+        latencies = entry['latencies']
+        report[action] = {
+            'requests': len(latencies),
+            'throughput': len(latencies) / elapsed,
+            'statuses': {str(k): v for k, v in sorted(entry['statuses'].items())},
+            'errors': sum(v for k, v in entry['statuses'].items() if k >= 500),
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000
+        }
+    return report
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old_path: str, new: dict):
+    with open(old_path) as f:
+        old = json.load(f)
+    for scenario, actions in new['scenarios'].items():
+        for action, stats in actions.items():
+            before = old.get('scenarios', {}).get(scenario, {}).get(action)
+            if not before:
+                continue
+            print(f"{scenario:24} {action:14} "
+                  f"rps {before['throughput']:9.1f} -> {stats['throughput']:9.1f}   "
+                  f"p95 {before['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms   "
+                  f"p99 {before['p99_ms']:8.2f} -> {stats['p99_ms']:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', action='store_true', help='заполнить базу синтетическими данными')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--auctions', type=int, default=500)
+    parser.add_argument('--history', type=int, default=100000, help='сколько исторических ставок создать при --seed')
+    parser.add_argument('--scenarios', default='list_browse,details_view,bid_storm,many_auction_bids,payment_callback_burst,wallet_views,profile_views')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--compare', help='путь к прошлому результату для сравнения')
+    parser.add_argument('--output', help='куда сохранить JSON (по умолчанию benchmarks/results/<время>.json)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_POOL_SIZE', str(args.threads + 1))
+
+    if args.seed:
+        seed(args.users, args.auctions, args.history)
+
+    functions = {name: load_function(name) for name in ('auctions', 'wallet', 'auth')}
+    user_ids, auction_ids, category_ids = load_fixtures()
+    scenarios = build_scenarios(functions, user_ids, auction_ids, category_ids)
+
+    result = {
+        'meta': {
+            'revision': git_revision(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'threads': args.threads,
+            'duration': args.duration
+        },
+        'scenarios': {}
+    }
+
+    for name in args.scenarios.split(','):
+        result['scenarios'][name] = run_scenario(scenarios[name], args.threads, args.duration, seed_value=len(name))
+        for action, stats in result['scenarios'][name].items():
+            print(f"{name:24} {action:14} {stats['throughput']:9.1f} req/s  "
+                  f"p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  p99 {stats['p99_ms']:7.2f} ms  "
+                  f"errors {stats['errors']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'saved {output}')
+
+    if args.compare:
+        compare(args.compare, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Холодный старт функций: время импорта каждого модуля (python -X importtime) при загрузке index.py
+и ответе на OPTIONS, плюс модули, которые догружает первый вызов action
+
+    python benchmarks/profile_startup.py
+    python benchmarks/profile_startup.py --budget-ms 40 --top 15
+    DATABASE_URL=postgres://... python benchmarks/profile_startup.py --actions
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import BACKEND
+
+FUNCTIONS = ('auctions', 'wallet', 'auth')
+
+# Модули, которые не должны загружаться до первого action, которому они нужны
+HEAVY = ('psycopg2', 'jwt', 'hashlib', 'hmac', 'decimal', 'gzip', 'brotli', 'redis', 'asyncpg')
+
+FIRST_ACTIONS = {
+    'auctions': [('GET', 'list', None), ('GET', 'details', {'id': '1'}), ('POST', 'bid', None)],
+    'wallet': [('GET', 'balance', None), ('GET', 'transactions', None), ('POST', 'callback', None)],
+    'auth': [('GET', 'me', None), ('POST', 'login', None)]
+}
+
+CHILD = r"""
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import index
+loaded = time.perf_counter()
+index.handler({'httpMethod': 'OPTIONS', 'queryStringParameters': {}, 'headers': {}, 'body': ''}, None)
+answered = time.perf_counter()
+report = {'import_ms': (loaded - started) * 1000, 'options_ms': (answered - loaded) * 1000,
+          'modules': sorted(sys.modules), 'actions': {}}
+for method, action, params in json.loads(sys.argv[2]):
+    before = set(sys.modules)
+    query = dict(params or {}, action=action)
+    t = time.perf_counter()
+    index.handler({'httpMethod': method, 'queryStringParameters': query, 'headers': {}, 'body': '{}'}, None)
+    report['actions'][f'{method} {action}'] = {
+        'ms': (time.perf_counter() - t) * 1000,
+        'new_modules': sorted(m for m in set(sys.modules) - before if '.' not in m)
+    }
+sys.stdout.write(json.dumps(report) + '\n')
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Строки 'import time: self | cumulative | name' -> {name: (self_us, cumulative_us)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def profile(name: str, actions: list) -> dict:
+    env = dict(os.environ, INSTRUMENT=os.environ.get('INSTRUMENT', '1'))
+    baseline = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'],
+                              capture_output=True, text=True, env=env)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, os.path.join(BACKEND, name), json.dumps(actions)],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr)
+    startup = parse_importtime(baseline.stderr)
+    timings = {k: v for k, v in parse_importtime(proc.stderr).items() if k not in startup}
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'import_ms': report['import_ms'],
+        'options_ms': report['options_ms'],
+        'modules': {k: {'self_ms': v[0] / 1000, 'cumulative_ms': v[1] / 1000} for k, v in timings.items()},
+        'heavy_on_options': [m for m in HEAVY if m in report['modules']],
+        'actions': report['actions']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--functions', default=','.join(FUNCTIONS))
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, help='упасть, если импорт index.py дольше')
+    parser.add_argument('--actions', action='store_true', help='вызвать первые action каждой функции (нужна DATABASE_URL)')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    over_budget = []
+    for name in args.functions.split(','):
+        result = results[name] = profile(name, FIRST_ACTIONS[name] if args.actions else [])
+        if args.budget_ms and result['import_ms'] > args.budget_ms:
+            over_budget.append(name)
+        if args.json:
+            continue
+        print(f"{name}: import {result['import_ms']:.1f} ms, OPTIONS {result['options_ms']:.2f} ms, "
+              f"heavy on OPTIONS: {', '.join(result['heavy_on_options']) or '-'}")
+        top = sorted(result['modules'].items(), key=lambda kv: kv[1]['cumulative_ms'], reverse=True)[:args.top]
+        for module, t in top:
+            print(f"    {t['cumulative_ms']:8.2f} ms  (self {t['self_ms']:6.2f})  {module}")
+        for action, info in result['actions'].items():
+            print(f"    first {action}: {info['ms']:.1f} ms, loads {', '.join(info['new_modules']) or '-'}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if over_budget:
+        print(f"over budget ({args.budget_ms} ms): {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
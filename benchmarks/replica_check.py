@@ -0,0 +1,62 @@
+"""
+Проверка read-your-writes с репликой: ставка через auctions, сразу затем balance через wallet
+(другая функция, свой пин-стор) — без X-Min-LSN и с ним. Считает устаревшие ответы (включая 404 для ещё не доехавшего пользователя) и куда ушло чтение.
+
+    DATABASE_URL=postgres://primary/... DATABASE_REPLICA_URL=postgres://replica/... \\
+        python benchmarks/replica_check.py --bids 200
+
+Отстающую реплику локально даёт потоковая реплика с recovery_min_apply_delay = '300ms'
+(pg_basebackup -R, см. README).
+"""
+import argparse
+import io
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+from common import connect, create_auction, ensure_users, load_function, make_event, make_token
+
+
+def run(bids: int) -> dict:
+    if not os.environ.get('DATABASE_REPLICA_URL'):
+        raise SystemExit('Нужна DATABASE_REPLICA_URL')
+
+    conn = connect()
+    cur = conn.cursor()
+    user_id = ensure_users(cur, 'replica', 1, 10000000)[0]
+    auction_id = create_auction(cur, 'replica check')
+    conn.commit()
+    conn.close()
+
+    token = make_token(user_id)
+    auctions = load_function('auctions')
+    wallet = load_function('wallet')
+    wallet_replica = sys.modules['replica']
+    result = {}
+
+    for mode in ('without_header', 'with_header'):
+        stale = 0
+        errors = 0
+        with redirect_stdout(io.StringIO()):
+            for _ in range(bids):
+                bid = auctions.handler(make_event('POST', 'bid', body={'auction_id': auction_id}, token=token), None)
+                if bid['statusCode'] != 200:
+                    errors += 1
+                    continue
+                expected = json.loads(bid['body'])['newBalance']
+                headers = {'X-Min-LSN': bid['headers']['X-Min-LSN']} if mode == 'with_header' else {}
+                balance = wallet.handler(make_event('GET', 'balance', token=token, headers=headers), None)
+                if json.loads(balance['body']).get('balance') != expected:
+                    stale += 1
+        result[mode] = {'bids': bids, 'errors': errors, 'stale_reads': stale, 'wallet_reads': dict(wallet_replica.stats)}
+        for key in wallet_replica.stats:
+            wallet_replica.stats[key] = 0
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bids', type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run(args.bids), indent=2))
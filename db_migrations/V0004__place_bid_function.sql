@@ -0,0 +1,71 @@
+-- Atomic bid placement in a single round trip.
+-- Result codes: ok, insufficient_funds, not_found, ended, no_jumper
+CREATE OR REPLACE FUNCTION place_bid(p_auction_id INTEGER, p_user_id INTEGER)
+RETURNS TABLE (result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_balance DECIMAL(10, 2);
+    v_current_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+BEGIN
+    SELECT balance INTO v_balance FROM users WHERE id = p_user_id;
+
+    IF v_balance IS NULL OR v_balance < 50 THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id
+    INTO v_current_price, v_status, v_min_price, v_winner_id
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'not_found'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_status <> 'active' OR v_winner_id IS NOT NULL THEN
+        RETURN QUERY SELECT 'ended'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_current_price >= v_min_price AND NOT EXISTS (
+        SELECT 1 FROM early_participants ep
+        WHERE ep.auction_id = p_auction_id AND ep.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT 'no_jumper'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    UPDATE users SET balance = balance - 50
+    WHERE id = p_user_id AND balance >= 50
+    RETURNING balance INTO v_balance;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    UPDATE auctions
+    SET current_price = current_price + 50, total_bids = total_bids + 1, timer_seconds = 10
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    VALUES (p_auction_id, p_user_id, 50, v_current_price + 50, false);
+
+    IF v_current_price < v_min_price THEN
+        INSERT INTO early_participants (auction_id, user_id)
+        VALUES (p_auction_id, p_user_id)
+        ON CONFLICT (auction_id, user_id) DO NOTHING;
+    END IF;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    VALUES (p_user_id, 'bid', -50, v_balance, 'Auction #' || p_auction_id);
+
+    RETURN QUERY SELECT 'ok'::VARCHAR, v_current_price + 50, v_balance;
+END;
+$$;
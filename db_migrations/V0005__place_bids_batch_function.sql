@@ -0,0 +1,92 @@
+-- Group commit of several bids on one auction, applied in array order.
+-- One auctions update, one bids batch insert; per-bid result codes as in place_bid.
+CREATE OR REPLACE FUNCTION place_bids(p_auction_id INTEGER, p_user_ids INTEGER[])
+RETURNS TABLE (bid_index INTEGER, result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user INTEGER;
+    v_balance DECIMAL(10, 2);
+    v_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_found BOOLEAN;
+    v_bid_users INTEGER[] := '{}';
+    v_bid_prices DECIMAL(10, 2)[] := '{}';
+    v_bid_balances DECIMAL(10, 2)[] := '{}';
+    v_new_early INTEGER[] := '{}';
+BEGIN
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id
+    INTO v_price, v_status, v_min_price, v_winner_id
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+    v_found := FOUND;
+
+    bid_index := 0;
+    FOREACH v_user IN ARRAY p_user_ids LOOP
+        new_price := NULL;
+        new_balance := NULL;
+
+        SELECT balance INTO v_balance FROM users WHERE id = v_user;
+
+        IF v_balance IS NULL OR v_balance < 50 THEN
+            result := 'insufficient_funds';
+        ELSIF NOT v_found THEN
+            result := 'not_found';
+        ELSIF v_status <> 'active' OR v_winner_id IS NOT NULL THEN
+            result := 'ended';
+        ELSIF v_price >= v_min_price
+            AND NOT v_user = ANY(v_new_early)
+            AND NOT EXISTS (
+                SELECT 1 FROM early_participants ep
+                WHERE ep.auction_id = p_auction_id AND ep.user_id = v_user
+            ) THEN
+            result := 'no_jumper';
+        ELSE
+            UPDATE users SET balance = balance - 50
+            WHERE id = v_user AND balance >= 50
+            RETURNING balance INTO v_balance;
+
+            IF NOT FOUND THEN
+                result := 'insufficient_funds';
+            ELSE
+                IF v_price < v_min_price AND NOT v_user = ANY(v_new_early) THEN
+                    v_new_early := v_new_early || v_user;
+                END IF;
+                v_price := v_price + 50;
+                v_bid_users := v_bid_users || v_user;
+                v_bid_prices := v_bid_prices || v_price;
+                v_bid_balances := v_bid_balances || v_balance;
+                result := 'ok';
+                new_price := v_price;
+                new_balance := v_balance;
+            END IF;
+        END IF;
+
+        RETURN NEXT;
+        bid_index := bid_index + 1;
+    END LOOP;
+
+    IF cardinality(v_bid_users) = 0 THEN
+        RETURN;
+    END IF;
+
+    UPDATE auctions
+    SET current_price = v_price, total_bids = total_bids + cardinality(v_bid_users), timer_seconds = 10
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    SELECT p_auction_id, b.user_id, 50, b.price, false
+    FROM unnest(v_bid_users, v_bid_prices) AS b(user_id, price);
+
+    INSERT INTO early_participants (auction_id, user_id)
+    SELECT p_auction_id, e.user_id
+    FROM unnest(v_new_early) AS e(user_id)
+    ON CONFLICT (auction_id, user_id) DO NOTHING;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    SELECT t.user_id, 'bid', -50, t.balance, 'Auction #' || p_auction_id
+    FROM unnest(v_bid_users, v_bid_balances) AS t(user_id, balance);
+END;
+$$;
@@ -0,0 +1,206 @@
+-- Server-side auction deadline. NULL until the first bid starts the clock.
+ALTER TABLE auctions ADD COLUMN ends_at TIMESTAMP;
+
+CREATE INDEX idx_auctions_active_ends_at ON auctions(ends_at) WHERE status = 'active';
+
+-- Every accepted bid moves the deadline to now + 10s; bids after the deadline are rejected
+CREATE OR REPLACE FUNCTION place_bid(p_auction_id INTEGER, p_user_id INTEGER)
+RETURNS TABLE (result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_balance DECIMAL(10, 2);
+    v_current_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_ends_at TIMESTAMP;
+BEGIN
+    SELECT balance INTO v_balance FROM users WHERE id = p_user_id;
+
+    IF v_balance IS NULL OR v_balance < 50 THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id, a.ends_at
+    INTO v_current_price, v_status, v_min_price, v_winner_id, v_ends_at
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'not_found'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_status <> 'active' OR v_winner_id IS NOT NULL
+        OR v_ends_at <= clock_timestamp()::TIMESTAMP THEN
+        RETURN QUERY SELECT 'ended'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_current_price >= v_min_price AND NOT EXISTS (
+        SELECT 1 FROM early_participants ep
+        WHERE ep.auction_id = p_auction_id AND ep.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT 'no_jumper'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    UPDATE users SET balance = balance - 50
+    WHERE id = p_user_id AND balance >= 50
+    RETURNING balance INTO v_balance;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    UPDATE auctions
+    SET current_price = current_price + 50, total_bids = total_bids + 1, timer_seconds = 10,
+        ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    VALUES (p_auction_id, p_user_id, 50, v_current_price + 50, false);
+
+    IF v_current_price < v_min_price THEN
+        INSERT INTO early_participants (auction_id, user_id)
+        VALUES (p_auction_id, p_user_id)
+        ON CONFLICT (auction_id, user_id) DO NOTHING;
+    END IF;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    VALUES (p_user_id, 'bid', -50, v_balance, 'Auction #' || p_auction_id);
+
+    RETURN QUERY SELECT 'ok'::VARCHAR, v_current_price + 50, v_balance;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION place_bids(p_auction_id INTEGER, p_user_ids INTEGER[])
+RETURNS TABLE (bid_index INTEGER, result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user INTEGER;
+    v_balance DECIMAL(10, 2);
+    v_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_ends_at TIMESTAMP;
+    v_found BOOLEAN;
+    v_bid_users INTEGER[] := '{}';
+    v_bid_prices DECIMAL(10, 2)[] := '{}';
+    v_bid_balances DECIMAL(10, 2)[] := '{}';
+    v_new_early INTEGER[] := '{}';
+BEGIN
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id, a.ends_at
+    INTO v_price, v_status, v_min_price, v_winner_id, v_ends_at
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+    v_found := FOUND;
+
+    bid_index := 0;
+    FOREACH v_user IN ARRAY p_user_ids LOOP
+        new_price := NULL;
+        new_balance := NULL;
+
+        SELECT balance INTO v_balance FROM users WHERE id = v_user;
+
+        IF v_balance IS NULL OR v_balance < 50 THEN
+            result := 'insufficient_funds';
+        ELSIF NOT v_found THEN
+            result := 'not_found';
+        ELSIF v_status <> 'active' OR v_winner_id IS NOT NULL
+            OR v_ends_at <= clock_timestamp()::TIMESTAMP THEN
+            result := 'ended';
+        ELSIF v_price >= v_min_price
+            AND NOT v_user = ANY(v_new_early)
+            AND NOT EXISTS (
+                SELECT 1 FROM early_participants ep
+                WHERE ep.auction_id = p_auction_id AND ep.user_id = v_user
+            ) THEN
+            result := 'no_jumper';
+        ELSE
+            UPDATE users SET balance = balance - 50
+            WHERE id = v_user AND balance >= 50
+            RETURNING balance INTO v_balance;
+
+            IF NOT FOUND THEN
+                result := 'insufficient_funds';
+            ELSE
+                IF v_price < v_min_price AND NOT v_user = ANY(v_new_early) THEN
+                    v_new_early := v_new_early || v_user;
+                END IF;
+                v_price := v_price + 50;
+                v_bid_users := v_bid_users || v_user;
+                v_bid_prices := v_bid_prices || v_price;
+                v_bid_balances := v_bid_balances || v_balance;
+                result := 'ok';
+                new_price := v_price;
+                new_balance := v_balance;
+            END IF;
+        END IF;
+
+        RETURN NEXT;
+        bid_index := bid_index + 1;
+    END LOOP;
+
+    IF cardinality(v_bid_users) = 0 THEN
+        RETURN;
+    END IF;
+
+    UPDATE auctions
+    SET current_price = v_price, total_bids = total_bids + cardinality(v_bid_users), timer_seconds = 10,
+        ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    SELECT p_auction_id, b.user_id, 50, b.price, false
+    FROM unnest(v_bid_users, v_bid_prices) AS b(user_id, price);
+
+    INSERT INTO early_participants (auction_id, user_id)
+    SELECT p_auction_id, e.user_id
+    FROM unnest(v_new_early) AS e(user_id)
+    ON CONFLICT (auction_id, user_id) DO NOTHING;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    SELECT t.user_id, 'bid', -50, t.balance, 'Auction #' || p_auction_id
+    FROM unnest(v_bid_users, v_bid_balances) AS t(user_id, balance);
+END;
+$$;
+
+-- Closes the given auctions whose deadline has passed. The winner is the author
+-- of the last bid unless it was a bot. Auctions that are still running are
+-- returned with their current deadline so the timer engine can reschedule them.
+CREATE OR REPLACE FUNCTION close_expired_auctions(p_ids INTEGER[])
+RETURNS TABLE (auction_id INTEGER, closed BOOLEAN, deadline TIMESTAMP)
+LANGUAGE sql
+AS $$
+    WITH closed_auctions AS (
+        UPDATE auctions a
+        SET status = 'ended',
+            timer_seconds = 0,
+            ended_at = clock_timestamp()::TIMESTAMP,
+            winner_id = (
+                SELECT CASE WHEN b.is_bot THEN NULL ELSE b.user_id END
+                FROM bids b
+                WHERE b.auction_id = a.id
+                ORDER BY b.id DESC
+                LIMIT 1
+            )
+        WHERE a.id = ANY(p_ids)
+          AND a.status = 'active'
+          AND a.ends_at <= clock_timestamp()::TIMESTAMP
+        RETURNING a.id
+    )
+    SELECT c.id, true, NULL::TIMESTAMP FROM closed_auctions c
+    UNION ALL
+    SELECT a.id, false, a.ends_at
+    FROM auctions a
+    WHERE a.id = ANY(p_ids)
+      AND a.status = 'active'
+      AND a.ends_at IS NOT NULL
+      AND a.id NOT IN (SELECT c.id FROM closed_auctions c);
+$$;
@@ -0,0 +1,25 @@
+-- Compact price/timer deltas for the live stream (backend/auctions/live.py).
+-- Fired for every path that changes an auction: bids, batched bids, timer closes.
+CREATE OR REPLACE FUNCTION notify_auction_update() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('auction_updates', json_build_object(
+        'id', NEW.id,
+        'currentPrice', NEW.current_price,
+        'totalBids', NEW.total_bids,
+        'timeLeft', CASE WHEN NEW.ends_at IS NULL THEN NEW.timer_seconds
+                         ELSE GREATEST(0, CEIL(EXTRACT(EPOCH FROM NEW.ends_at - clock_timestamp()::TIMESTAMP)))::int END,
+        'status', NEW.status
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_auctions_notify_update
+AFTER UPDATE ON auctions
+FOR EACH ROW
+WHEN (OLD.current_price IS DISTINCT FROM NEW.current_price
+   OR OLD.total_bids IS DISTINCT FROM NEW.total_bids
+   OR OLD.status IS DISTINCT FROM NEW.status)
+EXECUTE FUNCTION notify_auction_update();
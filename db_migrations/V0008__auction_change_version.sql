@@ -0,0 +1,21 @@
+-- Monotonic change counter for conditional and delta responses of action=list.
+-- Every insert and update of an auction (bids, timer closes, admin edits) takes a new version.
+CREATE SEQUENCE auction_change_seq;
+
+ALTER TABLE auctions ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('auction_change_seq');
+
+CREATE INDEX idx_auctions_version ON auctions(version);
+
+CREATE OR REPLACE FUNCTION bump_auction_version() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.version := nextval('auction_change_seq');
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_auctions_bump_version
+BEFORE UPDATE ON auctions
+FOR EACH ROW
+EXECUTE FUNCTION bump_auction_version();
@@ -0,0 +1,3 @@
+-- Keyset pagination: (started_at, id) for auctions list, (created_at, id) for wallet history
+CREATE INDEX idx_auctions_status_started ON auctions(status, started_at DESC, id DESC);
+CREATE INDEX idx_transactions_user_created ON transactions(user_id, created_at DESC, id DESC);
@@ -0,0 +1,24 @@
+-- Indexes shaped after the hot queries; superseded single-column indexes are dropped
+-- so that bid and ledger inserts maintain fewer indexes.
+-- Plan regression check: python benchmarks/explain_check.py
+
+-- list: WHERE status = ? [AND category_id = ?] ORDER BY started_at DESC, id DESC LIMIT ?
+CREATE INDEX idx_auctions_status_category_started ON auctions(status, category_id, started_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_auctions_status;
+DROP INDEX IF EXISTS idx_auctions_category;
+
+-- close_expired_auctions: last bid of an auction; also serves plain auction_id lookups
+CREATE INDEX idx_bids_auction_id ON bids(auction_id, id DESC);
+DROP INDEX IF EXISTS idx_bids_auction;
+
+-- per-user statistics and reconciliation only look at real bids and won auctions
+CREATE INDEX idx_bids_user_human ON bids(user_id) WHERE is_bot = false;
+DROP INDEX IF EXISTS idx_bids_user;
+CREATE INDEX idx_auctions_winner ON auctions(winner_id) WHERE winner_id IS NOT NULL;
+
+-- transactions: WHERE user_id = ? ORDER BY created_at DESC, id DESC is served by idx_transactions_user_created
+DROP INDEX IF EXISTS idx_transactions_user;
+
+-- details: first early participants of an auction in join order
+CREATE INDEX idx_early_participants_auction_joined ON early_participants(auction_id, joined_at);
+DROP INDEX IF EXISTS idx_early_participants_auction;
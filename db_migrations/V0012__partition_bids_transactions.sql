@@ -0,0 +1,242 @@
+-- bids and transactions become partitioned by month of created_at.
+-- Existing rows are not copied: each old table is attached as the "history" partition
+-- (everything before the first monthly partition), which costs one validation scan.
+-- Months ahead are created by ensure_partitions() (python partitions.py, run daily);
+-- rows that arrive before their month exists land in the DEFAULT partition and are moved
+-- into the month partition when it is created.
+-- Bid partitions whose auctions have all ended are folded into bid_archive and dropped
+-- by archive_bid_partition(); the transactions ledger is partitioned but never dropped.
+
+-- ---------------------------------------------------------------- bids
+
+ALTER TABLE bids RENAME TO bids_history;
+ALTER TABLE bids_history RENAME CONSTRAINT bids_pkey TO bids_history_pkey;
+ALTER INDEX idx_bids_auction_id RENAME TO bids_history_auction_id_idx;
+ALTER INDEX idx_bids_user_human RENAME TO bids_history_user_human_idx;
+
+CREATE TABLE bids (
+    id INTEGER NOT NULL DEFAULT nextval('bids_id_seq'),
+    auction_id INTEGER REFERENCES auctions(id),
+    user_id INTEGER REFERENCES users(id),
+    bid_amount DECIMAL(10, 2) DEFAULT 50.00,
+    price_after_bid DECIMAL(10, 2) NOT NULL,
+    is_bot BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- the sequence must outlive the history partition once it is archived
+ALTER SEQUENCE bids_id_seq OWNED BY bids.id;
+
+CREATE INDEX idx_bids_auction_id ON bids(auction_id, id DESC);
+CREATE INDEX idx_bids_user_human ON bids(user_id) WHERE is_bot = false;
+
+CREATE TABLE bids_default PARTITION OF bids DEFAULT;
+
+-- ---------------------------------------------------------------- transactions
+
+ALTER TABLE transactions RENAME TO transactions_history;
+ALTER TABLE transactions_history RENAME CONSTRAINT transactions_pkey TO transactions_history_pkey;
+ALTER INDEX idx_transactions_user_created RENAME TO transactions_history_user_created_idx;
+
+CREATE TABLE transactions (
+    id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+    user_id INTEGER REFERENCES users(id),
+    type VARCHAR(20) NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    balance_after DECIMAL(10, 2) NOT NULL,
+    reference VARCHAR(255),
+    payment_method VARCHAR(50),
+    status VARCHAR(20) DEFAULT 'completed',
+    metadata JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;
+
+CREATE INDEX idx_transactions_user_created ON transactions(user_id, created_at DESC, id DESC);
+
+CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;
+
+-- ---------------------------------------------------------------- helpers
+
+-- Range bounds of every partition; NULL range_from is MINVALUE, both NULL is DEFAULT
+CREATE VIEW time_partitions AS
+SELECT i.inhparent::regclass::TEXT AS parent,
+       c.relname::TEXT AS partition,
+       substring(pg_get_expr(c.relpartbound, c.oid) FROM 'FROM \(''([^'']+)''\)')::TIMESTAMP AS range_from,
+       substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \(''([^'']+)''\)')::TIMESTAMP AS range_to
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent IN ('bids'::regclass, 'transactions'::regclass);
+
+CREATE OR REPLACE FUNCTION create_month_partition(p_table TEXT, p_month DATE)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_from TIMESTAMP := date_trunc('month', p_month);
+    v_to TIMESTAMP := date_trunc('month', p_month) + INTERVAL '1 month';
+    v_name TEXT := p_table || '_p' || to_char(p_month, 'YYYY_MM');
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM time_partitions t
+        WHERE t.parent = p_table
+          AND t.range_to > v_from
+          AND COALESCE(t.range_from, '-infinity') < v_to
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name, p_table);
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (created_at >= %L AND created_at < %L)',
+                   v_name, v_name || '_range', v_from, v_to);
+    EXECUTE format('WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                   'INSERT INTO %I SELECT * FROM moved',
+                   p_table || '_default', v_from, v_to, v_name);
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', p_table, v_name, v_from, v_to);
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', v_name, v_name || '_range');
+    RETURN v_name;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION ensure_partitions(p_table TEXT, p_months_ahead INTEGER DEFAULT 2)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_name TEXT;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        v_name := create_month_partition(p_table, (date_trunc('month', LOCALTIMESTAMP) + make_interval(months => i))::DATE);
+        IF v_name IS NOT NULL THEN
+            RETURN NEXT v_name;
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- ---------------------------------------------------------------- migration of existing rows
+
+-- Old tables cover everything up to the end of the current month (or of the latest row),
+-- monthly partitions start after that.
+DO $$
+DECLARE
+    v_table TEXT;
+    v_bound TIMESTAMP;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['bids', 'transactions'] LOOP
+        EXECUTE format('UPDATE %I SET created_at = %L WHERE created_at IS NULL', v_table || '_history', 'epoch'::TIMESTAMP);
+        EXECUTE format('SELECT date_trunc(''month'', GREATEST(MAX(created_at), LOCALTIMESTAMP)) + INTERVAL ''1 month'' FROM %I',
+                       v_table || '_history') INTO v_bound;
+        -- a validated CHECK lets SET NOT NULL and ATTACH skip their own scans
+        EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (created_at IS NOT NULL AND created_at < %L)',
+                       v_table || '_history', v_table || '_history_range', v_bound);
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at SET NOT NULL', v_table || '_history');
+        EXECUTE format('ALTER TABLE %I ADD UNIQUE (id, created_at)', v_table || '_history');
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (MINVALUE) TO (%L)',
+                       v_table, v_table || '_history', v_bound);
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', v_table || '_history', v_table || '_history_range');
+        PERFORM ensure_partitions(v_table, 2);
+    END LOOP;
+END;
+$$;
+
+-- ---------------------------------------------------------------- archive
+
+-- One row per auction, user and bot flag of an archived bid partition; an auction that
+-- spanned two archived months has two rows, so readers sum them.
+CREATE TABLE bid_archive (
+    auction_id INTEGER,
+    user_id INTEGER,
+    is_bot BOOLEAN NOT NULL,
+    bid_count INTEGER NOT NULL,
+    amount_total DECIMAL(12, 2) NOT NULL,
+    max_price DECIMAL(10, 2) NOT NULL,
+    first_bid_at TIMESTAMP NOT NULL,
+    last_bid_at TIMESTAMP NOT NULL,
+    last_bid_id INTEGER NOT NULL,
+    archived_from VARCHAR(63) NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_bid_archive_auction ON bid_archive(auction_id);
+CREATE INDEX idx_bid_archive_user_human ON bid_archive(user_id) WHERE is_bot = false;
+
+-- Returns the number of summary rows, or NULL if some auction in the partition is not ended yet.
+-- DETACH takes an exclusive lock on bids for a moment: callers set lock_timeout.
+CREATE OR REPLACE FUNCTION archive_bid_partition(p_partition TEXT)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_open BOOLEAN;
+    v_rows INTEGER;
+BEGIN
+    IF p_partition NOT IN (SELECT partition FROM time_partitions WHERE parent = 'bids' AND range_to IS NOT NULL) THEN
+        RAISE EXCEPTION 'Not a bids range partition: %', p_partition;
+    END IF;
+
+    EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I b JOIN auctions a ON a.id = b.auction_id WHERE a.status <> ''ended'')',
+                   p_partition) INTO v_open;
+    IF v_open THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('
+        INSERT INTO bid_archive (auction_id, user_id, is_bot, bid_count, amount_total, max_price,
+                                 first_bid_at, last_bid_at, last_bid_id, archived_from)
+        SELECT auction_id, user_id, COALESCE(is_bot, false), COUNT(*), COALESCE(SUM(bid_amount), 0),
+               MAX(price_after_bid), MIN(created_at), MAX(created_at), MAX(id), %L
+        FROM %I
+        GROUP BY auction_id, user_id, COALESCE(is_bot, false)', p_partition, p_partition);
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+    EXECUTE format('ALTER TABLE bids DETACH PARTITION %I', p_partition);
+    EXECUTE format('DROP TABLE %I', p_partition);
+    RETURN v_rows;
+END;
+$$;
+
+-- ---------------------------------------------------------------- close_expired_auctions
+
+-- The last bid is placed at most 10 seconds before ends_at, so a lower bound on created_at
+-- lets the lookup prune to the newest partitions instead of probing every month.
+CREATE OR REPLACE FUNCTION close_expired_auctions(p_ids INTEGER[])
+RETURNS TABLE (auction_id INTEGER, closed BOOLEAN, deadline TIMESTAMP)
+LANGUAGE sql
+AS $$
+    WITH closed_auctions AS (
+        UPDATE auctions a
+        SET status = 'ended',
+            timer_seconds = 0,
+            ended_at = clock_timestamp()::TIMESTAMP,
+            winner_id = (
+                SELECT CASE WHEN b.is_bot THEN NULL ELSE b.user_id END
+                FROM bids b
+                WHERE b.auction_id = a.id
+                  AND b.created_at >= a.ends_at - INTERVAL '1 hour'
+                ORDER BY b.id DESC
+                LIMIT 1
+            )
+        WHERE a.id = ANY(p_ids)
+          AND a.status = 'active'
+          AND a.ends_at <= clock_timestamp()::TIMESTAMP
+        RETURNING a.id, a.winner_id
+    ),
+    counted_wins AS (
+        UPDATE users u
+        SET total_wins = u.total_wins + 1
+        FROM closed_auctions c
+        WHERE u.id = c.winner_id
+    )
+    SELECT c.id, true, NULL::TIMESTAMP FROM closed_auctions c
+    UNION ALL
+    SELECT a.id, false, a.ends_at
+    FROM auctions a
+    WHERE a.id = ANY(p_ids)
+      AND a.status = 'active'
+      AND a.ends_at IS NOT NULL
+      AND a.id NOT IN (SELECT c.id FROM closed_auctions c);
+$$;
@@ -0,0 +1,132 @@
+-- CloudPayments notifications are applied at most once per TransactionId.
+-- The primary key is the idempotency guarantee: a retried notification either finds its row
+-- (duplicate, no user lock taken) or waits for the concurrent first delivery to commit.
+-- status: queued (CALLBACK_QUEUE=1, not applied yet), applied, rejected (unknown user).
+
+CREATE TABLE payment_callbacks (
+    transaction_id BIGINT PRIMARY KEY,
+    user_id INTEGER,
+    amount DECIMAL(10, 2) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    applied_at TIMESTAMP
+);
+
+CREATE INDEX idx_payment_callbacks_queued ON payment_callbacks(received_at) WHERE status = 'queued';
+
+-- Synchronous mode: one notification, one statement per table
+CREATE OR REPLACE FUNCTION apply_topup(p_transaction_id BIGINT, p_user_id INTEGER, p_amount DECIMAL)
+RETURNS TABLE (result VARCHAR, new_balance DECIMAL)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_status VARCHAR;
+    v_balance DECIMAL;
+BEGIN
+    INSERT INTO payment_callbacks (transaction_id, user_id, amount, status, applied_at)
+    VALUES (p_transaction_id, p_user_id, p_amount, 'applied', clock_timestamp())
+    ON CONFLICT (transaction_id) DO NOTHING;
+
+    IF NOT FOUND THEN
+        SELECT pc.status INTO v_status FROM payment_callbacks pc WHERE pc.transaction_id = p_transaction_id;
+        RETURN QUERY SELECT (CASE WHEN v_status = 'rejected' THEN 'rejected' ELSE 'duplicate' END)::VARCHAR, NULL::DECIMAL;
+        RETURN;
+    END IF;
+
+    UPDATE users
+    SET balance = balance + p_amount,
+        total_deposit = total_deposit + p_amount,
+        loyalty_level = CASE
+            WHEN total_deposit + p_amount >= 150000 THEN 'Monarch'
+            WHEN total_deposit + p_amount >= 50000 THEN 'Noble'
+            ELSE 'Hero'
+        END
+    WHERE id = p_user_id
+    RETURNING balance INTO v_balance;
+
+    IF NOT FOUND THEN
+        UPDATE payment_callbacks SET status = 'rejected' WHERE transaction_id = p_transaction_id;
+        RETURN QUERY SELECT 'rejected'::VARCHAR, NULL::DECIMAL;
+        RETURN;
+    END IF;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference, payment_method, status)
+    VALUES (p_user_id, 'topup', p_amount, v_balance, p_transaction_id::TEXT, 'cloudpayments', 'completed');
+
+    RETURN QUERY SELECT 'applied'::VARCHAR, v_balance;
+END;
+$$;
+
+-- Queued mode: applies up to p_limit queued notifications, one users UPDATE per user.
+-- Concurrent workers take disjoint batches (SKIP LOCKED); users are locked in id order.
+CREATE OR REPLACE FUNCTION apply_queued_callbacks(p_limit INTEGER)
+RETURNS TABLE (applied_count INTEGER, rejected_count INTEGER, user_count INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ids BIGINT[];
+BEGIN
+    SELECT array_agg(q.transaction_id) INTO v_ids
+    FROM (
+        SELECT pc.transaction_id FROM payment_callbacks pc
+        WHERE pc.status = 'queued'
+        ORDER BY pc.received_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ) q;
+
+    IF v_ids IS NULL THEN
+        RETURN QUERY SELECT 0, 0, 0;
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM users u
+    WHERE u.id IN (SELECT pc.user_id FROM payment_callbacks pc WHERE pc.transaction_id = ANY(v_ids))
+    ORDER BY u.id
+    FOR UPDATE;
+
+    RETURN QUERY
+    WITH batch AS (
+        SELECT pc.transaction_id, pc.user_id, pc.amount,
+               SUM(pc.amount) OVER (PARTITION BY pc.user_id ORDER BY pc.received_at, pc.transaction_id) AS running
+        FROM payment_callbacks pc
+        WHERE pc.transaction_id = ANY(v_ids)
+    ),
+    totals AS (
+        SELECT b.user_id, SUM(b.amount) AS total FROM batch b GROUP BY b.user_id
+    ),
+    credited AS (
+        UPDATE users u
+        SET balance = u.balance + t.total,
+            total_deposit = u.total_deposit + t.total,
+            loyalty_level = CASE
+                WHEN u.total_deposit + t.total >= 150000 THEN 'Monarch'
+                WHEN u.total_deposit + t.total >= 50000 THEN 'Noble'
+                ELSE 'Hero'
+            END
+        FROM totals t
+        WHERE u.id = t.user_id
+        RETURNING u.id, u.balance - t.total AS balance_before
+    ),
+    ledger AS (
+        INSERT INTO transactions (user_id, type, amount, balance_after, reference, payment_method, status)
+        SELECT b.user_id, 'topup', b.amount, c.balance_before + b.running, b.transaction_id::TEXT,
+               'cloudpayments', 'completed'
+        FROM batch b
+        JOIN credited c ON c.id = b.user_id
+    ),
+    marked AS (
+        UPDATE payment_callbacks pc
+        SET status = CASE WHEN c.id IS NULL THEN 'rejected' ELSE 'applied' END,
+            applied_at = clock_timestamp()::TIMESTAMP
+        FROM batch b
+        LEFT JOIN credited c ON c.id = b.user_id
+        WHERE pc.transaction_id = b.transaction_id
+    )
+    SELECT (COUNT(*) FILTER (WHERE c.id IS NOT NULL))::INTEGER,
+           (COUNT(*) FILTER (WHERE c.id IS NULL))::INTEGER,
+           (COUNT(DISTINCT c.id))::INTEGER
+    FROM batch b
+    LEFT JOIN credited c ON c.id = b.user_id;
+END;
+$$;
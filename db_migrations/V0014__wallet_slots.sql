@@ -0,0 +1,435 @@
+-- Wallet debits without a hot users row.
+-- A user's spendable balance is users.balance plus the credit held in wallet_slots.
+-- A bid debits slot auction_id % 8 of its user, so concurrent bids of one user on different
+-- auctions lock different rows. Only a slot that runs dry locks users, to move the next
+-- block (at least 500) into it; if the free balance is short, every slot of the user is swept
+-- back first. Money only moves between rows under row locks and a debit requires
+-- credit >= amount, so the total can never go negative.
+-- Bid counts follow the same path: users.total_bids + wallet_slots.bids.
+-- Readers use wallet_balances; compact_wallet_slots() folds idle slots back into users.
+
+CREATE TABLE wallet_slots (
+    user_id INTEGER REFERENCES users(id),
+    slot SMALLINT,
+    credit DECIMAL(10, 2) NOT NULL DEFAULT 0 CHECK (credit >= 0),
+    bids INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, slot)
+);
+
+CREATE INDEX idx_wallet_slots_updated ON wallet_slots(updated_at);
+
+CREATE VIEW wallet_balances AS
+SELECT u.id AS user_id,
+       u.balance + COALESCE(s.credit, 0) AS balance,
+       u.total_bids + COALESCE(s.bids, 0) AS total_bids
+FROM users u
+LEFT JOIN LATERAL (
+    SELECT SUM(ws.credit) AS credit, SUM(ws.bids) AS bids
+    FROM wallet_slots ws WHERE ws.user_id = u.id
+) s ON true;
+
+-- Debits p_amount from the user's slot; returns the spendable balance after the debit
+-- or NULL if the user cannot afford it.
+CREATE OR REPLACE FUNCTION wallet_debit(p_user_id INTEGER, p_slot INTEGER, p_amount DECIMAL, p_block DECIMAL DEFAULT 500)
+RETURNS DECIMAL
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_free DECIMAL(10, 2);
+    v_swept DECIMAL(10, 2);
+    v_move DECIMAL(10, 2);
+    v_debited BOOLEAN;
+BEGIN
+    BEGIN
+        UPDATE wallet_slots
+        SET credit = credit - p_amount, bids = bids + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = p_user_id AND slot = p_slot AND credit >= p_amount;
+        IF NOT FOUND THEN
+            RAISE no_data_found;
+        END IF;
+        v_debited := true;
+    EXCEPTION WHEN no_data_found THEN
+        -- an UPDATE that lost a race keeps the slot row locked even though it changed
+        -- nothing; rolling the block back releases it before users is locked below,
+        -- so a transaction never waits for users while holding a slot
+        v_debited := false;
+    END;
+
+    IF NOT v_debited THEN
+        SELECT balance INTO v_free FROM users WHERE id = p_user_id FOR NO KEY UPDATE;
+
+        IF v_free IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        IF v_free < p_amount THEN
+            SELECT COALESCE(SUM(ws.credit), 0) INTO v_swept
+            FROM (SELECT credit FROM wallet_slots WHERE user_id = p_user_id FOR UPDATE) ws;
+            UPDATE wallet_slots SET credit = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = p_user_id AND credit > 0;
+            v_free := v_free + v_swept;
+        END IF;
+
+        IF v_free < p_amount THEN
+            UPDATE users SET balance = v_free WHERE id = p_user_id;
+            RETURN NULL;
+        END IF;
+
+        -- rich users get bigger blocks: fewer refills, and the rest still covers the other slots
+        v_move := LEAST(v_free, GREATEST(p_block, p_amount, round(v_free / 16, 2)));
+        UPDATE users SET balance = v_free - v_move WHERE id = p_user_id;
+
+        INSERT INTO wallet_slots (user_id, slot, credit, bids)
+        VALUES (p_user_id, p_slot, v_move - p_amount, 1)
+        ON CONFLICT (user_id, slot) DO UPDATE
+        SET credit = wallet_slots.credit + EXCLUDED.credit, bids = wallet_slots.bids + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN (SELECT w.balance FROM wallet_balances w WHERE w.user_id = p_user_id);
+END;
+$$;
+
+-- Folds slots untouched for p_idle back into users; returns the number of slots folded.
+-- Users are locked before their slots, in the same order as wallet_debit.
+CREATE OR REPLACE FUNCTION compact_wallet_slots(p_idle INTERVAL, p_limit INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_users INTEGER[];
+    v_slots INTEGER;
+BEGIN
+    SELECT array_agg(l.id) INTO v_users
+    FROM (
+        SELECT u.id FROM users u
+        WHERE u.id IN (
+            SELECT s.user_id FROM wallet_slots s
+            WHERE s.updated_at < LOCALTIMESTAMP - p_idle
+            LIMIT p_limit
+        )
+        ORDER BY u.id
+        FOR NO KEY UPDATE SKIP LOCKED
+    ) l;
+
+    IF v_users IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    WITH folded AS (
+        DELETE FROM wallet_slots s
+        WHERE s.user_id = ANY(v_users) AND s.updated_at < LOCALTIMESTAMP - p_idle
+        RETURNING s.user_id, s.credit, s.bids
+    ),
+    per_user AS (
+        SELECT f.user_id, SUM(f.credit) AS credit, SUM(f.bids) AS bids, COUNT(*) AS slots
+        FROM folded f GROUP BY f.user_id
+    ),
+    credited AS (
+        UPDATE users u
+        SET balance = u.balance + p.credit, total_bids = u.total_bids + p.bids
+        FROM per_user p
+        WHERE u.id = p.user_id
+    )
+    SELECT COALESCE(SUM(p.slots), 0) INTO v_slots FROM per_user p;
+
+    RETURN v_slots;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION place_bid(p_auction_id INTEGER, p_user_id INTEGER)
+RETURNS TABLE (result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_balance DECIMAL(10, 2);
+    v_current_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_ends_at TIMESTAMP;
+    v_new_bidders INTEGER;
+BEGIN
+    SELECT w.balance INTO v_balance FROM wallet_balances w WHERE w.user_id = p_user_id;
+
+    IF v_balance IS NULL OR v_balance < 50 THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id, a.ends_at
+    INTO v_current_price, v_status, v_min_price, v_winner_id, v_ends_at
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'not_found'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_status <> 'active' OR v_winner_id IS NOT NULL
+        OR v_ends_at <= clock_timestamp()::TIMESTAMP THEN
+        RETURN QUERY SELECT 'ended'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_current_price >= v_min_price AND NOT EXISTS (
+        SELECT 1 FROM early_participants ep
+        WHERE ep.auction_id = p_auction_id AND ep.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT 'no_jumper'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    v_balance := wallet_debit(p_user_id, p_auction_id % 8, 50);
+
+    IF v_balance IS NULL THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    INSERT INTO auction_bidders (auction_id, user_id)
+    VALUES (p_auction_id, p_user_id)
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_new_bidders = ROW_COUNT;
+
+    UPDATE auctions
+    SET current_price = current_price + 50, total_bids = total_bids + 1, timer_seconds = 10,
+        unique_bidders = unique_bidders + v_new_bidders,
+        ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    VALUES (p_auction_id, p_user_id, 50, v_current_price + 50, false);
+
+    IF v_current_price < v_min_price THEN
+        INSERT INTO early_participants (auction_id, user_id)
+        VALUES (p_auction_id, p_user_id)
+        ON CONFLICT (auction_id, user_id) DO NOTHING;
+    END IF;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    VALUES (p_user_id, 'bid', -50, v_balance, 'Auction #' || p_auction_id);
+
+    RETURN QUERY SELECT 'ok'::VARCHAR, v_current_price + 50, v_balance;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION place_bids(p_auction_id INTEGER, p_user_ids INTEGER[])
+RETURNS TABLE (bid_index INTEGER, result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user INTEGER;
+    v_balance DECIMAL(10, 2);
+    v_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_ends_at TIMESTAMP;
+    v_found BOOLEAN;
+    v_new_bidders INTEGER;
+    v_bid_users INTEGER[] := '{}';
+    v_bid_prices DECIMAL(10, 2)[] := '{}';
+    v_bid_balances DECIMAL(10, 2)[] := '{}';
+    v_new_early INTEGER[] := '{}';
+BEGIN
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id, a.ends_at
+    INTO v_price, v_status, v_min_price, v_winner_id, v_ends_at
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+    v_found := FOUND;
+
+    bid_index := 0;
+    FOREACH v_user IN ARRAY p_user_ids LOOP
+        new_price := NULL;
+        new_balance := NULL;
+
+        SELECT w.balance INTO v_balance FROM wallet_balances w WHERE w.user_id = v_user;
+
+        IF v_balance IS NULL OR v_balance < 50 THEN
+            result := 'insufficient_funds';
+        ELSIF NOT v_found THEN
+            result := 'not_found';
+        ELSIF v_status <> 'active' OR v_winner_id IS NOT NULL
+            OR v_ends_at <= clock_timestamp()::TIMESTAMP THEN
+            result := 'ended';
+        ELSIF v_price >= v_min_price
+            AND NOT v_user = ANY(v_new_early)
+            AND NOT EXISTS (
+                SELECT 1 FROM early_participants ep
+                WHERE ep.auction_id = p_auction_id AND ep.user_id = v_user
+            ) THEN
+            result := 'no_jumper';
+        ELSE
+            v_balance := wallet_debit(v_user, p_auction_id % 8, 50);
+
+            IF v_balance IS NULL THEN
+                result := 'insufficient_funds';
+            ELSE
+                IF v_price < v_min_price AND NOT v_user = ANY(v_new_early) THEN
+                    v_new_early := v_new_early || v_user;
+                END IF;
+                v_price := v_price + 50;
+                v_bid_users := v_bid_users || v_user;
+                v_bid_prices := v_bid_prices || v_price;
+                v_bid_balances := v_bid_balances || v_balance;
+                result := 'ok';
+                new_price := v_price;
+                new_balance := v_balance;
+            END IF;
+        END IF;
+
+        RETURN NEXT;
+        bid_index := bid_index + 1;
+    END LOOP;
+
+    IF cardinality(v_bid_users) = 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO auction_bidders (auction_id, user_id)
+    SELECT DISTINCT p_auction_id, b.user_id
+    FROM unnest(v_bid_users) AS b(user_id)
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_new_bidders = ROW_COUNT;
+
+    UPDATE auctions
+    SET current_price = v_price, total_bids = total_bids + cardinality(v_bid_users), timer_seconds = 10,
+        unique_bidders = unique_bidders + v_new_bidders,
+        ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    SELECT p_auction_id, b.user_id, 50, b.price, false
+    FROM unnest(v_bid_users, v_bid_prices) AS b(user_id, price);
+
+    INSERT INTO early_participants (auction_id, user_id)
+    SELECT p_auction_id, e.user_id
+    FROM unnest(v_new_early) AS e(user_id)
+    ON CONFLICT (auction_id, user_id) DO NOTHING;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    SELECT t.user_id, 'bid', -50, t.balance, 'Auction #' || p_auction_id
+    FROM unnest(v_bid_users, v_bid_balances) AS t(user_id, balance);
+END;
+$$;
+
+
+-- Top-ups still credit users.balance; balance_after and the returned balance include slot credit
+CREATE OR REPLACE FUNCTION apply_topup(p_transaction_id BIGINT, p_user_id INTEGER, p_amount DECIMAL)
+RETURNS TABLE (result VARCHAR, new_balance DECIMAL)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_status VARCHAR;
+    v_balance DECIMAL;
+BEGIN
+    INSERT INTO payment_callbacks (transaction_id, user_id, amount, status, applied_at)
+    VALUES (p_transaction_id, p_user_id, p_amount, 'applied', clock_timestamp())
+    ON CONFLICT (transaction_id) DO NOTHING;
+
+    IF NOT FOUND THEN
+        SELECT pc.status INTO v_status FROM payment_callbacks pc WHERE pc.transaction_id = p_transaction_id;
+        RETURN QUERY SELECT (CASE WHEN v_status = 'rejected' THEN 'rejected' ELSE 'duplicate' END)::VARCHAR, NULL::DECIMAL;
+        RETURN;
+    END IF;
+
+    UPDATE users
+    SET balance = balance + p_amount,
+        total_deposit = total_deposit + p_amount,
+        loyalty_level = CASE
+            WHEN total_deposit + p_amount >= 150000 THEN 'Monarch'
+            WHEN total_deposit + p_amount >= 50000 THEN 'Noble'
+            ELSE 'Hero'
+        END
+    WHERE id = p_user_id
+    RETURNING balance + (SELECT COALESCE(SUM(s.credit), 0) FROM wallet_slots s WHERE s.user_id = p_user_id)
+    INTO v_balance;
+
+    IF NOT FOUND THEN
+        UPDATE payment_callbacks SET status = 'rejected' WHERE transaction_id = p_transaction_id;
+        RETURN QUERY SELECT 'rejected'::VARCHAR, NULL::DECIMAL;
+        RETURN;
+    END IF;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference, payment_method, status)
+    VALUES (p_user_id, 'topup', p_amount, v_balance, p_transaction_id::TEXT, 'cloudpayments', 'completed');
+
+    RETURN QUERY SELECT 'applied'::VARCHAR, v_balance;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION apply_queued_callbacks(p_limit INTEGER)
+RETURNS TABLE (applied_count INTEGER, rejected_count INTEGER, user_count INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ids BIGINT[];
+BEGIN
+    SELECT array_agg(q.transaction_id) INTO v_ids
+    FROM (
+        SELECT pc.transaction_id FROM payment_callbacks pc
+        WHERE pc.status = 'queued'
+        ORDER BY pc.received_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ) q;
+
+    IF v_ids IS NULL THEN
+        RETURN QUERY SELECT 0, 0, 0;
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM users u
+    WHERE u.id IN (SELECT pc.user_id FROM payment_callbacks pc WHERE pc.transaction_id = ANY(v_ids))
+    ORDER BY u.id
+    FOR UPDATE;
+
+    RETURN QUERY
+    WITH batch AS (
+        SELECT pc.transaction_id, pc.user_id, pc.amount,
+               SUM(pc.amount) OVER (PARTITION BY pc.user_id ORDER BY pc.received_at, pc.transaction_id) AS running
+        FROM payment_callbacks pc
+        WHERE pc.transaction_id = ANY(v_ids)
+    ),
+    totals AS (
+        SELECT b.user_id, SUM(b.amount) AS total FROM batch b GROUP BY b.user_id
+    ),
+    credited AS (
+        UPDATE users u
+        SET balance = u.balance + t.total,
+            total_deposit = u.total_deposit + t.total,
+            loyalty_level = CASE
+                WHEN u.total_deposit + t.total >= 150000 THEN 'Monarch'
+                WHEN u.total_deposit + t.total >= 50000 THEN 'Noble'
+                ELSE 'Hero'
+            END
+        FROM totals t
+        WHERE u.id = t.user_id
+        RETURNING u.id, u.balance - t.total
+                  + (SELECT COALESCE(SUM(s.credit), 0) FROM wallet_slots s WHERE s.user_id = u.id) AS balance_before
+    ),
+    ledger AS (
+        INSERT INTO transactions (user_id, type, amount, balance_after, reference, payment_method, status)
+        SELECT b.user_id, 'topup', b.amount, c.balance_before + b.running, b.transaction_id::TEXT,
+               'cloudpayments', 'completed'
+        FROM batch b
+        JOIN credited c ON c.id = b.user_id
+    ),
+    marked AS (
+        UPDATE payment_callbacks pc
+        SET status = CASE WHEN c.id IS NULL THEN 'rejected' ELSE 'applied' END,
+            applied_at = clock_timestamp()::TIMESTAMP
+        FROM batch b
+        LEFT JOIN credited c ON c.id = b.user_id
+        WHERE pc.transaction_id = b.transaction_id
+    )
+    SELECT (COUNT(*) FILTER (WHERE c.id IS NOT NULL))::INTEGER,
+           (COUNT(*) FILTER (WHERE c.id IS NULL))::INTEGER,
+           (COUNT(DISTINCT c.id))::INTEGER
+    FROM batch b
+    LEFT JOIN credited c ON c.id = b.user_id;
+END;
+$$;
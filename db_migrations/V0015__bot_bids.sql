@@ -0,0 +1,47 @@
+-- Bot bids keep a running auction alive while its price is below bot_threshold.
+-- A bot bid is an ordinary +50 step with is_bot = true and no user: no wallet debit, no
+-- auction_bidders row, bot_bids_count instead of a bidder. Auctions whose clock has not been
+-- started by a real bid (ends_at IS NULL) are left alone.
+
+-- Partial index for the engine's scan: only auctions that can still receive bot bids.
+CREATE INDEX idx_auctions_bot_due ON auctions(ends_at)
+WHERE status = 'active' AND winner_id IS NULL AND current_price < bot_threshold;
+
+-- One bot bid on each of up to p_limit auctions whose deadline is within p_before.
+-- SKIP LOCKED: an auction a real bid is holding is skipped, the bot never waits for users,
+-- and concurrent engines take disjoint batches. Returns the number of bids placed.
+CREATE OR REPLACE FUNCTION place_bot_bids(p_before INTERVAL, p_limit INTEGER)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    WITH due AS (
+        SELECT a.id
+        FROM auctions a
+        WHERE a.status = 'active'
+          AND a.winner_id IS NULL
+          AND a.current_price < a.bot_threshold
+          AND a.ends_at > clock_timestamp()::TIMESTAMP
+          AND a.ends_at <= clock_timestamp()::TIMESTAMP + p_before
+        ORDER BY a.ends_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    bumped AS (
+        UPDATE auctions a
+        SET current_price = a.current_price + 50,
+            total_bids = a.total_bids + 1,
+            bot_bids_count = a.bot_bids_count + 1,
+            timer_seconds = 10,
+            ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+        FROM due
+        WHERE a.id = due.id
+        RETURNING a.id, a.current_price
+    ),
+    placed AS (
+        INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+        SELECT b.id, NULL, 50, b.current_price, true
+        FROM bumped b
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM placed;
+$$;
@@ -0,0 +1,97 @@
+-- Settlement of ended auctions: the winner's order, badges earned by the participants and
+-- notifications, applied in batches by backend/auctions/settlement.py.
+-- settled_at is set in the same statement that writes the results, so a batch is either fully
+-- settled or not at all and a restarted worker simply picks it up again.
+
+ALTER TABLE auctions ADD COLUMN settled_at TIMESTAMP;
+
+-- Auctions that ended before settlement existed are not settled retroactively
+UPDATE auctions SET settled_at = COALESCE(ended_at, CURRENT_TIMESTAMP) WHERE status = 'ended';
+
+CREATE INDEX idx_auctions_unsettled ON auctions(ended_at) WHERE status = 'ended' AND settled_at IS NULL;
+
+-- One order per auction
+CREATE UNIQUE INDEX idx_orders_auction ON orders(auction_id);
+
+-- Settles up to p_limit ended auctions in one set-based statement.
+-- Badges are checked only for the participants of the batch, against the counters maintained
+-- by the bid path (wallet_balances.total_bids, users.total_wins, users.total_deposit), and
+-- only for badges they do not hold yet.
+-- Concurrent workers take disjoint batches (SKIP LOCKED).
+CREATE OR REPLACE FUNCTION settle_auctions(p_limit INTEGER)
+RETURNS TABLE (auctions_settled INTEGER, orders_created INTEGER, badges_awarded INTEGER, notifications_sent INTEGER)
+LANGUAGE sql
+AS $$
+    WITH batch AS (
+        SELECT a.id, a.title, a.winner_id, a.current_price
+        FROM auctions a
+        WHERE a.status = 'ended' AND a.settled_at IS NULL
+        ORDER BY a.ended_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    settled AS (
+        UPDATE auctions a
+        SET settled_at = clock_timestamp()::TIMESTAMP
+        FROM batch b
+        WHERE a.id = b.id
+        RETURNING a.id
+    ),
+    ordered AS (
+        INSERT INTO orders (auction_id, user_id, final_price)
+        SELECT b.id, b.winner_id, b.current_price
+        FROM batch b
+        WHERE b.winner_id IS NOT NULL
+        ON CONFLICT (auction_id) DO NOTHING
+        RETURNING auction_id
+    ),
+    participants AS (
+        SELECT ab.auction_id, ab.user_id
+        FROM auction_bidders ab
+        JOIN batch b ON b.id = ab.auction_id
+    ),
+    stats AS (
+        SELECT w.user_id, w.total_bids, u.total_wins, u.total_deposit
+        FROM (SELECT DISTINCT p.user_id FROM participants p) p
+        JOIN users u ON u.id = p.user_id
+        JOIN wallet_balances w ON w.user_id = p.user_id
+    ),
+    earned AS (
+        INSERT INTO user_badges (user_id, badge_id)
+        SELECT s.user_id, bg.id
+        FROM stats s
+        JOIN badges bg ON CASE bg.requirement_type
+                WHEN 'bid' THEN s.total_bids
+                WHEN 'win' THEN s.total_wins
+                WHEN 'deposit' THEN s.total_deposit
+                WHEN 'loyalty' THEN s.total_deposit
+            END >= bg.requirement_value
+        WHERE NOT EXISTS (
+            SELECT 1 FROM user_badges ub WHERE ub.user_id = s.user_id AND ub.badge_id = bg.id
+        )
+        ON CONFLICT (user_id, badge_id) DO NOTHING
+        RETURNING user_id, badge_id
+    ),
+    notified AS (
+        INSERT INTO notifications (user_id, type, title, message)
+        SELECT b.winner_id, 'auction_won', 'Вы выиграли аукцион',
+               b.title || ' — ' || b.current_price || ' ₸. Заказ оформлен, ждите доставку.'
+        FROM batch b
+        WHERE b.winner_id IS NOT NULL
+        UNION ALL
+        SELECT p.user_id, 'auction_lost', 'Аукцион завершён',
+               b.title || ' — победил другой участник.'
+        FROM participants p
+        JOIN batch b ON b.id = p.auction_id
+        WHERE p.user_id IS DISTINCT FROM b.winner_id
+        UNION ALL
+        SELECT e.user_id, 'badge', 'Новый значок: ' || bg.name, bg.description
+        FROM earned e
+        JOIN badges bg ON bg.id = e.badge_id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM settled)::INTEGER,
+           (SELECT COUNT(*) FROM ordered)::INTEGER,
+           (SELECT COUNT(*) FROM earned)::INTEGER,
+           (SELECT COUNT(*) FROM notified)::INTEGER;
+$$;
@@ -0,0 +1,340 @@
+-- Outbid notifications, fanned out asynchronously.
+-- A bid only appends one row per accepted bid to outbid_events (no indexes besides the key,
+-- no foreign keys) and remembers its bidder in auctions.leader_id, which is free because the
+-- auction row is updated anyway. backend/auctions/outbid.py drains the queue in batches:
+-- the previous leader and the early participants of every auction in the batch are notified
+-- once per batch, and not again while their outbid notification for that auction is unread.
+-- leader_id follows real bids only; bot bids leave it unchanged.
+
+ALTER TABLE auctions ADD COLUMN leader_id INTEGER;
+
+UPDATE auctions a
+SET leader_id = (
+    SELECT b.user_id FROM bids b
+    WHERE b.auction_id = a.id AND b.is_bot = false
+    ORDER BY b.id DESC
+    LIMIT 1
+)
+WHERE a.status = 'active';
+
+CREATE TABLE outbid_events (
+    id BIGSERIAL PRIMARY KEY,
+    auction_id INTEGER NOT NULL,
+    bidder_id INTEGER NOT NULL,
+    prev_leader_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE notifications ADD COLUMN auction_id INTEGER;
+
+-- At most one unread outbid notification per user and auction
+CREATE UNIQUE INDEX idx_notifications_outbid_unread ON notifications(user_id, auction_id)
+WHERE type = 'outbid' AND is_read = false;
+
+-- Unread counts per user, kept by statement-level triggers on notifications so that bulk
+-- inserts from settlement and fan-out update each user's counter once per statement.
+CREATE TABLE notification_counters (
+    user_id INTEGER PRIMARY KEY,
+    unread INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO notification_counters (user_id, unread)
+SELECT user_id, COUNT(*) FROM notifications
+WHERE is_read = false AND user_id IS NOT NULL
+GROUP BY user_id;
+
+CREATE OR REPLACE FUNCTION count_unread_notifications() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO notification_counters (user_id, unread)
+        SELECT n.user_id, COUNT(*) FROM new_rows n
+        WHERE n.is_read = false AND n.user_id IS NOT NULL
+        GROUP BY n.user_id
+        ORDER BY n.user_id
+        ON CONFLICT (user_id) DO UPDATE SET unread = notification_counters.unread + EXCLUDED.unread;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO notification_counters (user_id, unread)
+        SELECT d.user_id, SUM(d.delta) FROM (
+            SELECT o.user_id, -1 AS delta FROM old_rows o WHERE o.is_read = false
+            UNION ALL
+            SELECT n.user_id, 1 FROM new_rows n WHERE n.is_read = false
+        ) d
+        WHERE d.user_id IS NOT NULL
+        GROUP BY d.user_id
+        HAVING SUM(d.delta) <> 0
+        ORDER BY d.user_id
+        ON CONFLICT (user_id) DO UPDATE SET unread = notification_counters.unread + EXCLUDED.unread;
+    ELSE
+        UPDATE notification_counters c
+        SET unread = c.unread - d.cnt
+        FROM (
+            SELECT o.user_id, COUNT(*) AS cnt FROM old_rows o
+            WHERE o.is_read = false AND o.user_id IS NOT NULL
+            GROUP BY o.user_id
+        ) d
+        WHERE c.user_id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_notifications_count_insert
+AFTER INSERT ON notifications
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION count_unread_notifications();
+
+CREATE TRIGGER trg_notifications_count_update
+AFTER UPDATE ON notifications
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION count_unread_notifications();
+
+CREATE TRIGGER trg_notifications_count_delete
+AFTER DELETE ON notifications
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION count_unread_notifications();
+
+-- Bids remember their bidder as the leader and queue one outbid event each
+CREATE OR REPLACE FUNCTION place_bid(p_auction_id INTEGER, p_user_id INTEGER)
+RETURNS TABLE (result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_balance DECIMAL(10, 2);
+    v_current_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_ends_at TIMESTAMP;
+    v_leader_id INTEGER;
+    v_new_bidders INTEGER;
+BEGIN
+    SELECT w.balance INTO v_balance FROM wallet_balances w WHERE w.user_id = p_user_id;
+
+    IF v_balance IS NULL OR v_balance < 50 THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id, a.ends_at, a.leader_id
+    INTO v_current_price, v_status, v_min_price, v_winner_id, v_ends_at, v_leader_id
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'not_found'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_status <> 'active' OR v_winner_id IS NOT NULL
+        OR v_ends_at <= clock_timestamp()::TIMESTAMP THEN
+        RETURN QUERY SELECT 'ended'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    IF v_current_price >= v_min_price AND NOT EXISTS (
+        SELECT 1 FROM early_participants ep
+        WHERE ep.auction_id = p_auction_id AND ep.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT 'no_jumper'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    v_balance := wallet_debit(p_user_id, p_auction_id % 8, 50);
+
+    IF v_balance IS NULL THEN
+        RETURN QUERY SELECT 'insufficient_funds'::VARCHAR, NULL::DECIMAL(10, 2), NULL::DECIMAL(10, 2);
+        RETURN;
+    END IF;
+
+    INSERT INTO auction_bidders (auction_id, user_id)
+    VALUES (p_auction_id, p_user_id)
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_new_bidders = ROW_COUNT;
+
+    UPDATE auctions
+    SET current_price = current_price + 50, total_bids = total_bids + 1, timer_seconds = 10,
+        unique_bidders = unique_bidders + v_new_bidders, leader_id = p_user_id,
+        ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    VALUES (p_auction_id, p_user_id, 50, v_current_price + 50, false);
+
+    INSERT INTO outbid_events (auction_id, bidder_id, prev_leader_id)
+    VALUES (p_auction_id, p_user_id, v_leader_id);
+
+    IF v_current_price < v_min_price THEN
+        INSERT INTO early_participants (auction_id, user_id)
+        VALUES (p_auction_id, p_user_id)
+        ON CONFLICT (auction_id, user_id) DO NOTHING;
+    END IF;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    VALUES (p_user_id, 'bid', -50, v_balance, 'Auction #' || p_auction_id);
+
+    RETURN QUERY SELECT 'ok'::VARCHAR, v_current_price + 50, v_balance;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION place_bids(p_auction_id INTEGER, p_user_ids INTEGER[])
+RETURNS TABLE (bid_index INTEGER, result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user INTEGER;
+    v_balance DECIMAL(10, 2);
+    v_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_ends_at TIMESTAMP;
+    v_leader_id INTEGER;
+    v_found BOOLEAN;
+    v_new_bidders INTEGER;
+    v_bid_users INTEGER[] := '{}';
+    v_bid_prices DECIMAL(10, 2)[] := '{}';
+    v_bid_balances DECIMAL(10, 2)[] := '{}';
+    v_new_early INTEGER[] := '{}';
+BEGIN
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id, a.ends_at, a.leader_id
+    INTO v_price, v_status, v_min_price, v_winner_id, v_ends_at, v_leader_id
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+    v_found := FOUND;
+
+    bid_index := 0;
+    FOREACH v_user IN ARRAY p_user_ids LOOP
+        new_price := NULL;
+        new_balance := NULL;
+
+        SELECT w.balance INTO v_balance FROM wallet_balances w WHERE w.user_id = v_user;
+
+        IF v_balance IS NULL OR v_balance < 50 THEN
+            result := 'insufficient_funds';
+        ELSIF NOT v_found THEN
+            result := 'not_found';
+        ELSIF v_status <> 'active' OR v_winner_id IS NOT NULL
+            OR v_ends_at <= clock_timestamp()::TIMESTAMP THEN
+            result := 'ended';
+        ELSIF v_price >= v_min_price
+            AND NOT v_user = ANY(v_new_early)
+            AND NOT EXISTS (
+                SELECT 1 FROM early_participants ep
+                WHERE ep.auction_id = p_auction_id AND ep.user_id = v_user
+            ) THEN
+            result := 'no_jumper';
+        ELSE
+            v_balance := wallet_debit(v_user, p_auction_id % 8, 50);
+
+            IF v_balance IS NULL THEN
+                result := 'insufficient_funds';
+            ELSE
+                IF v_price < v_min_price AND NOT v_user = ANY(v_new_early) THEN
+                    v_new_early := v_new_early || v_user;
+                END IF;
+                v_price := v_price + 50;
+                v_bid_users := v_bid_users || v_user;
+                v_bid_prices := v_bid_prices || v_price;
+                v_bid_balances := v_bid_balances || v_balance;
+                result := 'ok';
+                new_price := v_price;
+                new_balance := v_balance;
+            END IF;
+        END IF;
+
+        RETURN NEXT;
+        bid_index := bid_index + 1;
+    END LOOP;
+
+    IF cardinality(v_bid_users) = 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO auction_bidders (auction_id, user_id)
+    SELECT DISTINCT p_auction_id, b.user_id
+    FROM unnest(v_bid_users) AS b(user_id)
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_new_bidders = ROW_COUNT;
+
+    UPDATE auctions
+    SET current_price = v_price, total_bids = total_bids + cardinality(v_bid_users), timer_seconds = 10,
+        unique_bidders = unique_bidders + v_new_bidders,
+        leader_id = v_bid_users[cardinality(v_bid_users)],
+        ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    SELECT p_auction_id, b.user_id, 50, b.price, false
+    FROM unnest(v_bid_users, v_bid_prices) AS b(user_id, price);
+
+    INSERT INTO outbid_events (auction_id, bidder_id, prev_leader_id)
+    SELECT p_auction_id, b.user_id, COALESCE(lag(b.user_id) OVER (ORDER BY b.n), v_leader_id)
+    FROM unnest(v_bid_users) WITH ORDINALITY AS b(user_id, n);
+
+    INSERT INTO early_participants (auction_id, user_id)
+    SELECT p_auction_id, e.user_id
+    FROM unnest(v_new_early) AS e(user_id)
+    ON CONFLICT (auction_id, user_id) DO NOTHING;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    SELECT t.user_id, 'bid', -50, t.balance, 'Auction #' || p_auction_id
+    FROM unnest(v_bid_users, v_bid_balances) AS t(user_id, balance);
+END;
+$$;
+
+-- Drains up to p_limit queued bids. Recipients per auction: the leaders the batch's bids
+-- displaced plus the auction's early participants, minus whoever leads now. A recipient who
+-- still has an unread outbid notification for the auction is skipped.
+-- Concurrent workers take disjoint batches (SKIP LOCKED).
+CREATE OR REPLACE FUNCTION fanout_outbid_events(p_limit INTEGER)
+RETURNS TABLE (events INTEGER, notified INTEGER, coalesced INTEGER)
+LANGUAGE sql
+AS $$
+    WITH batch AS (
+        DELETE FROM outbid_events e
+        WHERE e.id IN (
+            SELECT q.id FROM outbid_events q
+            ORDER BY q.id
+            LIMIT p_limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING e.auction_id, e.prev_leader_id
+    ),
+    recipients AS (
+        SELECT b.auction_id, b.prev_leader_id AS user_id
+        FROM batch b
+        WHERE b.prev_leader_id IS NOT NULL
+        UNION
+        SELECT ep.auction_id, ep.user_id
+        FROM early_participants ep
+        WHERE ep.auction_id IN (SELECT b.auction_id FROM batch b)
+    ),
+    targets AS (
+        SELECT r.user_id, r.auction_id, a.title
+        FROM recipients r
+        JOIN auctions a ON a.id = r.auction_id
+        WHERE r.user_id IS DISTINCT FROM a.leader_id
+          AND a.status = 'active'
+    ),
+    written AS (
+        INSERT INTO notifications (user_id, type, title, message, auction_id)
+        SELECT t.user_id, 'outbid', 'Вашу ставку перебили', t.title, t.auction_id
+        FROM targets t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM notifications n
+            WHERE n.user_id = t.user_id AND n.auction_id = t.auction_id
+              AND n.type = 'outbid' AND n.is_read = false
+        )
+        ORDER BY t.user_id, t.auction_id
+        ON CONFLICT (user_id, auction_id) WHERE type = 'outbid' AND is_read = false DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM batch)::INTEGER,
+           (SELECT COUNT(*) FROM written)::INTEGER,
+           ((SELECT COUNT(*) FROM targets) - (SELECT COUNT(*) FROM written))::INTEGER;
+$$;
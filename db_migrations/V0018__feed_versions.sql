@@ -0,0 +1,16 @@
+-- Change versions for the catalogue parts of the homepage feed (backend/auctions/feed.py).
+-- Categories and banners take versions from the same sequence as auctions, so toggling a
+-- category or editing a banner is seen by the feed's cheap MAX(version)/COUNT(*) check.
+
+ALTER TABLE categories ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('auction_change_seq');
+ALTER TABLE banners ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('auction_change_seq');
+
+CREATE TRIGGER trg_categories_bump_version
+BEFORE UPDATE ON categories
+FOR EACH ROW
+EXECUTE FUNCTION bump_auction_version();
+
+CREATE TRIGGER trg_banners_bump_version
+BEFORE UPDATE ON banners
+FOR EACH ROW
+EXECUTE FUNCTION bump_auction_version();
@@ -0,0 +1,28 @@
+-- An auction's clock starts when the auction starts, not with the first bid: an active
+-- auction always has ends_at, so close_expired_auctions() and the timer engine also close
+-- auctions nobody bid on (and the bot engine can bid on them before the deadline).
+
+-- Running auctions without a bid get a full countdown from now rather than from started_at,
+-- so that deploying this migration does not end them all at once.
+UPDATE auctions
+SET ends_at = GREATEST(COALESCE(started_at, LOCALTIMESTAMP), LOCALTIMESTAMP)
+              + COALESCE(timer_seconds, 10) * INTERVAL '1 second'
+WHERE status = 'active' AND ends_at IS NULL;
+
+CREATE OR REPLACE FUNCTION start_auction_deadline()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.status = 'active' AND NEW.ends_at IS NULL THEN
+        NEW.ends_at := GREATEST(COALESCE(NEW.started_at, clock_timestamp()::TIMESTAMP), clock_timestamp()::TIMESTAMP)
+                       + COALESCE(NEW.timer_seconds, 10) * INTERVAL '1 second';
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_auctions_start_deadline
+BEFORE INSERT OR UPDATE OF status ON auctions
+FOR EACH ROW
+EXECUTE FUNCTION start_auction_deadline();
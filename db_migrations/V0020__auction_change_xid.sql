@@ -0,0 +1,30 @@
+-- Delta reads of auctions (action=list&since, the homepage feed) resume from a snapshot
+-- watermark instead of "last version minus a fixed overlap". Versions are taken before commit,
+-- so a slow transaction can commit a version far below ones already handed out; a fixed
+-- overlap does not bound that. Each row now also records the id of the transaction that last
+-- wrote it. Every transaction with an id below pg_snapshot_xmin(pg_current_snapshot()) has
+-- finished, so a reader that remembers that xmin and later asks for change_xid >= xmin cannot
+-- miss a row, however late its writer committed.
+
+ALTER TABLE auctions ADD COLUMN change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+
+CREATE INDEX idx_auctions_change_xid ON auctions(change_xid, id);
+
+-- bump_auction_version() is shared with categories and banners (V0018), which have no
+-- change_xid, so auctions get their own trigger function.
+CREATE OR REPLACE FUNCTION bump_auction_change() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.version := nextval('auction_change_seq');
+    NEW.change_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER trg_auctions_bump_version ON auctions;
+
+CREATE TRIGGER trg_auctions_bump_version
+BEFORE UPDATE ON auctions
+FOR EACH ROW
+EXECUTE FUNCTION bump_auction_change();
@@ -0,0 +1,10 @@
+-- Keyset pagination of action=list and the feed orders by (started_at DESC, id DESC) and puts
+-- started_at into the cursor. A NULL started_at sorts first under DESC and cannot be encoded,
+-- so the first page with such a row failed. Backfill the column and forbid NULLs; the plain
+-- column keeps idx_auctions_status_started / idx_auctions_status_category_started usable,
+-- which a COALESCE in ORDER BY would not. transactions.created_at is already NOT NULL (V0012).
+UPDATE auctions
+SET started_at = COALESCE(created_at, LOCALTIMESTAMP)
+WHERE started_at IS NULL;
+
+ALTER TABLE auctions ALTER COLUMN started_at SET NOT NULL;
@@ -0,0 +1,45 @@
+-- close_expired_auctions() added 1 to total_wins per winner, not per won auction: UPDATE ... FROM
+-- applies a single row per target, so a user who won several auctions in one batch got one win.
+-- Wins are now counted per user before the update. Body otherwise as in V0012.
+CREATE OR REPLACE FUNCTION close_expired_auctions(p_ids INTEGER[])
+RETURNS TABLE (auction_id INTEGER, closed BOOLEAN, deadline TIMESTAMP)
+LANGUAGE sql
+AS $$
+    WITH closed_auctions AS (
+        UPDATE auctions a
+        SET status = 'ended',
+            timer_seconds = 0,
+            ended_at = clock_timestamp()::TIMESTAMP,
+            winner_id = (
+                SELECT CASE WHEN b.is_bot THEN NULL ELSE b.user_id END
+                FROM bids b
+                WHERE b.auction_id = a.id
+                  AND b.created_at >= a.ends_at - INTERVAL '1 hour'
+                ORDER BY b.id DESC
+                LIMIT 1
+            )
+        WHERE a.id = ANY(p_ids)
+          AND a.status = 'active'
+          AND a.ends_at <= clock_timestamp()::TIMESTAMP
+        RETURNING a.id, a.winner_id
+    ),
+    counted_wins AS (
+        UPDATE users u
+        SET total_wins = u.total_wins + c.n
+        FROM (
+            SELECT winner_id, COUNT(*) AS n
+            FROM closed_auctions
+            WHERE winner_id IS NOT NULL
+            GROUP BY winner_id
+        ) c
+        WHERE u.id = c.winner_id
+    )
+    SELECT c.id, true, NULL::TIMESTAMP FROM closed_auctions c
+    UNION ALL
+    SELECT a.id, false, a.ends_at
+    FROM auctions a
+    WHERE a.id = ANY(p_ids)
+      AND a.status = 'active'
+      AND a.ends_at IS NOT NULL
+      AND a.id NOT IN (SELECT c.id FROM closed_auctions c);
+$$;
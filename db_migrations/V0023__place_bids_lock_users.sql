@@ -0,0 +1,180 @@
+-- place_bids() debits several users in one transaction. Slots of earlier users stayed locked
+-- while a later user's refill waited for its users row, so two batches with crossed users
+-- (A: slot of u1, then users u2; B: slot of u2, then users u1) deadlocked. The batch now
+-- locks all its users in id order right after the auction row, before any slot; a single
+-- wallet_debit() still holds no slot while it waits for users, so it cannot close a cycle.
+-- Bodies otherwise as in V0014 (wallet_debit) and V0017 (place_bids).
+
+CREATE OR REPLACE FUNCTION wallet_debit(p_user_id INTEGER, p_slot INTEGER, p_amount DECIMAL, p_block DECIMAL DEFAULT 500)
+RETURNS DECIMAL
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_free DECIMAL(10, 2);
+    v_swept DECIMAL(10, 2);
+    v_move DECIMAL(10, 2);
+    v_debited BOOLEAN;
+BEGIN
+    BEGIN
+        UPDATE wallet_slots
+        SET credit = credit - p_amount, bids = bids + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = p_user_id AND slot = p_slot AND credit >= p_amount;
+        IF NOT FOUND THEN
+            RAISE no_data_found;
+        END IF;
+        v_debited := true;
+    EXCEPTION WHEN no_data_found THEN
+        -- an UPDATE that lost a race keeps the slot row locked even though it changed
+        -- nothing; rolling the block back releases it before users is locked below, so
+        -- this call never waits for users while holding its slot. Slots debited earlier in
+        -- the same transaction stay locked: callers debiting several users (place_bids)
+        -- must lock those users first
+        v_debited := false;
+    END;
+
+    IF NOT v_debited THEN
+        SELECT balance INTO v_free FROM users WHERE id = p_user_id FOR NO KEY UPDATE;
+
+        IF v_free IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        IF v_free < p_amount THEN
+            SELECT COALESCE(SUM(ws.credit), 0) INTO v_swept
+            FROM (SELECT credit FROM wallet_slots WHERE user_id = p_user_id FOR UPDATE) ws;
+            UPDATE wallet_slots SET credit = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = p_user_id AND credit > 0;
+            v_free := v_free + v_swept;
+        END IF;
+
+        IF v_free < p_amount THEN
+            UPDATE users SET balance = v_free WHERE id = p_user_id;
+            RETURN NULL;
+        END IF;
+
+        -- rich users get bigger blocks: fewer refills, and the rest still covers the other slots
+        v_move := LEAST(v_free, GREATEST(p_block, p_amount, round(v_free / 16, 2)));
+        UPDATE users SET balance = v_free - v_move WHERE id = p_user_id;
+
+        INSERT INTO wallet_slots (user_id, slot, credit, bids)
+        VALUES (p_user_id, p_slot, v_move - p_amount, 1)
+        ON CONFLICT (user_id, slot) DO UPDATE
+        SET credit = wallet_slots.credit + EXCLUDED.credit, bids = wallet_slots.bids + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN (SELECT w.balance FROM wallet_balances w WHERE w.user_id = p_user_id);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION place_bids(p_auction_id INTEGER, p_user_ids INTEGER[])
+RETURNS TABLE (bid_index INTEGER, result VARCHAR, new_price DECIMAL(10, 2), new_balance DECIMAL(10, 2))
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user INTEGER;
+    v_balance DECIMAL(10, 2);
+    v_price DECIMAL(10, 2);
+    v_status VARCHAR(20);
+    v_min_price DECIMAL(10, 2);
+    v_winner_id INTEGER;
+    v_ends_at TIMESTAMP;
+    v_leader_id INTEGER;
+    v_found BOOLEAN;
+    v_new_bidders INTEGER;
+    v_bid_users INTEGER[] := '{}';
+    v_bid_prices DECIMAL(10, 2)[] := '{}';
+    v_bid_balances DECIMAL(10, 2)[] := '{}';
+    v_new_early INTEGER[] := '{}';
+BEGIN
+    SELECT a.current_price, a.status, a.min_price_limit, a.winner_id, a.ends_at, a.leader_id
+    INTO v_price, v_status, v_min_price, v_winner_id, v_ends_at, v_leader_id
+    FROM auctions a WHERE a.id = p_auction_id
+    FOR UPDATE;
+    v_found := FOUND;
+
+    -- all of the batch's users, in id order, before any slot (see wallet_debit)
+    PERFORM 1 FROM users u
+    WHERE u.id = ANY(p_user_ids)
+    ORDER BY u.id
+    FOR NO KEY UPDATE;
+
+    bid_index := 0;
+    FOREACH v_user IN ARRAY p_user_ids LOOP
+        new_price := NULL;
+        new_balance := NULL;
+
+        SELECT w.balance INTO v_balance FROM wallet_balances w WHERE w.user_id = v_user;
+
+        IF v_balance IS NULL OR v_balance < 50 THEN
+            result := 'insufficient_funds';
+        ELSIF NOT v_found THEN
+            result := 'not_found';
+        ELSIF v_status <> 'active' OR v_winner_id IS NOT NULL
+            OR v_ends_at <= clock_timestamp()::TIMESTAMP THEN
+            result := 'ended';
+        ELSIF v_price >= v_min_price
+            AND NOT v_user = ANY(v_new_early)
+            AND NOT EXISTS (
+                SELECT 1 FROM early_participants ep
+                WHERE ep.auction_id = p_auction_id AND ep.user_id = v_user
+            ) THEN
+            result := 'no_jumper';
+        ELSE
+            v_balance := wallet_debit(v_user, p_auction_id % 8, 50);
+
+            IF v_balance IS NULL THEN
+                result := 'insufficient_funds';
+            ELSE
+                IF v_price < v_min_price AND NOT v_user = ANY(v_new_early) THEN
+                    v_new_early := v_new_early || v_user;
+                END IF;
+                v_price := v_price + 50;
+                v_bid_users := v_bid_users || v_user;
+                v_bid_prices := v_bid_prices || v_price;
+                v_bid_balances := v_bid_balances || v_balance;
+                result := 'ok';
+                new_price := v_price;
+                new_balance := v_balance;
+            END IF;
+        END IF;
+
+        RETURN NEXT;
+        bid_index := bid_index + 1;
+    END LOOP;
+
+    IF cardinality(v_bid_users) = 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO auction_bidders (auction_id, user_id)
+    SELECT DISTINCT p_auction_id, b.user_id
+    FROM unnest(v_bid_users) AS b(user_id)
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_new_bidders = ROW_COUNT;
+
+    UPDATE auctions
+    SET current_price = v_price, total_bids = total_bids + cardinality(v_bid_users), timer_seconds = 10,
+        unique_bidders = unique_bidders + v_new_bidders,
+        leader_id = v_bid_users[cardinality(v_bid_users)],
+        ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+    WHERE id = p_auction_id;
+
+    INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+    SELECT p_auction_id, b.user_id, 50, b.price, false
+    FROM unnest(v_bid_users, v_bid_prices) AS b(user_id, price);
+
+    INSERT INTO outbid_events (auction_id, bidder_id, prev_leader_id)
+    SELECT p_auction_id, b.user_id, COALESCE(lag(b.user_id) OVER (ORDER BY b.n), v_leader_id)
+    FROM unnest(v_bid_users) WITH ORDINALITY AS b(user_id, n);
+
+    INSERT INTO early_participants (auction_id, user_id)
+    SELECT p_auction_id, e.user_id
+    FROM unnest(v_new_early) AS e(user_id)
+    ON CONFLICT (auction_id, user_id) DO NOTHING;
+
+    INSERT INTO transactions (user_id, type, amount, balance_after, reference)
+    SELECT t.user_id, 'bid', -50, t.balance, 'Auction #' || p_auction_id
+    FROM unnest(v_bid_users, v_bid_balances) AS t(user_id, balance);
+END;
+$$;
@@ -0,0 +1,49 @@
+-- A bot bid outbids the leader just like a real one, but place_bot_bids() left leader_id and
+-- outbid_events alone: the displaced leader was never told, and still counted as leading.
+-- Bot bids now clear leader_id (nobody leads) and queue an outbid event with no bidder, so
+-- fanout_outbid_events() notifies the previous leader and the early participants.
+-- Body otherwise as in V0015.
+
+ALTER TABLE outbid_events ALTER COLUMN bidder_id DROP NOT NULL;
+
+CREATE OR REPLACE FUNCTION place_bot_bids(p_before INTERVAL, p_limit INTEGER)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    WITH due AS (
+        SELECT a.id, a.leader_id
+        FROM auctions a
+        WHERE a.status = 'active'
+          AND a.winner_id IS NULL
+          AND a.current_price < a.bot_threshold
+          AND a.ends_at > clock_timestamp()::TIMESTAMP
+          AND a.ends_at <= clock_timestamp()::TIMESTAMP + p_before
+        ORDER BY a.ends_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    bumped AS (
+        UPDATE auctions a
+        SET current_price = a.current_price + 50,
+            total_bids = a.total_bids + 1,
+            bot_bids_count = a.bot_bids_count + 1,
+            timer_seconds = 10,
+            leader_id = NULL,
+            ends_at = clock_timestamp()::TIMESTAMP + INTERVAL '10 seconds'
+        FROM due
+        WHERE a.id = due.id
+        RETURNING a.id, a.current_price, due.leader_id AS prev_leader_id
+    ),
+    placed AS (
+        INSERT INTO bids (auction_id, user_id, bid_amount, price_after_bid, is_bot)
+        SELECT b.id, NULL, 50, b.current_price, true
+        FROM bumped b
+        RETURNING 1
+    ),
+    queued AS (
+        INSERT INTO outbid_events (auction_id, bidder_id, prev_leader_id)
+        SELECT b.id, NULL, b.prev_leader_id
+        FROM bumped b
+    )
+    SELECT COUNT(*)::INTEGER FROM placed;
+$$;
@@ -0,0 +1,126 @@
+-- Settlement fixes.
+-- * An auction closed by a final bot bid has winner_id NULL (close_expired_auctions), yet its
+--   participants were told that another participant won. They now get a no-winner message.
+-- * settle_auctions() evaluates badges only for the participants of the batch, so a
+--   deposit/loyalty badge earned by a top-up waited until the user's next settled auction.
+--   Those badges are now also awarded where total_deposit changes: a row trigger on users
+--   that fires only when total_deposit grows (top-ups), not on the bid path's balance updates.
+-- * The 'registration' badge is not evaluated here: auth inserts it at registration, so the
+--   CASE below has no branch for it on purpose.
+-- settle_auctions() body otherwise as in V0016.
+
+-- Settles up to p_limit ended auctions in one set-based statement.
+-- Badges are checked only for the participants of the batch, against the counters maintained
+-- by the bid path (wallet_balances.total_bids, users.total_wins, users.total_deposit), and
+-- only for badges they do not hold yet. deposit/loyalty badges are also awarded on top-up
+-- (award_deposit_badges); registration is awarded by auth and never matches here.
+-- Concurrent workers take disjoint batches (SKIP LOCKED).
+CREATE OR REPLACE FUNCTION settle_auctions(p_limit INTEGER)
+RETURNS TABLE (auctions_settled INTEGER, orders_created INTEGER, badges_awarded INTEGER, notifications_sent INTEGER)
+LANGUAGE sql
+AS $$
+    WITH batch AS (
+        SELECT a.id, a.title, a.winner_id, a.current_price
+        FROM auctions a
+        WHERE a.status = 'ended' AND a.settled_at IS NULL
+        ORDER BY a.ended_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ),
+    settled AS (
+        UPDATE auctions a
+        SET settled_at = clock_timestamp()::TIMESTAMP
+        FROM batch b
+        WHERE a.id = b.id
+        RETURNING a.id
+    ),
+    ordered AS (
+        INSERT INTO orders (auction_id, user_id, final_price)
+        SELECT b.id, b.winner_id, b.current_price
+        FROM batch b
+        WHERE b.winner_id IS NOT NULL
+        ON CONFLICT (auction_id) DO NOTHING
+        RETURNING auction_id
+    ),
+    participants AS (
+        SELECT ab.auction_id, ab.user_id
+        FROM auction_bidders ab
+        JOIN batch b ON b.id = ab.auction_id
+    ),
+    stats AS (
+        SELECT w.user_id, w.total_bids, u.total_wins, u.total_deposit
+        FROM (SELECT DISTINCT p.user_id FROM participants p) p
+        JOIN users u ON u.id = p.user_id
+        JOIN wallet_balances w ON w.user_id = p.user_id
+    ),
+    earned AS (
+        INSERT INTO user_badges (user_id, badge_id)
+        SELECT s.user_id, bg.id
+        FROM stats s
+        JOIN badges bg ON CASE bg.requirement_type
+                WHEN 'bid' THEN s.total_bids
+                WHEN 'win' THEN s.total_wins
+                WHEN 'deposit' THEN s.total_deposit
+                WHEN 'loyalty' THEN s.total_deposit
+            END >= bg.requirement_value
+        WHERE NOT EXISTS (
+            SELECT 1 FROM user_badges ub WHERE ub.user_id = s.user_id AND ub.badge_id = bg.id
+        )
+        ON CONFLICT (user_id, badge_id) DO NOTHING
+        RETURNING user_id, badge_id
+    ),
+    notified AS (
+        INSERT INTO notifications (user_id, type, title, message)
+        SELECT b.winner_id, 'auction_won', 'Вы выиграли аукцион',
+               b.title || ' — ' || b.current_price || ' ₸. Заказ оформлен, ждите доставку.'
+        FROM batch b
+        WHERE b.winner_id IS NOT NULL
+        UNION ALL
+        SELECT p.user_id, 'auction_lost', 'Аукцион завершён',
+               b.title || CASE WHEN b.winner_id IS NULL
+                               THEN ' — последнюю ставку сделал бот, победителя нет.'
+                               ELSE ' — победил другой участник.' END
+        FROM participants p
+        JOIN batch b ON b.id = p.auction_id
+        WHERE p.user_id IS DISTINCT FROM b.winner_id
+        UNION ALL
+        SELECT e.user_id, 'badge', 'Новый значок: ' || bg.name, bg.description
+        FROM earned e
+        JOIN badges bg ON bg.id = e.badge_id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM settled)::INTEGER,
+           (SELECT COUNT(*) FROM ordered)::INTEGER,
+           (SELECT COUNT(*) FROM earned)::INTEGER,
+           (SELECT COUNT(*) FROM notified)::INTEGER;
+$$;
+
+CREATE OR REPLACE FUNCTION award_deposit_badges() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    WITH earned AS (
+        INSERT INTO user_badges (user_id, badge_id)
+        SELECT NEW.id, bg.id
+        FROM badges bg
+        WHERE bg.requirement_type IN ('deposit', 'loyalty')
+          AND bg.requirement_value <= NEW.total_deposit
+          AND NOT EXISTS (
+              SELECT 1 FROM user_badges ub WHERE ub.user_id = NEW.id AND ub.badge_id = bg.id
+          )
+        ON CONFLICT (user_id, badge_id) DO NOTHING
+        RETURNING badge_id
+    )
+    INSERT INTO notifications (user_id, type, title, message)
+    SELECT NEW.id, 'badge', 'Новый значок: ' || bg.name, bg.description
+    FROM earned e
+    JOIN badges bg ON bg.id = e.badge_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_users_deposit_badges
+AFTER UPDATE OF total_deposit ON users
+FOR EACH ROW
+WHEN (NEW.total_deposit > OLD.total_deposit)
+EXECUTE FUNCTION award_deposit_badges();
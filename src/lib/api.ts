@@ -19,7 +19,8 @@ export interface Auction {
   image: string;
   currentPrice: number;
   totalBids: number;
-  timeLeft: number;
+  endsAt: string | null;
+  timerSeconds: number;
   retail: number;
   minPrice: number;
   status: string;
@@ -30,8 +31,35 @@ export interface Auction {
   supplier: string;
 }
 
+export interface AuctionList {
+  auctions: Auction[];
+  version: number;
+  since: number;
+  serverTime: string;
+  nextCursor: string | null;
+}
+
 const getAuthToken = () => localStorage.getItem('auth_token');
 
+// LSN последней записи пользователя (ставка, регистрация): чтения с ним не уходят на отстающую реплику
+const rememberLsn = (response: Response) => {
+  const lsn = response.headers.get('X-Min-LSN');
+  if (lsn) localStorage.setItem('min_lsn', lsn);
+};
+
+const authHeaders = (token: string): Record<string, string> => {
+  const lsn = localStorage.getItem('min_lsn');
+  return lsn ? { 'X-Auth-Token': token, 'X-Min-LSN': lsn } : { 'X-Auth-Token': token };
+};
+
+// Разница часов сервера и клиента по serverTime списка; на 304 остаётся прежней
+let clockOffset = 0;
+
+export const timeLeft = (auction: Auction) => {
+  if (!auction.endsAt) return auction.timerSeconds;
+  return Math.max(0, Math.ceil((Date.parse(auction.endsAt) - Date.now() - clockOffset) / 1000));
+};
+
 export const api = {
   auth: {
     register: async (email: string, password: string, full_name: string) => {
@@ -40,6 +68,7 @@ export const api = {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ email, password, full_name })
       });
+      rememberLsn(response);
       const data = await response.json();
       if (!response.ok) throw new Error(data.error);
       localStorage.setItem('auth_token', data.token);
@@ -63,7 +92,7 @@ export const api = {
       if (!token) throw new Error('Не авторизован');
       
       const response = await fetch(`${API_BASE.auth}?action=me`, {
-        headers: { 'X-Auth-Token': token }
+        headers: authHeaders(token)
       });
       const data = await response.json();
       if (!response.ok) throw new Error(data.error);
@@ -72,6 +101,7 @@ export const api = {
     
     logout: () => {
       localStorage.removeItem('auth_token');
+      localStorage.removeItem('min_lsn');
     }
   },
   
@@ -83,7 +113,9 @@ export const api = {
       const response = await fetch(`${API_BASE.auctions}?${params}`);
       const data = await response.json();
       if (!response.ok) throw new Error(data.error);
-      return data.auctions as Auction[];
+      const list = data as AuctionList;
+      clockOffset = Date.parse(list.serverTime) - Date.now();
+      return list.auctions;
     },
     
     details: async (id: number) => {
@@ -105,6 +137,7 @@ export const api = {
         },
         body: JSON.stringify({ auction_id })
       });
+      rememberLsn(response);
       const data = await response.json();
       if (!response.ok) throw new Error(data.error);
       return data;
@@ -117,7 +150,7 @@ export const api = {
       if (!token) throw new Error('Требуется авторизация');
       
       const response = await fetch(`${API_BASE.wallet}?action=balance`, {
-        headers: { 'X-Auth-Token': token }
+        headers: authHeaders(token)
       });
       const data = await response.json();
       if (!response.ok) throw new Error(data.error);
@@ -129,7 +162,7 @@ export const api = {
       if (!token) throw new Error('Требуется авторизация');
       
       const response = await fetch(`${API_BASE.wallet}?action=transactions&limit=${limit}`, {
-        headers: { 'X-Auth-Token': token }
+        headers: authHeaders(token)
       });
       const data = await response.json();
       if (!response.ok) throw new Error(data.error);
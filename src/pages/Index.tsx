@@ -14,6 +14,7 @@ interface AuctionItem {
   currentPrice: number;
   totalBids: number;
   timeLeft: number;
+  endsAt: number;
   category: string;
   retail: number;
   minPrice: number;
@@ -51,6 +52,7 @@ const mockAuctions: AuctionItem[] = [
     currentPrice: 0,
     totalBids: 0,
     timeLeft: 10,
+    endsAt: Date.now() + 10000,
     category: 'Электроника',
     retail: 129900,
     minPrice: 1000,
@@ -69,6 +71,7 @@ const mockAuctions: AuctionItem[] = [
     currentPrice: 0,
     totalBids: 0,
     timeLeft: 10,
+    endsAt: Date.now() + 10000,
     category: 'Часы',
     retail: 179900,
     minPrice: 1000,
@@ -87,6 +90,7 @@ const mockAuctions: AuctionItem[] = [
     currentPrice: 0,
     totalBids: 0,
     timeLeft: 10,
+    endsAt: Date.now() + 10000,
     category: 'Компьютеры',
     retail: 399900,
     minPrice: 1000,
@@ -117,9 +121,11 @@ const Index = () => {
 
   useEffect(() => {
     const interval = setInterval(() => {
+      const now = Date.now();
       setAuctions(prev => prev.map(auction => {
-        if (auction.timeLeft > 0) {
-          return { ...auction, timeLeft: auction.timeLeft - 1 };
+        const timeLeft = Math.max(0, Math.ceil((auction.endsAt - now) / 1000));
+        if (timeLeft > 0) {
+          return timeLeft === auction.timeLeft ? auction : { ...auction, timeLeft };
         } else {
           if (auction.currentPrice < auction.botThreshold && !auction.winnerId) {
             return {
@@ -127,6 +133,7 @@ const Index = () => {
               currentPrice: auction.currentPrice + 50,
               totalBids: auction.totalBids + 1,
               timeLeft: 10,
+              endsAt: now + 10000,
               botBidsCount: auction.botBidsCount + 1
             };
           } else if (!auction.winnerId) {
@@ -134,6 +141,7 @@ const Index = () => {
             deadline.setHours(deadline.getHours() + 24);
             return {
               ...auction,
+              timeLeft: 0,
               winnerId: userId,
               buyItNowDeadline: deadline
             };
@@ -175,6 +183,7 @@ const Index = () => {
           currentPrice: auc.currentPrice + 50,
           totalBids: auc.totalBids + 1,
           timeLeft: 10,
+          endsAt: Date.now() + 10000,
           earlyParticipants: updatedParticipants
         };
       }